@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the overhead channel dispatch adds to each Entry write.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, timeit, report
+from fsfs import channels
+
+WRITES = 200
+KEYS = 2000
+
+
+def main():
+    with tempdir() as root:
+        # Use json so the cost of encoding does not hide the dispatch cost
+        fsfs.set_data_encoder(fsfs.JsonEncoder)
+        fsfs.set_data_decoder(fsfs.JsonDecoder)
+
+        entry = fsfs.get_entry(root + '/entry')
+        entry.write(**dict(('key_%d' % i, i) for i in range(KEYS)))
+        data = entry.read()
+
+        def legacy_send():
+            for i in range(WRITES):
+                entry.data_changed.send(entry, dict(data))
+
+        def lazy_send():
+            for i in range(WRITES):
+                channels.send_lazy(
+                    entry.data_changed, lambda: (entry, dict(data)), entry
+                )
+
+        def writes():
+            for i in range(WRITES):
+                entry.write(frame=i)
+
+        def deferred_writes():
+            with fsfs.deferred():
+                writes()
+
+        results = [
+            ('send copying data, no receivers', timeit(legacy_send)),
+            ('send_lazy, no receivers', timeit(lazy_send)),
+            ('write, no receivers', timeit(writes)),
+        ]
+
+        received = []
+        receiver = lambda entry, data: received.append(len(data))
+        fsfs.EntryDataChanged.connect(receiver)
+        results.extend([
+            ('send_lazy, one receiver', timeit(lazy_send)),
+            ('write, one receiver', timeit(writes)),
+            ('deferred write, one receiver', timeit(deferred_writes)),
+        ])
+        fsfs.EntryDataChanged.disconnect(receiver)
+
+        report(
+            '{} sends or writes of a {} key document'.format(WRITES, KEYS),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+Compare reading and writing single keys of an Entry carrying over 1MB of
+metadata with the file and sharded data storages.
+
+Cold reads use a new EntryData, like a new process or a read after another
+process wrote the Entry.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, timeit, report
+from fsfs.models import EntryData
+
+CACHES = 32
+FRAMES = 1000
+
+
+def make_document():
+    data = dict(
+        ('cache_%02d' % i, dict(
+            ('frame_%04d' % j, [j, j * 0.5, 'render/beauty.%04d.exr' % j])
+            for j in range(FRAMES)
+        ))
+        for i in range(CACHES)
+    )
+    data['thumbnail'] = 'thumbnail.png'
+    return data
+
+
+def bench(root, storage):
+    fsfs.set_data_storage(storage)
+    entry = fsfs.get_entry(root + '/' + storage.name)
+    entry.write(**make_document())
+    size = len(fsfs.encode_data(entry.read()))
+
+    def cold_read_key():
+        EntryData(entry, entry.data.path).read('thumbnail')
+
+    def cold_read():
+        EntryData(entry, entry.data.path).read()
+
+    def write_key():
+        entry.write(thumbnail='thumbnail.jpg')
+
+    def update_key():
+        entry.write(cache_00={'frame_0000': [0, 0.0, 'comp.0000.exr']})
+
+    return size, [
+        (storage.name + ' cold read one key', timeit(cold_read_key)),
+        (storage.name + ' cold read all', timeit(cold_read)),
+        (storage.name + ' write one key', timeit(write_key)),
+        (storage.name + ' merge into one key', timeit(update_key)),
+    ]
+
+
+def main():
+    with tempdir() as root:
+        # Use json so both storages are measured with a fast codec
+        fsfs.set_data_encoder(fsfs.JsonEncoder)
+        fsfs.set_data_decoder(fsfs.JsonDecoder)
+
+        results = []
+        try:
+            for storage in (
+                fsfs.FileDataStorage(),
+                fsfs.ShardedDataStorage(),
+            ):
+                size, storage_results = bench(root, storage)
+                results.extend(storage_results)
+        finally:
+            fsfs.set_default_policy()
+
+        report(
+            'Entry with {:.1f} MB of data'.format(size / 1024 / 1024),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+Measure searching a tree whose shots hold large frame directories, with
+and without ignore rules skipping the render output.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+from common import fsfs, tempdir, timeit, report
+
+SEQUENCES = 4
+SHOTS = 10
+PASSES = 3
+FRAMES = 1000
+
+
+def make_show(root):
+    '''Create sequences of shots, each shot holds render passes full of
+    frames. Returns the number of frame files created.'''
+
+    count = 0
+    for i in range(SEQUENCES):
+        for j in range(SHOTS):
+            shot = '{}/seq_{:02d}/sh_{:03d}'.format(root, i, j)
+            fsfs.tag(shot, 'shot')
+            for k in range(PASSES):
+                frames = '{}/render/pass_{}'.format(shot, k)
+                os.makedirs(frames)
+                for frame in range(FRAMES):
+                    open('{}/beauty.{:04d}.exr'.format(frames, frame), 'w')
+                count += FRAMES
+    return count
+
+
+def main():
+    with tempdir() as root:
+        frames = make_show(root)
+
+        def search():
+            entries = list(fsfs.search(root))
+            assert len(entries) == SEQUENCES * SHOTS
+
+        results = [('search, no rules', timeit(search))]
+
+        fsfs.ignore_dirs(names=['render'])
+        results.append(('search, ignoring render', timeit(search)))
+        fsfs.set_ignore_rules(fsfs.DefaultIgnoreRules)
+
+        for i in range(SEQUENCES):
+            for j in range(SHOTS):
+                shot = '{}/seq_{:02d}/sh_{:03d}'.format(root, i, j)
+                fsfs.util.touch(shot + '/render/' + fsfs.NO_ENTRIES_FILE)
+        results.append(('search, .fsfsnoentries in render', timeit(search)))
+
+        report(
+            'Search {} shots holding {} frames'.format(
+                SEQUENCES * SHOTS, frames
+            ),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
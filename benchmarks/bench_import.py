@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the startup cost of import fsfs using python -X importtime.
+
+Target: import fsfs adds less than 10 ms over a bare interpreter start.
+The codec, lock and cli subsystems are only imported when first used.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import subprocess
+from common import timeit, report
+
+TARGET_MS = 10
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATEMENTS = [
+    ('import fsfs', 'import fsfs'),
+    ('first get_entry', 'import fsfs; fsfs.get_entry(".")'),
+    ('first read', 'import fsfs; fsfs.decode_data("a: 1")'),
+    ('import fsfs.cli', 'import fsfs.cli'),
+]
+
+
+def run(statement, importtime=False):
+    args = [sys.executable]
+    if importtime:
+        args += ['-X', 'importtime']
+    args += ['-c', statement]
+    return subprocess.run(
+        args, cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def cumulative_import_time(statement, module='fsfs', repeat=10):
+    '''Median cumulative import time in seconds reported for module'''
+
+    samples = []
+    for _ in range(repeat):
+        for line in run(statement, importtime=True).stderr.splitlines():
+            parts = [part.strip() for part in line.split('|')]
+            if len(parts) == 3 and parts[2] == module:
+                samples.append(int(parts[1]) / 1000000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    baseline = timeit(lambda: run('pass'), repeat=10)
+    results = [('python -c pass', baseline)]
+    for label, statement in STATEMENTS:
+        elapsed = timeit(lambda: run(statement), repeat=10)
+        results.append((label + ' (wall)', elapsed))
+    results.append((
+        'import fsfs (-X importtime)',
+        cumulative_import_time('import fsfs'),
+    ))
+    report('Startup', results)
+
+    overhead = (results[1][1] - baseline) * 1000
+    status = 'ok' if overhead < TARGET_MS else 'over target'
+    print('import fsfs overhead: {:.1f} ms, target {} ms: {}'.format(
+        overhead, TARGET_MS, status
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+'''
+Compare frequent small writes to an Entry with a large document using the
+file and journaled data storages, and the cost of replaying the journal
+when a new reader reads the Entry.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, timeit, report
+from fsfs.models import EntryData
+
+WRITES = 500
+SHOTS = 500
+
+
+def make_document():
+    return dict(
+        ('sh_%03d' % i, {
+            'frame_start': 1001,
+            'frame_end': 1100,
+            'tasks': dict(('task_%d' % j, 'wip') for j in range(8)),
+        })
+        for i in range(SHOTS)
+    )
+
+
+def bench(root, storage):
+    fsfs.set_data_storage(storage)
+    entry = fsfs.get_entry(root + '/' + storage.name)
+    entry.write(**make_document())
+    frames = iter(range(1000000))
+
+    def writes():
+        for i in range(WRITES):
+            entry.write(progress={'frame_done': next(frames)})
+
+    def cold_read():
+        EntryData(entry, entry.data.path).read()
+
+    return [
+        (storage.name + ' writes', timeit(writes)),
+        (storage.name + ' cold read', timeit(cold_read)),
+    ]
+
+
+def main():
+    with tempdir() as root:
+        # Use json so both storages are measured with a fast codec
+        fsfs.set_data_encoder(fsfs.JsonEncoder)
+        fsfs.set_data_decoder(fsfs.JsonDecoder)
+
+        results = []
+        try:
+            for storage in (
+                fsfs.FileDataStorage(),
+                fsfs.JournaledDataStorage(compact_interval=None),
+            ):
+                results.extend(bench(root, storage))
+        finally:
+            fsfs.set_default_policy()
+
+        report(
+            '{} progress writes to a {} shot document'.format(WRITES, SHOTS),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the cost of one lock pump cycle in a process holding many locks.
+
+The legacy pump checked and touched every held lock each cycle. The heap
+based pump only touches the locks that are due, so when locks are acquired
+over time a cycle costs the same no matter how many locks are held.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+from timeit import default_timer
+from common import tempdir, timeit, report
+from fsfs.lockfile import LockFile, LockFilePump
+
+DUE = 100
+COUNTS = (1000, 5000, 20000)
+
+
+def legacy_cycle(locks):
+    for lock in list(locks):
+        if os.path.exists(lock.path):
+            with open(lock.path, 'a'):
+                os.utime(lock.path, None)
+
+
+def main():
+    results = []
+    for count in COUNTS:
+        with tempdir() as root:
+            locks = [LockFile(root + '/' + str(i)) for i in range(count)]
+            for lock in locks:
+                lock.acquire()
+
+            results.append((
+                'legacy pump cycle, {} locks'.format(count),
+                timeit(lambda: legacy_cycle(locks), repeat=3),
+            ))
+
+            # An idle pump with due times staggered so that DUE locks come
+            # due in each cycle, as when a batch acquires locks over time
+            pump = LockFilePump()
+            pump._heap = [
+                (i // DUE, lock._pump_token, lock)
+                for i, lock in enumerate(locks)
+            ]
+            cycles = iter(range(count // DUE))
+            results.append((
+                'heap pump cycle, {} locks, {} due'.format(count, DUE),
+                timeit(lambda: pump.refresh(now=next(cycles)), repeat=3),
+            ))
+
+            start = default_timer()
+            for lock in locks:
+                lock.release()
+            results.append((
+                'release {} locks'.format(count),
+                default_timer() - start,
+            ))
+
+    report('Lock pump', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+'''
+Measure repeated searches of a tree whose shots hold large frame
+directories, with and without the negative cache.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+import time
+from common import fsfs, tempdir, timeit, report
+from fsfs._search import negatives
+from fsfs._index import close_index
+
+SEQUENCES = 4
+SHOTS = 10
+PASSES = 3
+FRAMES = 1000
+
+
+def make_show(root):
+    '''Create sequences of shots, each shot holds render passes full of
+    frames. Returns the number of frame files created.'''
+
+    count = 0
+    for i in range(SEQUENCES):
+        for j in range(SHOTS):
+            shot = '{}/seq_{:02d}/sh_{:03d}'.format(root, i, j)
+            fsfs.tag(shot, 'shot')
+            for k in range(PASSES):
+                frames = '{}/render/pass_{}'.format(shot, k)
+                os.makedirs(frames)
+                for frame in range(FRAMES):
+                    open('{}/beauty.{:04d}.exr'.format(frames, frame), 'w')
+                count += FRAMES
+
+    # Directories modified within min_age seconds are not cached
+    past = time.time() - 60
+    for path, _, _ in os.walk(root):
+        os.utime(path, (past, past))
+    return count
+
+
+def main():
+    with tempdir() as root:
+        frames = make_show(root)
+
+        def search():
+            entries = list(fsfs.search(root, depth=4))
+            assert len(entries) == SEQUENCES * SHOTS
+
+        results = [('search, no cache', timeit(search))]
+
+        negatives.enabled = True
+        try:
+            results.append(('search, negative cache', timeit(search)))
+
+            fsfs.build_index(root, fields=['status'])
+            negatives.clear()
+
+            def search_cold():
+                negatives.clear()
+                search()
+
+            results.append(
+                ('search, cold cache loaded from index', timeit(search_cold))
+            )
+        finally:
+            negatives.enabled = False
+            negatives.clear()
+            close_index(root)
+
+        report(
+            'Search {} shots holding {} frames'.format(
+                SEQUENCES * SHOTS, frames
+            ),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
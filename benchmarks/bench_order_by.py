@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+'''
+Measure fetching the first page of assets ordered by a data key, sorting
+client-side versus Search.order_by with and without an index.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs._index import close_index
+
+PAGE_SIZE = 50
+
+
+def main():
+    with tempdir() as root:
+        paths = make_tree(root, width=12, depth=3)
+        for i, path in enumerate(paths):
+            fsfs.write(path, priority=(i * 7919) % len(paths))
+
+        def clear_entries():
+            fsfs.set_entry_factory(fsfs.EntryFactory())
+
+        def client_side():
+            clear_entries()
+            entries = sorted(
+                fsfs.search(root),
+                key=lambda e: (e.read('priority'), e.path),
+            )
+            assert len(entries[:PAGE_SIZE]) == PAGE_SIZE
+
+        def order_by():
+            clear_entries()
+            page = fsfs.search(root).order_by('priority').page(1, PAGE_SIZE)
+            assert len(list(page)) == PAGE_SIZE
+
+        results = [
+            ('sorted(search) client-side', timeit(client_side)),
+            ('order_by().page(1)', timeit(order_by)),
+        ]
+
+        fsfs.build_index(root, fields=['priority'])
+        try:
+            results.append(('order_by().page(1), indexed', timeit(order_by)))
+        finally:
+            close_index(root)
+
+        report(
+            'First page of {} entries ordered by priority'.format(len(paths)),
+            results,
+        )
+        fsfs.set_default_policy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+Measure searching and creating Entries with the concatenating path layer
+versus calling os.path.abspath for every path. Pass --profile to print the
+top functions of both runs.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import pstats
+import cProfile
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs import util
+
+
+def legacy_unipath(*paths):
+    return os.path.abspath(os.path.join(*paths)).replace('\\', '/')
+
+
+class legacy_paths(object):
+    '''Patch util to normalize every path using os.path.abspath'''
+
+    def __enter__(self):
+        self.saved = util.unipath, util.joinpath, util.intern_path
+        util.unipath = legacy_unipath
+        util.joinpath = legacy_unipath
+        util.intern_path = lambda path: path
+
+    def __exit__(self, *exc_info):
+        util.unipath, util.joinpath, util.intern_path = self.saved
+
+
+def main():
+    with tempdir() as root:
+        count = len(make_tree(root, width=10, depth=4, entry_every=1))
+
+        def search():
+            fsfs.set_entry_factory(fsfs.SimpleEntryFactory())
+            entries = list(fsfs.search(root, depth=4))
+            assert len(entries) == count
+            return entries
+
+        with legacy_paths():
+            before = timeit(search)
+        after = timeit(search)
+
+        report(
+            'Search and create {} Entries'.format(count),
+            [('os.path.abspath', before), ('concatenation', after)],
+        )
+
+        if '--profile' in sys.argv:
+            for title, patch in (('before', legacy_paths), ('after', None)):
+                profile = cProfile.Profile()
+                if patch:
+                    with patch():
+                        profile.runcall(search)
+                else:
+                    profile.runcall(search)
+                print(title)
+                pstats.Stats(profile).sort_stats('tottime').print_stats(8)
+
+        fsfs.set_default_policy()
+
+
+if __name__ == '__main__':
+    main()
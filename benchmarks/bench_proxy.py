@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+'''
+Measure attribute access through EntryFactory proxies, revalidating on
+every access versus using the Entry cached by the proxy.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, make_tree, timeit, report
+
+ACCESSES = 10
+
+
+def main():
+    with tempdir() as root:
+        paths = make_tree(root, width=10, depth=3, entry_every=1)
+
+        def access(interval):
+            factory = fsfs.EntryFactory(revalidate_interval=interval)
+            fsfs.set_entry_factory(factory)
+            entries = [fsfs.get_entry(path) for path in paths]
+
+            def run():
+                for entry in entries:
+                    for _ in range(ACCESSES):
+                        entry.path, entry.name, entry.read
+            return run
+
+        def get_entry(interval):
+            factory = fsfs.EntryFactory(revalidate_interval=interval)
+            fsfs.set_entry_factory(factory)
+            for path in paths:
+                fsfs.get_entry(path)
+
+            def run():
+                for path in paths:
+                    fsfs.get_entry(path).name
+            return run
+
+        results = [
+            ('attributes, revalidate every access', timeit(access(0))),
+            ('attributes, cached proxy', timeit(access(1.0))),
+            ('get_entry().name, revalidate', timeit(get_entry(0))),
+            ('get_entry().name, cached proxy', timeit(get_entry(1.0))),
+        ]
+        report(
+            '{} accesses of 3 attributes on {} Entries'.format(
+                ACCESSES, len(paths)
+            ),
+            results,
+        )
+        fsfs.set_default_policy()
+
+
+if __name__ == '__main__':
+    main()
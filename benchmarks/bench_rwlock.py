@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+Read throughput of reader threads while a writer updates the same Entry.
+
+Before reads were lock free and could see partially written files, so
+callers wrapped reads and writes in one coarse lock. Now writes replace the
+data file atomically and readers share the data lock, only waiting while a
+writer swaps the file and cache.
+'''
+from __future__ import absolute_import, division, print_function
+
+import time
+import threading
+from timeit import default_timer
+from common import fsfs, tempdir, report
+
+READERS = 8
+WRITES = 100
+KEYS = 1000
+
+
+def run(entry, read, write):
+    '''Returns reads per second during WRITES writes'''
+
+    done = threading.Event()
+    counts = [0] * READERS
+
+    def reader(index):
+        while not done.is_set():
+            read()
+            counts[index] += 1
+            # Yield, an unfair coarse lock would otherwise starve the writer
+            time.sleep(0)
+
+    threads = [
+        threading.Thread(target=reader, args=(i,)) for i in range(READERS)
+    ]
+    start = default_timer()
+    for thread in threads:
+        thread.start()
+    for frame in range(WRITES):
+        write(frame)
+    done.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (default_timer() - start)
+
+
+def main():
+    fsfs.set_data_encoder(fsfs.JsonEncoder)
+    fsfs.set_data_decoder(fsfs.JsonDecoder)
+
+    with tempdir() as root:
+        entry = fsfs.get_entry(root + '/entry')
+        entry.write(**dict(('key_%d' % i, i) for i in range(KEYS)))
+
+        coarse_lock = threading.Lock()
+
+        def coarse_read():
+            with coarse_lock:
+                entry.read()
+
+        def coarse_write(frame):
+            with coarse_lock:
+                entry.write(frame=frame)
+
+        coarse = run(entry, coarse_read, coarse_write)
+        shared = run(entry, entry.read, lambda frame: entry.write(frame=frame))
+
+    title = '{} readers, {} writes of a {} key document'.format(
+        READERS, WRITES, KEYS
+    )
+    print(title)
+    print('-' * len(title))
+    print('{:<36} {:>10.0f} reads/s'.format('coarse external lock', coarse))
+    print('{:<36} {:>10.0f} reads/s'.format('shared data lock', shared))
+
+
+if __name__ == '__main__':
+    main()
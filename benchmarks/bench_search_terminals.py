@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+'''
+Measure counting and checking for tagged entries using Search terminals
+versus materializing every Entry.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, make_tree, timeit, report
+
+
+def main():
+    with tempdir() as root:
+        paths = make_tree(root, width=8, depth=3)
+        for path in paths[::4]:
+            fsfs.tag(path, 'asset')
+        expected = len(paths[::4])
+
+        def clear_entries():
+            fsfs.set_entry_factory(fsfs.EntryFactory())
+
+        def count_list():
+            clear_entries()
+            assert len(list(fsfs.search(root).tags('asset'))) == expected
+
+        def count():
+            clear_entries()
+            assert fsfs.search(root).tags('asset').count() == expected
+
+        def one():
+            clear_entries()
+            assert bool(fsfs.search(root, depth=8).tags('asset').one())
+
+        def exists():
+            clear_entries()
+            assert fsfs.search(root, depth=8).tags('asset').exists()
+
+        def first():
+            clear_entries()
+            assert len(fsfs.search(root).tags('asset').first(10)) == 10
+
+        report(
+            'Search {} entries, {} tagged'.format(len(paths), expected),
+            [
+                ('len(list(search))', timeit(count_list)),
+                ('search.count()', timeit(count)),
+                ('bool(search.one())', timeit(one)),
+                ('search.exists()', timeit(exists)),
+                ('search.first(10)', timeit(first)),
+            ],
+        )
+        fsfs.set_default_policy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+'''
+Compare compiled selectors against the glob based quick_select and the
+list copying select_from_tree they replaced.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+from glob import glob
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs import util, api
+from fsfs._search import safe_scandir, select_from_tree
+
+
+def legacy_quick_select(root, selector, sep='/', first_depth=2, depth=4):
+    parts = selector.split(sep)
+    depth = first_depth
+    matches = []
+    while parts:
+        if matches:
+            root = matches[-1]
+        part = parts.pop(0)
+        for i in range(depth):
+            pattern = util.unipath(
+                root, '*/' * i, '*' + part + '*', api.get_data_root()
+            )
+            entries = glob(pattern)
+            if entries:
+                matches.append(min(entries, key=len)[:-6])
+                break
+        else:
+            return
+    return matches[-1]
+
+
+@util.regenerator
+def legacy_select_tree_dn(root, selector, data_root, depth, gap=0):
+    dirs = {e.name: e.path for e in safe_scandir(root) if e.is_dir()}
+    if dirs.pop(data_root, None):
+        gap = 0
+        if selector[0] in os.path.basename(root):
+            selector.pop(0)
+        if not selector:
+            yield api.get_entry(util.unipath(root))
+            return
+    if gap == depth:
+        return
+    for dir in dirs.values():
+        yield legacy_select_tree_dn(
+            dir, list(selector), data_root, depth, gap + 1
+        )
+
+
+def main():
+    with tempdir() as root:
+        make_tree(root, width=6, depth=5, entry_every=1)
+        data_root = fsfs.get_data_root()
+        selector = 'd1_5/d3_5/d5_5'
+        deep_selector = 'd3_5/d5_5'
+
+        results = [
+            ('legacy quick_select', timeit(
+                lambda: legacy_quick_select(root, selector, depth=4)
+            )),
+            ('quick_select', timeit(
+                lambda: fsfs.quick_select(root, selector, depth=4)
+            )),
+            ('legacy quick_select deep parts', timeit(
+                lambda: legacy_quick_select(root, deep_selector, '/', 4, 4)
+            )),
+            ('quick_select deep parts', timeit(
+                lambda: fsfs.quick_select(root, deep_selector, '/', 4, 4)
+            )),
+            ('legacy select_from_tree', timeit(
+                lambda: list(legacy_select_tree_dn(
+                    root, selector.split('/'), data_root, 3
+                ))
+            )),
+            ('select_from_tree', timeit(
+                lambda: list(select_from_tree(root, selector, depth=3))
+            )),
+            ('select_from_tree glob parts', timeit(
+                lambda: list(select_from_tree(root, 'd1_*/d3_5/=d5_5'))
+            )),
+        ]
+        report('Selectors on a 6 wide 5 deep tree', results)
+
+
+if __name__ == '__main__':
+    main()
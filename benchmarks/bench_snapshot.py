@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+'''
+Compare a snapshot/restore round trip against copying every data
+directory file by file.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs import util
+from fsfs._snapshot import walk_entries
+
+
+def copy_data_dirs(src, dest):
+    data_root = fsfs.get_data_root()
+    for path in walk_entries(src):
+        data_path = path + '/' + data_root
+        util.copy_tree(data_path, data_path.replace(src, dest, 1), force=True)
+
+
+def main():
+    with tempdir() as root:
+        src = root + '/src'
+        paths = make_tree(src, width=8, depth=4, entry_every=1)
+        for path in paths:
+            fsfs.write(path, status='approved', frame_start=1001)
+            fsfs.tag(path, 'shot')
+
+        snapshot = root + '/snapshot.jsonl.gz'
+        results = [
+            ('copy data dirs ({} entries)'.format(len(paths)), timeit(
+                lambda: copy_data_dirs(src, root + '/copy'), repeat=1
+            )),
+            ('snapshot', timeit(
+                lambda: fsfs.snapshot(src, snapshot), repeat=3
+            )),
+            ('restore', timeit(
+                lambda: fsfs.restore(snapshot, root + '/restored'), repeat=3
+            )),
+        ]
+        report('Snapshot metadata', results)
+
+
+if __name__ == '__main__':
+    main()
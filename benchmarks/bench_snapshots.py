@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''
+Measure reading, writing and sending large Entry data documents now that
+reads and data_changed messages share immutable snapshots instead of copies.
+'''
+from __future__ import absolute_import, division, print_function
+
+import copy
+from common import fsfs, tempdir, timeit, report
+
+OPERATIONS = 200
+SHOTS = 500
+
+
+def make_document():
+    return dict(
+        ('sh_%03d' % i, {
+            'frame_start': 1001,
+            'frame_end': 1100,
+            'tasks': dict(('task_%d' % j, 'wip') for j in range(8)),
+        })
+        for i in range(SHOTS)
+    )
+
+
+def main():
+    with tempdir() as root:
+        # Use json so the cost of encoding does not hide the copies
+        fsfs.set_data_encoder(fsfs.JsonEncoder)
+        fsfs.set_data_decoder(fsfs.JsonDecoder)
+
+        entry = fsfs.get_entry(root + '/entry')
+        entry.write(**make_document())
+        data = entry.read()
+        # What reads returned before snapshots, a plain dict
+        plain = data.thaw()
+        update = {'sh_000': {'tasks': {'task_0': 'done'}}}
+
+        def read_deepcopy():
+            for i in range(OPERATIONS):
+                entry.read()
+                copy.deepcopy(plain)
+
+        def read_snapshot():
+            for i in range(OPERATIONS):
+                entry.read()
+
+        def merge_copy():
+            for i in range(OPERATIONS):
+                fsfs.update_dict(copy.deepcopy(plain), update)
+
+        def merge_snapshot():
+            for i in range(OPERATIONS):
+                fsfs.freeze(fsfs.merge_dict(data, update))
+
+        def send_copy():
+            for i in range(OPERATIONS):
+                entry.data_changed.send(entry, dict(plain))
+
+        def send_snapshot():
+            for i in range(OPERATIONS):
+                entry.data_changed.send(entry, data)
+
+        received = []
+        receiver = lambda entry, data: received.append(len(data))
+        fsfs.EntryDataChanged.connect(receiver)
+        results = [
+            ('read and deepcopy', timeit(read_deepcopy)),
+            ('read snapshot', timeit(read_snapshot)),
+            ('merge into deepcopy', timeit(merge_copy)),
+            ('merge into snapshot', timeit(merge_snapshot)),
+            ('send copy, one receiver', timeit(send_copy)),
+            ('send snapshot, one receiver', timeit(send_snapshot)),
+        ]
+        fsfs.EntryDataChanged.disconnect(receiver)
+
+        report(
+            '{} operations on a {} shot document'.format(OPERATIONS, SHOTS),
+            results,
+        )
+
+
+if __name__ == '__main__':
+    main()
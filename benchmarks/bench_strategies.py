@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the first-match latency of Search.one() for a shallow Entry in a
+wide tree using each walk strategy.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs._compat import scandir
+
+BRANCHES = 8
+
+
+def main():
+    with tempdir() as root:
+        for i in range(BRANCHES):
+            make_tree(
+                '{}/branch_{}'.format(root, i),
+                width=6,
+                depth=3,
+                entry_every=3,
+            )
+        # One shallow target in the branch listed last, a depth first walk
+        # lists every other branch before finding it
+        last = [e.name for e in scandir(root)][-1]
+        fsfs.tag('{}/{}/target'.format(root, last), 'asset')
+
+        results = []
+        for strategy in (fsfs.DFS, fsfs.BFS, fsfs.IDDFS, fsfs.PRIORITY):
+
+            def one(strategy=strategy):
+                search = fsfs.search(root, strategy=strategy)
+                assert search.name('target').one()
+
+            results.append(('search.one(), ' + strategy, timeit(one)))
+
+        report('First match in {} wide branches'.format(BRANCHES), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+'''
+Retag a whole sequence of shots one entry at a time and with tag_many.
+'''
+from __future__ import absolute_import, division, print_function
+
+import string
+from common import fsfs, tempdir, timeit, report
+
+SHOTS = 2000
+TAGS = ('approved', 'hero', 'final')
+
+
+def legacy_validate_tag(tag):
+    valid_chars = '.-_' + string.ascii_letters + string.digits
+    if not all([c in valid_chars for c in tag]):
+        raise fsfs.InvalidTag(tag)
+    return True
+
+
+def main():
+    with tempdir() as root:
+        paths = ['{}/seq_010/sh_{:04d}'.format(root, i) for i in range(SHOTS)]
+        for path in paths:
+            fsfs.tag(path, 'shot')
+
+        received = []
+        receiver = lambda entry, tags: received.append(entry)
+        fsfs.EntryTagged.connect(receiver)
+
+        def tag_each():
+            for path in paths:
+                fsfs.tag(path, *TAGS)
+
+        def untag_each():
+            for path in paths:
+                fsfs.untag(path, *TAGS)
+
+        results = [
+            ('legacy validate_tag x {}'.format(SHOTS * len(TAGS)), timeit(
+                lambda: [legacy_validate_tag(t) for t in TAGS * SHOTS]
+            )),
+            ('validate_tag x {}'.format(SHOTS * len(TAGS)), timeit(
+                lambda: [fsfs.validate_tag(t) for t in TAGS * SHOTS]
+            )),
+            ('tag each', timeit(tag_each, repeat=1)),
+            ('untag each', timeit(untag_each, repeat=1)),
+            ('tag_many', timeit(lambda: fsfs.tag_many(paths, *TAGS), 1)),
+            ('untag_many', timeit(lambda: fsfs.untag_many(paths, *TAGS), 1)),
+            ('search(...).tag', timeit(
+                lambda: fsfs.search(root).tags('shot').tag(*TAGS), 1
+            )),
+        ]
+        fsfs.EntryTagged.disconnect(receiver)
+
+    report('Retag {} shots with {} tags'.format(SHOTS, len(TAGS)), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+'''
+Tag 100k entries with several tags each using both tag storage layouts.
+
+Usage: python bench_tags.py [number of entries]
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+from timeit import default_timer
+from common import fsfs, tempdir, report
+from fsfs.storage import FilesTagStorage, SingleFileTagStorage
+
+TAGS = ('shot', 'asset', 'approved', 'hero')
+
+
+def make_data_paths(root, count):
+    data_root = fsfs.get_data_root()
+    paths = []
+    for i in range(count):
+        path = '{}/{:03d}/{}/{}'.format(root, i // 1000, i, data_root)
+        os.makedirs(path)
+        paths.append(path)
+    return paths
+
+
+def measure(fn, paths):
+    start = default_timer()
+    for path in paths:
+        fn(path)
+    return default_timer() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    results = []
+    for storage in (FilesTagStorage(), SingleFileTagStorage()):
+        with tempdir() as root:
+            paths = make_data_paths(root, count)
+            results.extend([
+                (storage.name + ' tag', measure(
+                    lambda path: storage.add_tags(path, TAGS), paths
+                )),
+                (storage.name + ' get_tags', measure(
+                    storage.get_tags, paths
+                )),
+                (storage.name + ' untag one', measure(
+                    lambda path: storage.remove_tags(path, TAGS[:1]), paths
+                )),
+            ])
+
+    report('{} entries with {} tags'.format(count, len(TAGS)), results)
+
+
+if __name__ == '__main__':
+    main()
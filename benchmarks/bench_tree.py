@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the recursive get_tree fsfs used to ship with the iterative,
+level at a time tree walk, and measure how soon iter_tree yields it's first
+edge.
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs._search import safe_scandir
+
+
+def recursive_get_tree(root, data_root, tree):
+    '''The recursive get_tree replaced by fsfs._search.tree_edges'''
+
+    if os.path.isdir(root + '/' + data_root):
+        tree = tree.setdefault(fsfs.get_entry(root).name, {})
+
+    for item in safe_scandir(root):
+        if item.name == data_root:
+            continue
+        if item.is_dir():
+            recursive_get_tree(item.path, data_root, tree)
+
+
+def main():
+    with tempdir() as root:
+        dirs = make_tree(root, width=8, depth=4, entry_every=2)
+        data_root = fsfs.get_data_root()
+
+        def first_edge():
+            for edge in fsfs.iter_tree(root, threads=1):
+                break
+
+        results = [
+            ('recursive get_tree', timeit(
+                lambda: recursive_get_tree(root, data_root, {})
+            )),
+            ('get_tree, 1 thread', timeit(
+                lambda: fsfs.get_tree(root, threads=1)
+            )),
+            ('get_tree, 8 threads', timeit(
+                lambda: fsfs.get_tree(root, threads=8)
+            )),
+            ('get_tree, levels=1', timeit(
+                lambda: fsfs.get_tree(root, levels=1, threads=1)
+            )),
+            ('iter_tree first edge', timeit(first_edge)),
+        ]
+
+        report('Tree of {} directories'.format(len(dirs)), results)
+
+
+if __name__ == '__main__':
+    main()
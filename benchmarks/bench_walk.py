@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the yield rate of depth first searches using the iterative walker
+versus the regenerator based recursive walker it replaced.
+
+Pass the number of directories as the first argument, defaults to 10^5:
+
+    python benchmarks/bench_walk.py 1000000
+'''
+from __future__ import absolute_import, division, print_function
+
+import sys
+from common import fsfs, tempdir, make_tree, timeit, report
+from fsfs import util
+from fsfs._search import scan_dir, _search_dn
+
+
+@util.regenerator
+def legacy_search_dn(root, depth=3, gap=0, levels=0, level=0,
+                     skip_root=False, at_root=True, data_root=None,
+                     rules=None):
+
+    is_entry, dirs = scan_dir(root, data_root, rules)
+
+    if is_entry:
+        gap = 0
+        if not (skip_root and at_root):
+            level += 1
+            yield util.unipath(root)
+
+    if gap == depth or (levels and level == levels):
+        return
+
+    for _, dir in dirs:
+        yield legacy_search_dn(
+            dir, depth, gap + 1, levels, level, skip_root, False, data_root,
+            rules,
+        )
+
+
+def tree_shape(size):
+    '''Get the depth of a tree 10 directories wide with at least size
+    directories'''
+
+    depth, count = 0, 0
+    while count < size:
+        depth += 1
+        count += 10 ** depth
+    return depth, count
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    depth, count = tree_shape(size)
+    with tempdir() as root:
+        make_tree(root, width=10, depth=depth, entry_every=1)
+        data_root = fsfs.get_data_root()
+        rules = fsfs.get_ignore_rules()
+
+        def iterative():
+            walk = _search_dn(root, data_root=data_root, rules=rules)
+            assert sum(1 for _ in walk) == count
+
+        def recursive():
+            walk = legacy_search_dn(root, data_root=data_root, rules=rules)
+            assert sum(1 for _ in walk) == count
+
+        results = []
+        for name, fn in (('regenerator', recursive), ('iterative', iterative)):
+            seconds = timeit(fn, repeat=3)
+            rate = '{}, {} entries/s'.format(name, int(count / seconds))
+            results.append((rate, seconds))
+
+        report('Depth first walk of {} entries'.format(count), results)
+
+
+if __name__ == '__main__':
+    main()
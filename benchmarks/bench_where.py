@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+'''
+Find entries by data values by decoding every Entry and using an index.
+The entry factory's cache is cleared before each run so decoding is not
+skipped by the EntryData cache.
+'''
+from __future__ import absolute_import, division, print_function
+
+from common import fsfs, tempdir, timeit, report
+
+ENTRIES = 2000
+STATUSES = ('wip', 'review', 'approved', 'omit')
+
+
+def main():
+    with tempdir() as root:
+        for i in range(ENTRIES):
+            fsfs.write(
+                '{}/seq_{:02d}/sh_{:04d}'.format(root, i // 100, i),
+                status=STATUSES[i % len(STATUSES)],
+                frame_start=1001 + i,
+                frame_end=1100 + i,
+                notes='Lorem ipsum dolor sit amet ' * 10,
+            )
+
+        factory = fsfs.get_entry_factory()
+
+        def scan():
+            factory._cache.clear()
+            return list(fsfs.search(root).filter(
+                lambda e: e.read('status') == 'approved' and
+                e.read('frame_start') > 1500
+            ))
+
+        def where():
+            factory._cache.clear()
+            return list(fsfs.search(root).where(
+                status='approved', frame_start__gt=1500
+            ))
+
+        results = [('filter decoding every entry', timeit(scan, repeat=3))]
+        results.append(('where without index', timeit(where, repeat=3)))
+
+        fsfs.index_field('status', 'frame_start')
+        results.append(('build_index', timeit(
+            lambda: fsfs.build_index(root), repeat=1
+        )))
+        results.append(('where with index', timeit(where, repeat=3)))
+        assert len(where()) == len(scan())
+
+    report('Query {} entries by data value'.format(ENTRIES), results)
+
+
+if __name__ == '__main__':
+    main()
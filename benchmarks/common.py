@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Shared helpers for the fsfs benchmarks.
+
+Benchmarks are plain scripts, run them from the repository root:
+
+    python benchmarks/bench_select.py
+'''
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import shutil
+from tempfile import mkdtemp
+from contextlib import contextmanager
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fsfs  # noqa: E402
+
+
+@contextmanager
+def tempdir():
+    '''Yields a temporary directory removed on exit'''
+
+    path = mkdtemp()
+    try:
+        yield fsfs.util.unipath(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def make_tree(root, width=4, depth=4, entry_every=1, prefix='d'):
+    '''Create a tree of directories width wide and depth deep. Every
+    directory at a level divisible by entry_every is tagged as an Entry.
+
+    Returns:
+        list: paths of all directories created
+    '''
+
+    created = []
+    level = [root]
+    for i in range(1, depth + 1):
+        next_level = []
+        for parent in level:
+            for j in range(width):
+                path = '{}/{}{}_{}'.format(parent, prefix, i, j)
+                os.makedirs(path)
+                if i % entry_every == 0:
+                    os.makedirs(path + '/' + fsfs.get_data_root())
+                next_level.append(path)
+        created.extend(next_level)
+        level = next_level
+    return created
+
+
+def timeit(fn, repeat=5, number=1):
+    '''Return the best time in seconds of repeat runs of fn'''
+
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        for _ in range(number):
+            fn()
+        elapsed = (default_timer() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(title, results):
+    '''Print a table of (label, seconds) results'''
+
+    print(title)
+    print('-' * len(title))
+    for label, seconds in results:
+        print('{:<40} {:>10.3f} ms'.format(label, seconds * 1000))
+    print()
@@ -9,10 +9,110 @@ __version__ = '0.3.1'
 __license__ = 'MIT'
 __description__ = 'Tag filesystem locations and store metadata'
 
-from fsfs.api import *
-from fsfs.models import *
-from fsfs.policy import *
-from fsfs.util import *
-from fsfs.types import *
-from fsfs.factory import *
-from fsfs.channels import *
+import sys
+
+# Public names by module. On Python 3.7+ modules are imported the first time
+# one of their names is accessed, so import fsfs stays cheap for plugins
+# and command line tools that never touch the codec, lock or cli subsystems.
+_exports = (
+    ('fsfs.api', (
+        'DOWN', 'UP', 'DFS', 'BFS', 'IDDFS', 'PRIORITY',
+        'DEFAULT_SELECTOR_SEP', 'get_policy', 'set_policy',
+        'set_default_policy', 'get_data_decoder', 'set_data_decoder',
+        'decode_data', 'get_data_encoder', 'set_data_encoder', 'encode_data',
+        'get_data_root', 'set_data_root', 'get_data_file', 'set_data_file',
+        'get_entry_factory', 'set_entry_factory', 'get_tag_storage',
+        'set_tag_storage', 'migrate_tags', 'get_data_storage',
+        'set_data_storage', 'migrate_data', 'get_ignore_rules',
+        'set_ignore_rules', 'ignore_dirs', 'get_index_fields',
+        'set_index_fields', 'index_field', 'build_index', 'get_entry',
+        'get_id_generator', 'set_id_generator', 'generate_id', 'InvalidTag',
+        'validate_tag', 'validate_tags', 'make_tag_path', 'get_tags', 'tag',
+        'untag', 'tag_many', 'untag_many', 'read',
+        'write', 'read_blob', 'write_blob', 'read_file', 'write_file',
+        'delete', 'search', 'get_tree', 'iter_tree', 'quick_select',
+        'snapshot', 'restore', 'diff', 'send_changes',
+    )),
+    ('fsfs.models', (
+        'Entry', 'EntryData',
+    )),
+    ('fsfs.policy', (
+        '_global_policy', 'FsFsPolicy', 'JsonEncoder', 'JsonDecoder',
+        'YamlEncoder', 'YamlDecoder', 'DefaultPolicy', 'DefaultEncoder',
+        'DefaultDecoder', 'DefaultRoot', 'DefaultFile', 'DefaultFactory',
+        'DefaultTagStorage', 'DefaultDataStorage', 'DefaultIgnoreRules',
+    )),
+    ('fsfs.storage', (
+        'TagStorage', 'FilesTagStorage', 'SingleFileTagStorage',
+        'TAG_STORAGES', 'migrate_tag_storage', 'DataStorage',
+        'FileDataStorage', 'ShardedDataStorage', 'JournaledDataStorage',
+        'DATA_STORAGES', 'migrate_data_storage',
+    )),
+    ('fsfs.ignore', (
+        'IGNORE_FILE', 'NO_ENTRIES_FILE', 'IgnoreRules',
+    )),
+    ('fsfs.util', (
+        'touch', 'atomic_write', 'atomic_append', 'unipath', 'joinpath',
+        'intern_path', 'tupilize', 'update_dict', 'merge_dict', 'copy_file',
+        'copy_tree', 'move_tree', 'suppress', 'regenerator',
+    )),
+    ('fsfs.types', (
+        'File', 'FrozenDict', 'freeze', 'thaw',
+    )),
+    ('fsfs.factory', (
+        'RegistrationError', 'SimpleEntryFactory', 'EntryFactory',
+    )),
+    ('fsfs.channels', (
+        'band', 'EntryCreated', 'EntryMoved', 'EntryTagged', 'EntryUntagged',
+        'EntryMissing', 'EntryRelinked', 'EntryDeleted', 'EntryDataChanged',
+        'EntryDataDeleted', 'EntryUUIDChanged', 'transfer_receivers',
+        'IDENTIFIERS', 'has_receivers', 'send', 'send_lazy', 'EventQueue',
+        'deferred', 'get_event_queue',
+    )),
+)
+
+if sys.version_info < (3, 7):
+
+    from fsfs.api import *
+    from fsfs.models import *
+    from fsfs.policy import *
+    from fsfs.util import *
+    from fsfs.types import *
+    from fsfs.factory import *
+    from fsfs.channels import *
+    from fsfs.storage import *
+    from fsfs.ignore import *
+
+else:
+
+    _lazy_names = dict(
+        (name, module) for module, names in _exports for name in names
+    )
+    __all__ = [name for name in _lazy_names if not name.startswith('_')]
+
+    def _import(module_name):
+        __import__(module_name)
+        return sys.modules[module_name]
+
+    def __getattr__(name):
+        '''Import the module providing name on first access (PEP 562)'''
+
+        if name in _lazy_names:
+            module = _import(_lazy_names[name])
+            value = getattr(module, name)
+            if name != '_global_policy':
+                globals()[name] = value
+            return value
+
+        module_name = __name__ + '.' + name
+        try:
+            return _import(module_name)
+        except ImportError as e:
+            if e.name != module_name:
+                raise
+            raise AttributeError(
+                "module 'fsfs' has no attribute '{}'".format(name)
+            )
+
+    def __dir__():
+        return sorted(set(globals()) | set(_lazy_names))
@@ -1,6 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
-from fsfs.cli import cli
+import sys
+from fsfs import _server
 
-if __name__ == '__main__':
+
+def main():
+    '''Forward commands to a running fsfs server, falling back to running
+    the command line interface directly.'''
+
+    code = _server.forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
+
+    from fsfs.cli import cli
     cli()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import sys
 
 
 try:
@@ -16,3 +17,52 @@ try:
     from itertools import izip
 except ImportError:
     izip = zip
+
+try:
+    from os import scandir, walk
+except ImportError:
+    from scandir import scandir, walk
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    from os import replace
+except ImportError:
+    if sys.platform == 'win32':
+        import ctypes
+
+        MOVEFILE_REPLACE_EXISTING = 0x1
+
+        def replace(src, dst):
+            '''os.rename can not replace an existing file on Windows'''
+
+            encoding = sys.getfilesystemencoding()
+            if isinstance(src, bytes):
+                src = src.decode(encoding)
+            if isinstance(dst, bytes):
+                dst = dst.decode(encoding)
+            if not ctypes.windll.kernel32.MoveFileExW(
+                src, dst, MOVEFILE_REPLACE_EXISTING
+            ):
+                raise ctypes.WinError()
+    else:
+        # Python 2 os.rename replaces the destination atomically on posix
+        from os import rename as replace
+
+try:
+    from sys import intern
+except ImportError:
+    intern = intern
+
+try:
+    from urllib.parse import quote, unquote
+except ImportError:
+    from urllib import quote, unquote
@@ -0,0 +1,595 @@
+# -*- coding: utf-8 -*-
+'''
+Secondary indexes on Entry data fields.
+
+An index is a sqlite database stored in a .fsfsindex file in the directory
+it indexes. It stores the value of each indexed field for every Entry below
+that directory, along with the mtime of the Entry's data file:
+
+    fsfs.index_field('status', 'frame_start')
+    fsfs.build_index('/show')
+    fsfs.search('/show').where(status='approved', frame_start__gt=1001)
+
+:meth:`fsfs._search.Search.where` uses the nearest index at or above the
+search root that includes all of the queried fields, and falls back to
+decoding the data of every Entry otherwise. Data written in this process is
+indexed through the entry.data.changed channel. Matches are verified
+against the mtime of their data file, entries written by other processes
+are reindexed when they are found to be stale. Use :func:`build_index` to
+pick up entries created by other processes.
+
+When the :class:`fsfs._search.NegativeCache` is enabled, the index also
+stores the directories found to contain no Entries while it was built, so
+later walks below root skip them.
+
+Lookups are appended to field names with a double underscore:
+
+    exact, ne, gt, gte, lt, lte, in
+
+Entries missing a field never match a condition on that field.
+'''
+from __future__ import absolute_import, division, print_function
+
+__all__ = [
+    'INDEX_FILE',
+    'LOOKUPS',
+    'FieldIndexError',
+    'parse_conditions',
+    'make_predicate',
+    'Index',
+    'open_index',
+    'close_index',
+    'find_index',
+    'build_index',
+]
+
+import os
+import json
+import threading
+from multiprocessing.pool import ThreadPool
+from fsfs import api, util, channels, _search
+from fsfs._compat import basestring
+
+INDEX_FILE = '.fsfsindex'
+LOOKUPS = {
+    'exact': '=',
+    'ne': 'IS NOT',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'in': 'IN',
+}
+_compare = {
+    'exact': lambda a, b: a == b,
+    'ne': lambda a, b: a != b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+    'in': lambda a, b: a in b,
+}
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY, mtime REAL);
+CREATE TABLE IF NOT EXISTS fields (path TEXT, field TEXT, value);
+CREATE INDEX IF NOT EXISTS fields_value ON fields (field, value);
+CREATE INDEX IF NOT EXISTS fields_path ON fields (path);
+CREATE TABLE IF NOT EXISTS non_entries (
+    key TEXT, path TEXT, mtime REAL, dirs TEXT, PRIMARY KEY (key, path)
+);
+'''
+
+
+class FieldIndexError(Exception): pass
+
+
+def parse_conditions(conditions):
+    '''Parse keyword conditions like frame_start__gt=1001.
+
+    Returns:
+        list: of (field, lookup, value) tuples
+    '''
+
+    parsed = []
+    for key, value in sorted(conditions.items()):
+        field, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+        if lookup not in LOOKUPS:
+            raise FieldIndexError('Unsupported lookup: ' + key)
+        if lookup == 'in':
+            value = tuple(value)
+        parsed.append((field, lookup, value))
+    return parsed
+
+
+def _matches(data, parsed):
+    for field, lookup, value in parsed:
+        if field not in data:
+            return False
+        try:
+            if not _compare[lookup](data[field], value):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def make_predicate(conditions):
+    '''Make a Search predicate that reads and checks each Entry's data, used
+    when no index includes the queried fields.'''
+
+    parsed = parse_conditions(conditions)
+    return lambda entry: _matches(entry.read(), parsed)
+
+
+def _to_sql(value):
+    '''Convert a field value to a value sqlite can store and compare'''
+
+    if value is None or isinstance(value, (int, float, basestring)):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+def _type_check(value):
+    '''sqlite orders numbers before text, restrict comparisons to values of
+    the same type.'''
+
+    if isinstance(value, bool) or value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        return " AND typeof(value) IN ('integer', 'real')"
+    if isinstance(value, basestring):
+        return " AND typeof(value) = 'text'"
+    return ''
+
+
+def _data_mtime(path):
+    data_path = path + '/' + api.get_data_root()
+    try:
+        return api.get_data_storage().mtime(data_path)
+    except OSError:
+        return None
+
+
+class Index(object):
+    '''A sqlite index of Entry data fields below root.
+
+    Arguments:
+        root (str): Directory to index
+        path (str): Database file, defaults to {root}/.fsfsindex
+    '''
+
+    def __init__(self, root, path=None):
+        import sqlite3
+
+        self.root = util.unipath(root)
+        self.path = path or self.root + '/' + INDEX_FILE
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+        self._fields = None
+
+    def __repr__(self):
+        return '<fsfs.Index>(root={!r}, fields={!r})'.format(
+            self.root, self.fields
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @property
+    def fields(self):
+        '''Indexed fields'''
+
+        if self._fields is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM meta WHERE key = 'fields'"
+                ).fetchone()
+            self._fields = tuple(json.loads(row[0])) if row else ()
+        return self._fields
+
+    def _relpath(self, path):
+        if path == self.root:
+            return ''
+        if path.startswith(self.root + '/'):
+            return path[len(self.root) + 1:]
+
+    def _abspath(self, relpath):
+        return self.root + '/' + relpath if relpath else self.root
+
+    def covers(self, path, fields):
+        '''Check if this index can answer a query for fields below path'''
+
+        return (
+            self._relpath(path) is not None and
+            set(fields).issubset(self.fields)
+        )
+
+    def _rows(self, relpath, data):
+        return [
+            (relpath, field, _to_sql(data[field]))
+            for field in self.fields if field in data
+        ]
+
+    def _write(self, records):
+        '''Replace the rows of records, a list of (relpath, data, mtime)'''
+
+        with self._lock, self._conn:
+            paths = [(relpath,) for relpath, _, _ in records]
+            self._conn.executemany(
+                'DELETE FROM fields WHERE path = ?', paths
+            )
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?)',
+                [(relpath, mtime) for relpath, _, mtime in records],
+            )
+            rows = []
+            for relpath, data, mtime in records:
+                rows.extend(self._rows(relpath, data))
+            self._conn.executemany(
+                'INSERT INTO fields VALUES (?, ?, ?)', rows
+            )
+
+    def update(self, path, data=None, mtime=None):
+        '''Index an Entry's data, reads the data when data is None'''
+
+        relpath = self._relpath(path)
+        if relpath is None:
+            return
+
+        if data is None:
+            data = api.get_entry(path).read()
+        if mtime is None:
+            mtime = _data_mtime(path)
+        self._write([(relpath, data, mtime)])
+
+    def remove(self, path):
+        '''Remove path and all paths below it from the index'''
+
+        relpath = self._relpath(path)
+        if relpath is None:
+            return
+
+        with self._lock, self._conn:
+            for table in ('entries', 'fields'):
+                if not relpath:
+                    self._conn.execute('DELETE FROM ' + table)
+                    continue
+                self._conn.execute(
+                    'DELETE FROM {} WHERE path = ? OR '
+                    'substr(path, 1, ?) = ?'.format(table),
+                    (relpath, len(relpath) + 1, relpath + '/'),
+                )
+
+    def write_non_entries(self, key, records):
+        '''Replace the non-Entry directories stored for key, used by
+        :class:`fsfs._search.NegativeCache`.
+
+        Arguments:
+            key (str): Identifies the data_root and ignore rules used
+            records (list): of (relpath, mtime, child directory names)
+        '''
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM non_entries WHERE key = ?', (key,)
+            )
+            self._conn.executemany(
+                'INSERT INTO non_entries VALUES (?, ?, ?, ?)',
+                [
+                    (key, relpath, mtime, json.dumps(names))
+                    for relpath, mtime, names in records
+                ],
+            )
+
+    def read_non_entries(self, key):
+        '''Get the non-Entry directories stored for key.
+
+        Returns:
+            list: of (relpath, mtime, child directory names)
+        '''
+
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path, mtime, dirs FROM non_entries WHERE key = ?',
+                (key,),
+            ).fetchall()
+        return [(path, mtime, json.loads(dirs)) for path, mtime, dirs in rows]
+
+    def build(self, fields, threads=8):
+        '''Index fields of all entries below root, replacing the existing
+        contents of the index.
+
+        Returns:
+            int: Number of entries indexed
+        '''
+
+        from fsfs import _snapshot
+
+        with self._lock, self._conn:
+            for table in ('entries', 'fields'):
+                self._conn.execute('DELETE FROM ' + table)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                ('fields', json.dumps(sorted(set(fields)))),
+            )
+            self._fields = None
+
+        def read(path):
+            record = _snapshot.read_record(self.root, path)
+            data = api.decode_data(record['data']) if record['data'] else {}
+            return record['path'], data or {}, record['mtime']
+
+        count = 0
+        pool = ThreadPool(threads)
+        try:
+            paths = _snapshot.walk_entries(self.root)
+            batch = []
+            for record in pool.imap(read, paths, 32):
+                batch.append(record)
+                if len(batch) == 1000:
+                    self._write(batch)
+                    count += len(batch)
+                    batch = []
+            self._write(batch)
+            count += len(batch)
+        finally:
+            pool.close()
+            pool.join()
+
+        if _search.negatives.enabled:
+            _search.negatives.save(self)
+
+        return count
+
+    def _query(self, parsed):
+        '''Returns a dict mapping relpath to mtime of rows matching parsed'''
+
+        selects = []
+        params = []
+        for field, lookup, value in parsed:
+            op = LOOKUPS[lookup]
+            if lookup == 'in':
+                values = [_to_sql(v) for v in value if v is not None]
+                if not values and None not in value:
+                    return {}
+                # NULL never equals anything in sqlite, match None with IS
+                clauses = []
+                if values:
+                    clauses.append(
+                        'value IN ({})'.format(', '.join('?' * len(values)))
+                    )
+                if None in value:
+                    clauses.append('value IS NULL')
+                selects.append(
+                    'SELECT path FROM fields WHERE field = ? AND ({})'
+                    .format(' OR '.join(clauses))
+                )
+                params.append(field)
+                params.extend(values)
+                continue
+
+            # Like the scan, ne matches values of any type including None
+            if lookup == 'exact' and value is None:
+                op, check = 'IS', ''
+            elif lookup == 'ne':
+                check = ''
+            else:
+                check = _type_check(value)
+            selects.append(
+                'SELECT path FROM fields WHERE field = ? AND value {} ?'
+                .format(op) + check
+            )
+            params.extend([field, _to_sql(value)])
+
+        sql = (
+            'SELECT path, mtime FROM entries WHERE path IN ({})'
+            .format(' INTERSECT '.join(selects))
+        )
+        with self._lock:
+            return dict(self._conn.execute(sql, params).fetchall())
+
+    def get_value(self, path, field):
+        '''Get the indexed value of an Entry's field without reading it's
+        data. Values are stored as they are compared by sqlite, values that
+        are not numbers or strings are stored as JSON.
+
+        Returns:
+            tuple: (data mtime, True if the Entry has field, value) or None
+            when path is not indexed
+        '''
+
+        relpath = self._relpath(path)
+        if relpath is None:
+            return
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT entries.mtime, fields.path, fields.value '
+                'FROM entries LEFT JOIN fields '
+                'ON fields.path = entries.path AND fields.field = ? '
+                'WHERE entries.path = ?',
+                (field, relpath),
+            ).fetchone()
+        if row is not None:
+            return row[0], row[1] is not None, row[2]
+
+    def search_paths(self, root, conditions, skip_root=False):
+        '''Yield the paths of entries below root that match conditions.
+        Each match is verified against the mtime of it's data file, stale
+        entries are reindexed and checked again.
+
+        Arguments:
+            root (str): Directory to search
+            conditions (dict): Keyword conditions like status='approved'
+            skip_root (bool): Do not yield root
+
+        Returns:
+            generator: yielding Entry paths
+        '''
+
+        root = util.unipath(root)
+        prefix = self._relpath(root)
+        if prefix is None:
+            return
+
+        parsed = parse_conditions(conditions)
+        for relpath, mtime in sorted(self._query(parsed).items()):
+            if prefix and relpath != prefix:
+                if not relpath.startswith(prefix + '/'):
+                    continue
+            path = self._abspath(relpath)
+            if skip_root and path == root:
+                continue
+
+            current_mtime = _data_mtime(path)
+            if current_mtime is None:
+                self.remove(path)
+                continue
+
+            if current_mtime != mtime:
+                data = api.get_entry(path).read()
+                self.update(path, data, current_mtime)
+                if not _matches(data, parsed):
+                    continue
+            yield path
+
+    def search(self, root, conditions, skip_root=False):
+        '''Like :meth:`search_paths` but yields Entry objects'''
+
+        paths = self.search_paths(root, conditions, skip_root)
+        return (api.get_entry(path) for path in paths)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _on_data_changed(entry, data):
+    path = util.unipath(entry.path)
+    for index in list(_indexes.values()):
+        if index._relpath(path) is not None:
+            index.update(path, data)
+
+
+def _on_entry_removed(entry, *args):
+    path = util.unipath(entry.path)
+    for index in list(_indexes.values()):
+        index.remove(path)
+
+
+def _on_entry_moved(entry, old_path, new_path):
+    _on_entry_removed(entry)
+    new_path = util.unipath(new_path)
+    for index in list(_indexes.values()):
+        if index._relpath(new_path) is not None:
+            index.update(new_path)
+
+
+_receivers = (
+    (channels.EntryDataChanged, _on_data_changed),
+    (channels.EntryDeleted, _on_entry_removed),
+    (channels.EntryDataDeleted, _on_entry_removed),
+    (channels.EntryMoved, _on_entry_moved),
+)
+
+
+def _connect_receivers():
+    for channel, receiver in _receivers:
+        channel.connect(receiver)
+
+
+def _disconnect_receivers():
+    for channel, receiver in _receivers:
+        channel.disconnect(receiver)
+
+
+def open_index(root):
+    '''Get the Index of root, the Index is kept open and updated when Entry
+    data changes in this process.
+
+    Returns:
+        Index or None when root has no index
+    '''
+
+    root = util.unipath(root)
+    index = _indexes.get(root)
+    if index is not None:
+        return index
+
+    if not os.path.isfile(root + '/' + INDEX_FILE):
+        return
+
+    with _indexes_lock:
+        if root not in _indexes:
+            if not _indexes:
+                _connect_receivers()
+            _indexes[root] = Index(root)
+        return _indexes[root]
+
+
+def close_index(root):
+    '''Close the Index of root, it is no longer updated when Entry data
+    changes in this process.'''
+
+    root = util.unipath(root)
+    with _indexes_lock:
+        index = _indexes.pop(root, None)
+        if index is not None and not _indexes:
+            _disconnect_receivers()
+    if index is not None:
+        index.close()
+
+
+def find_index(path, fields):
+    '''Find the nearest index at or above path that includes fields.
+
+    Returns:
+        Index or None
+    '''
+
+    path = util.unipath(path)
+    while True:
+        index = open_index(path)
+        if index is not None and index.covers(path, fields):
+            return index
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return
+        path = parent
+
+
+def build_index(root, fields=None, threads=8):
+    '''Create or rebuild the index of root.
+
+    Arguments:
+        root (str): Directory to index
+        fields (list): Fields to index, defaults to the global policy's
+            index_fields
+        threads (int): Number of threads used to read entries
+
+    Returns:
+        Index
+    '''
+
+    root = util.unipath(root)
+    fields = fields or api.get_index_fields()
+    if not fields:
+        raise FieldIndexError(
+            'No fields to index, declare fields using fsfs.index_field.'
+        )
+
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            if not _indexes:
+                _connect_receivers()
+            index = _indexes[root] = Index(root)
+
+    index.build(fields, threads)
+    return index
@@ -12,16 +12,37 @@ __all__ = [
     'search_uuid',
     'one_uuid',
     'select_from_tree',
-    'safe_scandir'
+    'select_shallowest',
+    'tree_edges',
+    'safe_scandir',
+    'scan_dir',
+    'AncestorCache',
+    'ancestors',
+    'NegativeCache',
+    'negatives',
+    'parent_path',
+    'Selector',
 ]
 
 import os
-from scandir import walk, scandir
+import re
+import json
+import heapq
+import itertools
+from collections import deque
+import time
+import fnmatch
 import errno
-from fsfs import util, api
+import threading
+from fsfs._compat import basestring, scandir
+from fsfs import util, api, channels
 from fsfs.constants import (
     DOWN,
     UP,
+    DFS,
+    BFS,
+    IDDFS,
+    PRIORITY,
     DEFAULT_SEARCH_DN_DEPTH,
     DEFAULT_SEARCH_UP_DEPTH,
     DEFAULT_SEARCH_DN_LEVELS,
@@ -37,9 +58,97 @@ IGNORE = (
     59,  # WinError network access
     errno.EINVAL,  # WinError network access
 )
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+def _compile_part(part):
+    '''Compile one selector part to a function accepting a directory name.'''
+
+    if part.startswith('re:'):
+        return re.compile(part[3:]).search
+    if part.startswith('='):
+        return part[1:].__eq__
+    if GLOB_CHARS.search(part):
+        return re.compile(fnmatch.translate(part)).match
+    return lambda name: part in name
+
+
+class Selector(object):
+    '''A compiled selector. A selector is a hierarchy of names separated by
+    sep, each part is compiled once to a matching function so that walks
+    never reparse or copy the selector.
+
+    Part syntax:
+        name: matches directory names containing name
+        =name: matches directory names equal to name
+        na*e: glob pattern, used when a part contains any of *?[
+        re:^na.e$: regular expression searched in the directory name
+
+    Examples:
+        >>> selector = Selector('proj/=seq_010/sh_0[0-4]0')
+        >>> selector.match(0, 'my_project')
+        True
+        >>> selector.match(1, 'seq_0100')
+        False
+        >>> selector.match(2, 'sh_020')
+        True
+    '''
+
+    def __init__(self, selector, sep=DEFAULT_SELECTOR_SEP):
+        if isinstance(selector, Selector):
+            self.parts = selector.parts
+            self.matchers = selector.matchers
+            return
+
+        if isinstance(selector, basestring):
+            selector = selector.strip(sep).split(sep)
+
+        self.parts = tuple(selector)
+        self.matchers = tuple(_compile_part(part) for part in self.parts)
+
+    def __repr__(self):
+        return '<fsfs.Selector>(parts={!r})'.format(self.parts)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def match(self, index, name):
+        '''Returns True if name matches the part at index'''
+
+        return bool(self.matchers[index](name))
+
+    def match_name(self, name):
+        '''Returns True if name matches the last part of this selector'''
+
+        return bool(self.matchers[-1](name))
 
 
 class Search(object):
+    '''Lazily yields the Entries below or above root matching a chain of
+    filters. Filters on tags, uuids and names are checked against paths,
+    Entry objects are only created for the matches yielded and for
+    :meth:`filter` predicates. :meth:`paths`, :meth:`count` and
+    :meth:`exists` don't create Entry objects unless filter predicates
+    require them.
+
+    Arguments:
+        root (str): Directory to search
+        direction (int): Direction to search (fsfs.UP or fsfs.DOWN)
+        depth (int): Maximum depth of search
+        levels (int): Maximum number of nested Entries
+        skip_root (bool): Skip search in root directory
+        predicates (list): Functions accepting an Entry
+        selector (Selector): Hierarchy of names to match
+        sep (str): Selector separator
+        conditions (dict): Data conditions, see :meth:`where`
+        path_predicates (list): Functions accepting an Entry path
+        max_results (int): Stop after yielding max_results Entries
+        ordering (str): Key to order results by, see :meth:`order_by`
+        skip (int): Number of results to skip
+        strategy (str): Walk strategy, one of DFS, BFS, IDDFS or PRIORITY
+        name_selectors (list): Selectors passed to :meth:`name`, the
+            PRIORITY strategy visits directories matching them first
+    '''
 
     def __init__(
         self,
@@ -50,7 +159,14 @@ class Search(object):
         skip_root=False,
         predicates=None,
         selector=None,
-        sep=None
+        sep=None,
+        conditions=None,
+        path_predicates=None,
+        max_results=None,
+        ordering=None,
+        skip=0,
+        strategy=DFS,
+        name_selectors=None,
     ):
 
         self.root = root
@@ -61,34 +177,97 @@ class Search(object):
         self.predicates = predicates or []
         self.selector = selector
         self.sep = sep
+        self.conditions = conditions or {}
+        self.path_predicates = path_predicates or []
+        self.max_results = max_results
+        self.ordering = ordering
+        self.skip = skip
+        self.strategy = strategy
+        self.name_selectors = name_selectors or []
+        if strategy not in (DFS, BFS, IDDFS, PRIORITY):
+            raise RuntimeError('Invalid strategy: ' + str(strategy))
         self._generator = self._make_generator()
 
-    def _make_generator(self):
-        if self.selector:
-            entries = select_from_tree(
+    def _search_index(self):
+        '''Returns a generator yielding the paths of entries matching
+        conditions from the nearest index that includes all of their fields,
+        or None.'''
+
+        if self.direction != DOWN or self.selector:
+            return
+
+        from fsfs import _index
+
+        fields = [f for f, _, _ in _index.parse_conditions(self.conditions)]
+        index = _index.find_index(self.root, fields)
+        if index is not None:
+            return index.search_paths(
+                self.root, self.conditions, self.skip_root
+            )
+
+    def _make_paths(self):
+        '''Returns a generator yielding the paths of matching entries,
+        Entry objects are only created to check predicates.'''
+
+        predicates = self.predicates
+        paths = None
+        if self.conditions:
+            paths = self._search_index()
+            if paths is None:
+                from fsfs import _index
+                predicate = _index.make_predicate(self.conditions)
+                predicates = predicates + [predicate]
+
+        if paths is None and self.selector:
+            paths = _select_paths(
                 self.root,
                 self.selector,
                 self.sep,
                 self.direction,
                 self.depth,
-                self.skip_root
+                self.skip_root,
+                strategy=self.strategy,
             )
-        else:
-            entries = search(
+        elif paths is None:
+            paths = _search_paths(
                 self.root,
                 self.direction,
                 self.depth,
                 self.levels,
-                self.skip_root
+                self.skip_root,
+                self.strategy,
+                _name_priority(self.name_selectors),
             )
 
-        if not self.predicates:
-            return entries
-        elif len(self.predicates) == 1:
-            p = self.predicates[0]
-            return (e for e in entries if p(e))
-        else:
-            return (e for e in entries if all([p(e) for p in self.predicates]))
+        for p in self.path_predicates:
+            paths = _filter_paths(p, paths)
+
+        if len(predicates) == 1:
+            p = predicates[0]
+            paths = (path for path in paths if p(api.get_entry(path)))
+        elif predicates:
+            paths = (
+                path for path in paths
+                if all([p(api.get_entry(path)) for p in predicates])
+            )
+
+        if self.ordering:
+            return _order_paths(
+                paths, self.root, self.ordering, self.skip, self.max_results
+            )
+
+        if self.skip or self.max_results is not None:
+            stop = None
+            if self.max_results is not None:
+                stop = self.skip + self.max_results
+            paths = itertools.islice(paths, self.skip, stop)
+        return paths
+
+    def _make_generator(self):
+        # Paths and indexes are only looked up when iteration starts, so
+        # chaining clones does not touch the filesystem
+        for path in self._make_paths():
+            yield api.get_entry(path)
 
     def __iter__(self):
         return self
@@ -115,6 +294,78 @@ class Search(object):
         except StopIteration:
             return
 
+    def limit(self, n):
+        '''Returns a new Search object that stops after yielding n entities.
+        The walk stops as soon as the nth match is found.'''
+
+        return self.clone(max_results=n)
+
+    def offset(self, n):
+        '''Returns a new Search object that skips the first n entities'''
+
+        return self.clone(skip=n)
+
+    def page(self, number, size):
+        '''Returns a new Search object yielding one page of entities, use
+        with :meth:`order_by` for stable pages.
+
+        Arguments:
+            number (int): Page number starting at 1
+            size (int): Number of entities per page
+        '''
+
+        return self.clone(skip=(number - 1) * size, max_results=size)
+
+    def order_by(self, key):
+        '''Returns a new Search object yielding entities ordered by key.
+        Prefix key with - to order in descending order.
+
+        Keys:
+            name: Entry name
+            path: Entry path
+            mtime: mtime of the Entry's data
+            any other key: value of a data key, Entries missing the key sort
+                last in both orders. Values are read from the nearest index
+                that includes the key when it is up to date, otherwise from
+                Entry data
+
+        Combined with :meth:`limit` or :meth:`page` only the entities up to
+        the end of the page are held in memory.
+
+        Examples:
+            .. code-block:: python
+
+                search('.').tags('asset').order_by('-mtime').page(1, 50)
+        '''
+
+        return self.clone(ordering=key)
+
+    def first(self, n=1):
+        '''Returns a list of the first n entities, stopping the walk as
+        soon as they are found.'''
+
+        return list(self.limit(n))
+
+    def paths(self):
+        '''Returns a generator yielding the paths of matching entities
+        without creating Entry objects. Starts a new walk.'''
+
+        return self._make_paths()
+
+    def count(self):
+        '''Returns the number of matching entities without creating Entry
+        objects. Starts a new walk.'''
+
+        return sum(1 for _ in self._make_paths())
+
+    def exists(self):
+        '''Returns True if any entity matches, stopping the walk at the first
+        match. Starts a new walk.'''
+
+        for _ in self._make_paths():
+            return True
+        return False
+
     def clone(self, **kwargs):
         '''Clone this Search object. Pass kwargs to override attributes on
         the Search object.'''
@@ -127,32 +378,104 @@ class Search(object):
         kwargs.setdefault('predicates', self.predicates)
         kwargs.setdefault('selector', self.selector)
         kwargs.setdefault('sep', self.sep)
+        kwargs.setdefault('conditions', self.conditions)
+        kwargs.setdefault('path_predicates', self.path_predicates)
+        kwargs.setdefault('max_results', self.max_results)
+        kwargs.setdefault('ordering', self.ordering)
+        kwargs.setdefault('skip', self.skip)
+        kwargs.setdefault('strategy', self.strategy)
+        kwargs.setdefault('name_selectors', self.name_selectors)
         return Search(**kwargs)
 
     def tags(self, *tags):
         '''Retruns a new Search object yielding entities that match tags'''
 
-        for tag in tags:
-            api.validate_tag(tag)
+        api.validate_tags(tags)
 
-        predicate = lambda e: all([tag in e.tags for tag in tags])
-        return self.clone(predicates=self.predicates + [predicate])
+        data_root = api.get_data_root()
+        tag_storage = api.get_tag_storage()
+
+        def predicate(path):
+            path_tags = tag_storage.get_tags(path + '/' + data_root)
+            return all([tag in path_tags for tag in tags])
+
+        return self.clone(path_predicates=self.path_predicates + [predicate])
+
+    def tag(self, *tags, **kwargs):
+        '''Add tags to all entities yielded by this Search.
+
+        See also:
+            :func:`fsfs.api.tag_many`
+        '''
+
+        return api.tag_many(self, *tags, **kwargs)
+
+    def untag(self, *tags, **kwargs):
+        '''Remove tags from all entities yielded by this Search.
+
+        See also:
+            :func:`fsfs.api.untag_many`
+        '''
+
+        return api.untag_many(self, *tags, **kwargs)
 
     def uuid(self, uuid):
         '''Returns a new Search object yielding entities that match uuid'''
 
-        predicate = lambda e: uuid == e.uuid
-        return self.clone(predicates=self.predicates + [predicate])
+        data_root = api.get_data_root()
+        uuid_file = 'uuid_' + uuid
+
+        def predicate(path):
+            for e in safe_scandir(path + '/' + data_root):
+                if e.name.startswith('uuid_'):
+                    return e.name == uuid_file
+            return False
+
+        return self.clone(path_predicates=self.path_predicates + [predicate])
 
     def name(self, name, sep=DEFAULT_SELECTOR_SEP):
-        '''Returns a new Search object yielding objects that match name'''
+        '''Returns a new Search object yielding objects that match name.
+
+        name can be a :class:`Selector` or a selector string, see
+        :class:`Selector` for the supported part syntax.'''
+
+        selector = Selector(name, sep)
+        name_selectors = self.name_selectors + [selector]
+        if len(selector) > 1:
+            return self.clone(
+                selector=selector,
+                sep=sep,
+                name_selectors=name_selectors,
+            )
 
-        if sep in name:
-            name = name.strip(sep)
-            return self.clone(selector=name, sep=sep)
+        predicate = lambda path: selector.match_name(os.path.basename(path))
+        return self.clone(
+            path_predicates=self.path_predicates + [predicate],
+            name_selectors=name_selectors,
+        )
 
-        predicate = lambda e: name in e.name
-        return self.clone(predicates=self.predicates + [predicate])
+    def where(self, **conditions):
+        '''Returns a new Search object yielding entities whose data matches
+        conditions. Append a lookup to a field name with a double underscore
+        to compare values using one of: exact, ne, gt, gte, lt, lte, in.
+
+        Downward searches use the nearest index at or above root that
+        includes all of the queried fields, see :func:`fsfs.build_index`.
+        Indexed searches yield all matching entries below root ignoring
+        depth and levels. Without an index every Entry's data is read.
+
+        Examples:
+            .. code-block:: python
+
+                search('.').where(status='approved', frame_start__gt=1001)
+        '''
+
+        if not conditions:
+            return self.clone()
+
+        merged = dict(self.conditions)
+        merged.update(conditions)
+        return self.clone(conditions=merged)
 
     def filter(self, predicate):
         '''Returns a new Search object with a new filter predicate.
@@ -163,6 +486,95 @@ class Search(object):
         return self.clone(predicates=self.predicates + [predicate])
 
 
+def _filter_paths(predicate, paths):
+    return (path for path in paths if predicate(path))
+
+
+def _sort_value(value):
+    '''Numbers sort before strings, other values are compared as JSON,
+    matching the values stored in indexes.'''
+
+    if isinstance(value, (int, float)):
+        return (0, value)
+
+    from fsfs._index import _to_sql
+    return (1, _to_sql(value))
+
+
+def _value_key(value, path):
+    '''Sort key of an Entry's value, (missing, key) so None sorts last'''
+
+    if value is None:
+        return 1, path
+    return 0, (_sort_value(value), path)
+
+
+class _Descending(object):
+    '''Wraps a sort key, inverting its order'''
+
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def _order_key(root, key):
+    '''Get a function returning the (missing, key) sort key of an Entry
+    path, missing is 1 for Entries without a value for key.'''
+
+    if key == 'path':
+        return lambda path: (0, path)
+    if key == 'name':
+        return lambda path: (0, (os.path.basename(path), path))
+
+    from fsfs import _index
+
+    if key == 'mtime':
+        return lambda path: _value_key(_index._data_mtime(path), path)
+
+    index = _index.find_index(root, [key])
+
+    def data_key(path):
+        if index is not None:
+            indexed = index.get_value(path, key)
+            if indexed and indexed[0] == _index._data_mtime(path):
+                value = indexed[2] if indexed[1] else None
+                return _value_key(value, path)
+        return _value_key(api.get_entry(path).data.get(key), path)
+
+    return data_key
+
+
+def _order_paths(paths, root, ordering, skip=0, max_results=None):
+    '''Yield paths ordered by ordering. When max_results is given only the
+    first skip + max_results paths are kept in a heap.'''
+
+    key = _order_key(util.unipath(root), ordering.lstrip('-'))
+    if ordering.startswith('-'):
+        # Only invert the values, missing values still sort last
+        order_key = key
+        key = lambda path: _descending(order_key(path))
+
+    if max_results is None:
+        ordered = sorted(paths, key=key)
+    else:
+        ordered = heapq.nsmallest(skip + max_results, paths, key=key)
+
+    for path in ordered[skip:]:
+        yield path
+
+
+def _descending(sort_key):
+    missing, key = sort_key
+    return missing, _Descending(key)
+
+
 def safe_scandir(root):
     '''Silences permissions errors raised by scandir generator'''
 
@@ -188,78 +600,601 @@ def safe_scandir(root):
             return
 
 
-@util.regenerator
-def _search_dn(root, depth=DEFAULT_SEARCH_DN_DEPTH, gap=0,
-               levels=DEFAULT_SEARCH_DN_LEVELS, level=0,
-               skip_root=False, at_root=True, data_root=None):
+def scan_dir(path, data_root, rules=None, follow_links=True):
+    '''List the child directories of path that walks descend into. This is
+    the directory scan shared by all search walks, it skips directories
+    ignored by rules and honors ignore files and no entries files. When the
+    :class:`NegativeCache` is enabled, directories that are not Entries are
+    listed from the cache after one stat.
 
-    dirs = {
-        e.name: e.path
-        for e in safe_scandir(root) if e.is_dir()
-    }
+    Arguments:
+        path (str): Directory to list
+        data_root (str): Name of data directories
+        rules (IgnoreRules): Defaults to the global policy's ignore_rules
+        follow_links (bool): Include symbolic links to directories
 
-    if dirs.pop(data_root, None):
-        gap = 0
-        if not (skip_root and at_root):
-            level += 1
-            yield api.get_entry(util.unipath(root))
+    Returns:
+        tuple: (True if path is an Entry, list of (name, path) tuples)
+    '''
 
-    if gap == depth or (levels and level == levels):
+    rules = rules or api.get_ignore_rules()
+    use_cache = negatives.enabled
+    if use_cache:
+        mtime = _safe_mtime(path)
+        names = negatives.get(path, mtime, data_root, rules, follow_links)
+        if names is not None:
+            return False, [(name, path + '/' + name) for name in names]
+
+    is_entry = False
+    no_entries = False
+    ignore_file = None
+    dirs = []
+    for e in safe_scandir(path):
+        name = e.name
+        if name == data_root:
+            is_entry = e.is_dir()
+        elif name == rules.ignore_file:
+            ignore_file = path + '/' + name
+        elif name == rules.no_entries_file:
+            no_entries = True
+        elif (
+            e.is_dir(follow_symlinks=follow_links) and
+            not rules.ignores(name)
+        ):
+            dirs.append((name, path + '/' + name))
+
+    if no_entries:
+        dirs = []
+    elif ignore_file:
+        match = rules.read_ignore_file(ignore_file)
+        if match:
+            dirs = [(name, p) for name, p in dirs if not match(name)]
+
+    # Ignore files can change without changing the mtime of path
+    if use_cache and not is_entry and not ignore_file:
+        names = [n for n, _ in dirs]
+        negatives.set(path, mtime, data_root, rules, names, follow_links)
+
+    return is_entry, dirs
+
+
+def _walk(start, visit, strategy=DFS, priority=None):
+    '''Walk a tree of nodes without recursion.
+
+    Arguments:
+        start: Root node, nodes are tuples starting with a directory path
+        visit (callable): Called with each node, returns a tuple containing
+            a path to yield or None and a list of child nodes
+        strategy (str): One of DFS, BFS, IDDFS or PRIORITY
+        priority (callable): Used by the PRIORITY strategy, called with a
+            node and returns a sort key, lower keys are visited first.
+            Defaults to the depth of the node's path
+
+    Returns:
+        generator: yielding the paths returned by visit
+    '''
+
+    if strategy == IDDFS:
+        return _walk_iddfs(start, visit)
+    if strategy == PRIORITY:
+        return _walk_priority(start, visit, priority)
+    if strategy not in (DFS, BFS):
+        raise RuntimeError('Invalid strategy: ' + str(strategy))
+    return _walk_frontier(start, visit, strategy == BFS)
+
+
+def _walk_frontier(start, visit, breadth_first):
+    frontier = deque([start])
+    pop = frontier.popleft if breadth_first else frontier.pop
+    while frontier:
+        path, children = visit(pop())
+        if path is not None:
+            yield path
+        if breadth_first:
+            frontier.extend(children)
+        else:
+            frontier.extend(reversed(children))
+
+
+def _walk_priority(start, visit, priority=None):
+    priority = priority or (lambda node: _path_depth(node[0]))
+    counter = itertools.count()
+    heap = [(priority(start), next(counter), start)]
+    while heap:
+        node = heapq.heappop(heap)[2]
+        path, children = visit(node)
+        if path is not None:
+            yield path
+        for child in children:
+            heapq.heappush(heap, (priority(child), next(counter), child))
+
+
+def _walk_iddfs(start, visit):
+    # Depth limited walks yielding only the paths found at the limit, stops
+    # when no node at the limit has children
+    limit = 0
+    while True:
+        deeper = False
+        stack = [(0, start)]
+        while stack:
+            level, node = stack.pop()
+            path, children = visit(node)
+            if level < limit:
+                stack.extend((level + 1, c) for c in reversed(children))
+                continue
+            if path is not None:
+                yield path
+            if children:
+                deeper = True
+        if not deeper:
+            return
+        limit += 1
+
+
+def _name_priority(selectors):
+    '''Get a PRIORITY walk priority visiting directories whose names match
+    any part of selectors first, then shallower directories first.'''
+
+    if not selectors:
         return
 
-    for dir in dirs.values():
-
-        yield _search_dn(
-            dir,
-            depth,
-            gap + 1,
-            levels,
-            level,
-            skip_root,
-            False,
-            data_root
+    def priority(node):
+        path = node[0]
+        name = os.path.basename(path)
+        matched = any(
+            selector.match(index, name)
+            for selector in selectors
+            for index in range(len(selector))
         )
+        return (0 if matched else 1, _path_depth(path))
 
+    return priority
 
-def _search_up(root, levels=DEFAULT_SEARCH_UP_DEPTH, skip_root=False,
-               data_root=None):
 
-    level = -1
-    next_root = root
-    while True:
+def _walk_dn(root, depth=DEFAULT_SEARCH_DN_DEPTH,
+             levels=DEFAULT_SEARCH_DN_LEVELS, skip_root=False,
+             data_root=None, rules=None, strategy=BFS, priority=None):
+    '''Like :func:`_search_dn` using :func:`_walk` strategies'''
 
-        root = next_root
-        level += 1
+    def visit(node):
+        path, gap, level = node
+        is_entry, dirs = scan_dir(path, data_root, rules)
 
-        if levels and level > levels:
-            break
+        match = None
+        if is_entry:
+            gap = 0
+            if not (skip_root and path == root):
+                level += 1
+                match = path
 
-        if skip_root and level == 0:
-            next_root = os.path.dirname(root)
+        if gap == depth or (levels and level == levels):
+            return match, ()
+        return match, [(child, gap + 1, level) for _, child in dirs]
+
+    return _walk((root, 0, 0), visit, strategy, priority)
+
+
+def _search_dn(root, depth=DEFAULT_SEARCH_DN_DEPTH,
+               levels=DEFAULT_SEARCH_DN_LEVELS, skip_root=False,
+               data_root=None, rules=None):
+    '''Depth first walk yielding Entry paths. Uses an explicit stack of
+    iterators over directory listings, so no generator is created per
+    directory and nothing is flattened per yielded path.'''
+
+    root = util.unipath(root)
+    is_entry, dirs = scan_dir(root, data_root, rules)
+
+    gap = level = 0
+    if is_entry and not skip_root:
+        level = 1
+        yield root
+
+    if gap == depth or (levels and level == levels):
+        return
+
+    # Each frame holds an iterator over a listing, and the gap and level of
+    # the directory listed
+    stack = [(iter(dirs), gap, level)]
+    while stack:
+        children, gap, level = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
             continue
 
-        if os.path.isdir(root + '/' + data_root):
-            yield api.get_entry(root)
+        path = child[1]
+        is_entry, dirs = scan_dir(path, data_root, rules)
 
-        next_root = os.path.dirname(root)
-        if next_root == root:
-            break
+        gap += 1
+        if is_entry:
+            gap = 0
+            level += 1
+            yield path
 
+        if dirs and not (gap == depth or (levels and level == levels)):
+            stack.append((iter(dirs), gap, level))
 
-def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
-    '''Search a root directory yielding Entry objects. You can specify a
-    direction to search (fsfs.UP or fsfs.DOWN) and a maximum search depth.
+
+class AncestorCache(object):
+    '''Caches the nearest Entry directory at or above each directory looked
+    up. Directories along the chain between a lookup and its nearest Entry
+    share the result, so parent lookups for siblings cost one dict lookup
+    after the first call.
+
+    The cache is invalidated by the entry.created, entry.deleted,
+    entry.data.deleted, entry.moved and entry.relinked channels. Changes made
+    by other processes are not sent through channels, set validate to True to
+    also compare the mtime of every directory in a cached chain.
+
+    Cached directories are also kept in a tree of path components, so
+    invalidating a directory only visits the cached directories below it.
+    Lookups may run in many threads, changes are made holding a lock.
 
     Arguments:
-        root (str): Directory to search
-        direction (int): Direction to search (fsfs.UP or fsfs.DOWN)
-        depth (int): Maximum depth of search
-        skip_root (bool): Skip search in root directory
+        validate (bool): Compare the mtimes of cached chains
+        max_size (int): Number of directories cached before the cache is
+            cleared
+    '''
+
+    def __init__(self, validate=False, max_size=100000):
+        self.validate = validate
+        self.max_size = max_size
+        self._cache = {}
+        self._trees = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self._trees.clear()
+
+    def invalidate(self, path):
+        '''Drop cached results for path and all directories below path'''
+
+        path = path.rstrip('/')
+        parts = path.split('/')
+        with self._lock:
+            self._generation += 1
+            for data_root, node in self._trees.items():
+                for part in parts[:-1]:
+                    node = node.get(part)
+                    if node is None:
+                        break
+                else:
+                    node = node.pop(parts[-1], None)
+                if node is None:
+                    continue
+
+                # Paths were split without their trailing slash
+                stack = [(path, node)]
+                while stack:
+                    current, node = stack.pop()
+                    self._cache.pop((data_root, current), None)
+                    self._cache.pop((data_root, current + '/'), None)
+                    stack.extend(
+                        (current + '/' + part, child)
+                        for part, child in node.items()
+                    )
+
+    def _set(self, data_root, chain, nearest, generation):
+        mtimes = [
+            _safe_mtime(path) if self.validate else None for path in chain
+        ]
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while we were looking, the result may be stale
+                return
+            if len(self._cache) + len(chain) > self.max_size:
+                self._cache.clear()
+                self._trees.clear()
+
+            tree = self._trees.setdefault(data_root, {})
+            for path, mtime in zip(chain, mtimes):
+                self._cache[(data_root, path)] = (nearest, mtime)
+                node = tree
+                for part in path.rstrip('/').split('/'):
+                    node = node.setdefault(part, {})
+
+    def _is_valid(self, data_root, path, nearest):
+        while True:
+            cached = self._cache.get((data_root, path))
+            if not cached or cached[1] != _safe_mtime(path):
+                return False
+            if path == nearest:
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                return True
+            path = parent
+
+    def nearest(self, path, data_root):
+        '''Get the path of the nearest Entry at or above path.
+
+        Arguments:
+            path (str): Absolute directory path using forward slashes
+            data_root (str): Name of data directories
+
+        Returns:
+            str: Entry path or None
+        '''
+
+        generation = self._generation
+        chain = []
+        while True:
+            cached = self._cache.get((data_root, path))
+            if cached and (
+                not self.validate or
+                self._is_valid(data_root, path, cached[0])
+            ):
+                nearest = cached[0]
+                break
+
+            chain.append(path)
+            if os.path.isdir(path + '/' + data_root):
+                nearest = path
+                break
+
+            parent = os.path.dirname(path)
+            if parent == path:
+                nearest = None
+                break
+            path = parent
+
+        if chain:
+            self._set(data_root, chain, nearest, generation)
+        return nearest
+
+    def on_entry_changed(self, entry):
+        self.invalidate(entry.path)
+
+    def on_entry_moved(self, entry, old_path, new_path):
+        self.invalidate(old_path)
+        self.invalidate(new_path)
+
+
+class NegativeCache(object):
+    '''Caches the child directories of directories that are not Entries,
+    so walks that revisit large non-Entry directories, like render outputs
+    and caches, skip them after one stat instead of a full listing.
+
+    Each result is keyed by the mtime of it's directory, which changes
+    whenever a child is created, removed or renamed, so a directory that
+    becomes an Entry is listed again. Changes deeper in the tree change the
+    mtime of their own directory, so every directory is validated by it's
+    own stat rather than trusting the mtime of the top of a subtree.
+    Directories modified less than min_age seconds before they were listed
+    are not cached, mtimes may not have the resolution to tell changes made
+    in the same tick apart.
+
+    The cache is disabled by default, set :attr:`enabled` on
+    :data:`negatives` to use it. When the cache is enabled
+    :func:`fsfs.build_index` stores it in the index it builds, and walks
+    below an indexed directory load it from the index, so results are
+    shared with later processes. Walks that follow directory symlinks and
+    walks that don't use separate results.
+
+    Arguments:
+        enabled (bool): Use the cache in :func:`scan_dir`
+        min_age (float): Minimum age in seconds of cached directories
+        max_size (int): Number of directories cached before the cache is
+            cleared
+    '''
+
+    def __init__(self, enabled=False, min_age=1.0, max_size=200000):
+        self.enabled = enabled
+        self.min_age = min_age
+        self.max_size = max_size
+        self._tables = {}
+        self._size = 0
+        self._prepared = set()
+        self._loaded = set()
+
+    def clear(self):
+        self._tables.clear()
+        self._size = 0
+        self._prepared.clear()
+        self._loaded.clear()
+
+    def invalidate(self, path):
+        '''Drop cached results for path and the directories above it'''
+
+        while True:
+            for table in list(self._tables.values()):
+                table.pop(path, None)
+            parent = os.path.dirname(path)
+            if parent == path:
+                return
+            path = parent
+
+    def get(self, path, mtime, data_root, rules, follow_links=True):
+        '''Get the cached child directory names of path.
+
+        Arguments:
+            path (str): Directory path
+            mtime (float): Current mtime of path
+            data_root (str): Name of data directories
+            rules (IgnoreRules): Rules the listing was filtered with
+            follow_links (bool): The listing includes directory symlinks
+
+        Returns:
+            list: of names or None when path is not cached or has changed
+        '''
+
+        table = self._tables.get((data_root, rules, follow_links))
+        if table is None or mtime is None:
+            return
+        cached = table.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    def set(self, path, mtime, data_root, rules, names, follow_links=True):
+        '''Cache the child directory names of a non-Entry directory'''
+
+        if mtime is None or time.time() - mtime < self.min_age:
+            return
+        if self._size >= self.max_size:
+            self._tables.clear()
+            self._size = 0
+        key = (data_root, rules, follow_links)
+        table = self._tables.setdefault(key, {})
+        if path not in table:
+            self._size += 1
+        table[path] = (mtime, names)
+
+    def records(self, root, data_root, rules, follow_links=True):
+        '''Get the cached results below root.
+
+        Returns:
+            list: of (relative path, mtime, names) tuples
+        '''
+
+        table = self._tables.get((data_root, rules, follow_links), {})
+        prefix = root + '/'
+        return [
+            (path[len(prefix):] if path != root else '', mtime, names)
+            for path, (mtime, names) in list(table.items())
+            if path == root or path.startswith(prefix)
+        ]
+
+    def save(self, index, data_root=None, rules=None):
+        '''Store the cached results below an Index's root in the Index'''
+
+        data_root = data_root or api.get_data_root()
+        rules = rules or api.get_ignore_rules()
+        for follow_links in (True, False):
+            index.write_non_entries(
+                _rules_key(data_root, rules, follow_links),
+                self.records(index.root, data_root, rules, follow_links),
+            )
+            self._loaded.add((index.path, data_root, rules, follow_links))
+
+    def load(self, index, data_root=None, rules=None, follow_links=True):
+        '''Add the results stored in an Index to the cache'''
+
+        data_root = data_root or api.get_data_root()
+        rules = rules or api.get_ignore_rules()
+        key = (index.path, data_root, rules, follow_links)
+        if key in self._loaded:
+            return
+        self._loaded.add(key)
+
+        records = index.read_non_entries(
+            _rules_key(data_root, rules, follow_links)
+        )
+        if self._size + len(records) > self.max_size:
+            return
+        key = (data_root, rules, follow_links)
+        table = self._tables.setdefault(key, {})
+        for relpath, mtime, names in records:
+            path = index.root + '/' + relpath if relpath else index.root
+            if path not in table:
+                self._size += 1
+                table[path] = (mtime, names)
+
+    def prepare(self, root, data_root=None, rules=None, follow_links=True):
+        '''Load the results stored in the nearest index at or above root,
+        called once per root by walks when the cache is enabled.'''
+
+        if not self.enabled:
+            return
+
+        data_root = data_root or api.get_data_root()
+        rules = rules or api.get_ignore_rules()
+        key = (root, data_root, rules, follow_links)
+        if key in self._prepared:
+            return
+        self._prepared.add(key)
+
+        from fsfs import _index
+        index = _index.find_index(root, ())
+        if index is not None:
+            self.load(index, data_root, rules, follow_links)
+
+    def on_entry_changed(self, entry):
+        self.invalidate(util.unipath(entry.path))
+
+    def on_entry_moved(self, entry, old_path, new_path):
+        self.invalidate(util.unipath(old_path))
+        self.invalidate(util.unipath(new_path))
+
+
+def _rules_key(data_root, rules, follow_links=True):
+    return json.dumps([
+        data_root,
+        sorted(rules.names),
+        list(rules.patterns),
+        rules.ignore_file,
+        rules.no_entries_file,
+        follow_links,
+    ])
+
+
+def _safe_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _path_depth(path):
+    return path.rstrip('/').count('/')
+
+
+ancestors = AncestorCache()
+channels.EntryCreated.connect(ancestors.on_entry_changed)
+channels.EntryDeleted.connect(ancestors.on_entry_changed)
+channels.EntryDataDeleted.connect(ancestors.on_entry_changed)
+channels.EntryMoved.connect(ancestors.on_entry_moved)
+channels.EntryRelinked.connect(ancestors.on_entry_moved)
+
+negatives = NegativeCache()
+channels.EntryCreated.connect(negatives.on_entry_changed)
+channels.EntryMoved.connect(negatives.on_entry_moved)
+channels.EntryRelinked.connect(negatives.on_entry_moved)
+
+
+def parent_path(path, data_root=None):
+    '''Get the path of the nearest Entry above path using the
+    :class:`AncestorCache`.
+
+    Arguments:
+        path (str): Absolute directory path using forward slashes
 
     Returns:
-        generator: yielding :class:`models.Entry` matches
+        str: Entry path or None
     '''
 
+    parent = os.path.dirname(path)
+    if parent == path:
+        return
+    return ancestors.nearest(parent, data_root or api.get_data_root())
+
+
+def _search_up(root, levels=DEFAULT_SEARCH_UP_DEPTH, skip_root=False,
+               data_root=None):
+
+    if skip_root:
+        path = parent_path(root, data_root)
+    else:
+        path = ancestors.nearest(root, data_root)
+
+    root_depth = _path_depth(root)
+    while path:
+
+        if levels and root_depth - _path_depth(path) > levels:
+            break
+
+        yield path
+
+        path = parent_path(path, data_root)
+
+
+def _search_paths(root, direction=DOWN, depth=None, levels=None,
+                  skip_root=False, strategy=DFS, priority=None):
+    '''Like :func:`search` but yields Entry paths'''
+
     kwargs = dict(
         root=util.unipath(root),
         data_root=api.get_data_root(),
@@ -268,6 +1203,12 @@ def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
     if direction == DOWN:
         kwargs['depth'] = depth or DEFAULT_SEARCH_DN_DEPTH
         kwargs['levels'] = levels or DEFAULT_SEARCH_DN_LEVELS
+        kwargs['rules'] = api.get_ignore_rules()
+        negatives.prepare(
+            kwargs['root'], kwargs['data_root'], kwargs['rules']
+        )
+        if strategy != DFS:
+            return _walk_dn(strategy=strategy, priority=priority, **kwargs)
         return _search_dn(**kwargs)
     elif direction == UP:
         kwargs['levels'] = levels or DEFAULT_SEARCH_UP_LEVELS
@@ -276,39 +1217,156 @@ def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
         raise RuntimeError('Invalid direction: ' + str(direction))
 
 
-@util.regenerator
-def _select_tree_dn(root, selector, data_root, depth, gap=0):
+def search(root, direction=DOWN, depth=None, levels=None, skip_root=False,
+           strategy=DFS):
+    '''Search a root directory yielding Entry objects. You can specify a
+    direction to search (fsfs.UP or fsfs.DOWN) and a maximum search depth.
 
-    dirs = {
-        e.name: e.path
-        for e in safe_scandir(root) if e.is_dir()
-    }
+    Arguments:
+        root (str): Directory to search
+        direction (int): Direction to search (fsfs.UP or fsfs.DOWN)
+        depth (int): Maximum depth of search
+        skip_root (bool): Skip search in root directory
+        strategy (str): Walk strategy used when searching down, one of
+            DFS, BFS, IDDFS or PRIORITY
 
-    if dirs.pop(data_root, None):
-        gap = 0
-        sel = selector[0]
-        if sel in os.path.basename(root):
-            selector.pop(0)
-        if not selector:
-            yield api.get_entry(util.unipath(root))
-            return
+    Returns:
+        generator: yielding :class:`models.Entry` matches
+    '''
 
-    if gap == depth:
-        return
+    paths = _search_paths(
+        root, direction, depth, levels, skip_root, strategy
+    )
+    return (api.get_entry(path) for path in paths)
 
-    for dir in dirs.values():
-        yield _select_tree_dn(
-            dir,
-            list(selector),
-            data_root,
-            depth,
-            gap + 1
-        )
 
+def _scan_tree_dir(path, data_root, rules, prune, follow_links):
+    '''List a directory for :func:`tree_edges`.
+
+    Returns:
+        tuple: (True if path is an Entry, list of child directory paths)
+    '''
 
-def _select_tree_up(root, selector, data_root, depth, level=0):
+    is_entry, dirs = scan_dir(path, data_root, rules, follow_links)
+    children = [
+        child for _, child in dirs if prune is None or not prune(child)
+    ]
+    return is_entry, children
+
+
+def tree_edges(root, data_root=None, depth=None, levels=None, threads=1,
+               prune=None, skip_root=False):
+    '''Walk the Entries below root one directory level at a time, without
+    recursion, yielding (parent_path, path) edges. parent_path is the path
+    of the nearest Entry above path or None for the topmost Entries, so
+    parents are always yielded before their children.
+
+    Arguments:
+        root (str): Directory to walk
+        data_root (str): Name of data directories
+        depth (int): Maximum number of directories below an Entry to look
+            for more Entries, None for no limit. Symbolic links to
+            directories are only followed when depth is given
+        levels (int): Maximum number of nested Entries, None for no limit
+        threads (int): Number of threads used to list the directories of
+            each level, the default 1 lists them in the calling thread
+        prune (callable): Called with each directory path, return True to
+            skip the directory and everything below it. Directories ignored
+            by the global policy's ignore_rules are always skipped
+        skip_root (bool): Do not yield root itself
+
+    Returns:
+        generator: yielding (parent_path, path) tuples
+    '''
+
+    root = util.unipath(root)
+    data_root = data_root or api.get_data_root()
+    rules = api.get_ignore_rules()
+    # Without a depth limit a link cycle would never end the walk
+    follow_links = depth is not None
+    negatives.prepare(root, data_root, rules, follow_links)
+    scan = lambda path: _scan_tree_dir(
+        path, data_root, rules, prune, follow_links
+    )
+
+    pool = None
+    if threads > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(threads)
+
+    try:
+        # Each level holds (path, parent_path, gap, level) tuples
+        frontier = [(root, None, 0, 0)]
+        while frontier:
+            paths = [path for path, _, _, _ in frontier]
+            if pool and len(paths) > 1:
+                listings = pool.imap(scan, paths, 16)
+            else:
+                listings = (scan(path) for path in paths)
+
+            next_frontier = []
+            for node, listing in zip(frontier, listings):
+                path, parent, gap, level = node
+                is_entry, children = listing
+                if is_entry:
+                    gap = 0
+                    if not (skip_root and path == root):
+                        level += 1
+                        yield parent, path
+                        parent = path
+
+                if (
+                    (depth is not None and gap >= depth) or
+                    (levels and level >= levels)
+                ):
+                    continue
+
+                next_frontier.extend(
+                    (child, parent, gap + 1, level) for child in children
+                )
+            frontier = next_frontier
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+
+def _select_tree_dn(root, selector, data_root, depth, strategy=DFS):
+
+    # Nodes are (path, name, part index, gap) tuples
+    rules = api.get_ignore_rules()
+    num_parts = len(selector)
+
+    def visit(node):
+        path, name, index, gap = node
+        is_entry, dirs = scan_dir(path, data_root, rules)
+
+        if is_entry:
+            gap = 0
+            if selector.match(index, name):
+                index += 1
+            if index == num_parts:
+                return path, ()
+
+        if gap == depth:
+            return None, ()
+        return None, [
+            (child_path, child_name, index, gap + 1)
+            for child_name, child_path in dirs
+        ]
+
+    def priority(node):
+        path, name, index, _ = node
+        return (0 if selector.match(index, name) else 1, _path_depth(path))
+
+    start = (root, os.path.basename(root), 0, 0)
+    return _walk(start, visit, strategy, priority)
+
+
+def _select_tree_up(root, selector, data_root, depth):
 
     level = -1
+    index = len(selector) - 1
     next_root = root
     while True:
 
@@ -320,11 +1378,10 @@ def _select_tree_up(root, selector, data_root, depth, level=0):
 
         if os.path.isdir(root + '/' + data_root):
             level = 0
-            sel = selector[-1]
-            if sel in os.path.basename(root):
-                selector.pop()
-            if not selector:
-                yield api.get_entry(root)
+            if selector.match(index, os.path.basename(root)):
+                index -= 1
+            if index < 0:
+                yield root
                 return
 
         next_root = os.path.dirname(root)
@@ -332,8 +1389,61 @@ def _select_tree_up(root, selector, data_root, depth, level=0):
             break
 
 
+def select_shallowest(root, selector, data_root, first_depth, depth,
+                      skip_root=False):
+    '''Used by :func:`fsfs.quick_select`. Match each part of the selector
+    breadth first, one directory level at a time, below the previous match.
+    Directory listings are memoized so every directory is scanned at most
+    once.
+
+    Returns:
+        str: path of the Entry matching the last part of selector or None
+    '''
+
+    listings = {}
+    rules = api.get_ignore_rules()
+
+    def list_dirs(path):
+        if path not in listings:
+            listings[path] = [
+                (name, child_path)
+                for name, child_path in scan_dir(path, data_root, rules)[1]
+                if not name.startswith('.')
+            ]
+        return listings[path]
+
+    frontier = [root]
+    if skip_root:
+        frontier = [path for _, path in list_dirs(root)]
+
+    max_depth = first_depth
+    for index in range(len(selector)):
+        for _ in range(max_depth):
+            matches = []
+            next_frontier = []
+            for path in frontier:
+                for name, child_path in list_dirs(path):
+                    next_frontier.append(child_path)
+                    if (
+                        selector.match(index, name) and
+                        os.path.isdir(child_path + '/' + data_root)
+                    ):
+                        matches.append(child_path)
+            if matches:
+                frontier = [min(matches, key=len)]
+                break
+            frontier = next_frontier
+        else:
+            return
+
+        max_depth = depth
+
+    return frontier[0]
+
+
 def select_from_tree(root, selector, sep=DEFAULT_SELECTOR_SEP, direction=DOWN,
-                     depth=None, skip_root=False, data_root=None):
+                     depth=None, skip_root=False, data_root=None,
+                     strategy=DFS):
     '''This method is used under the hood by the Search class, you shouldn't
     need to call it manually.
 
@@ -345,23 +1455,38 @@ def select_from_tree(root, selector, sep=DEFAULT_SELECTOR_SEP, direction=DOWN,
 
     Arguments:
         root (str): Directory to search
-        selector (str): Hierarchy of names separated by sep
+        selector (str or Selector): Hierarchy of names separated by sep
         sep (str): Separator used to split selector
         direction (int): Direction to search (fsfs.UP or fsfs.DOWN)
         depth (int): Maximum depth of search
         skip_root (bool): Skip search in root directory
+        strategy (str): Walk strategy used when searching down, one of
+            DFS, BFS, IDDFS or PRIORITY. PRIORITY visits directories
+            matching the next part of the selector first
 
     Returns:
         generator: yielding :class:`models.Entry` matches
     '''
 
-    selector = selector.split(sep)
+    paths = _select_paths(
+        root, selector, sep, direction, depth, skip_root, data_root,
+        strategy
+    )
+    return (api.get_entry(path) for path in paths)
+
+
+def _select_paths(root, selector, sep=DEFAULT_SELECTOR_SEP, direction=DOWN,
+                  depth=None, skip_root=False, data_root=None, strategy=DFS):
+    '''Like :func:`select_from_tree` but yields Entry paths'''
+
+    selector = Selector(selector, sep)
     root = util.unipath(root)
     data_root = data_root or api.get_data_root()
 
     if direction == DOWN:
         depth = depth or DEFAULT_SEARCH_DN_DEPTH
-        return _select_tree_dn(root, selector, data_root, depth)
+        negatives.prepare(root, data_root)
+        return _select_tree_dn(root, selector, data_root, depth, strategy)
     elif direction == UP:
         depth = depth or DEFAULT_SEARCH_UP_DEPTH
         return _select_tree_up(root, selector, data_root, depth)
@@ -386,22 +1511,26 @@ def search_uuid(root, uuid, direction=DOWN, depth=0, skip_root=False):
 
     if direction == DOWN:
 
-        base_level = root.count(os.sep)
-        for root, subdirs, _ in walk(root):
+        rules = api.get_ignore_rules()
+        data_root_name = api.get_data_root()
 
-            level = root.count(os.sep) - base_level
+        # Walk using an explicit stack of (path, level)
+        stack = [(util.unipath(root), 0)]
+        while stack:
+            root, level = stack.pop()
+            # Like os.walk, do not follow links that could form cycles
+            is_entry, dirs = scan_dir(root, data_root_name, rules, False)
 
-            if depth and level == depth:
-                del subdirs[:]
+            if not depth or level < depth:
+                stack.extend(
+                    (path, level + 1) for _, path in reversed(dirs)
+                )
 
-            subdirs[:] = [d for d in subdirs if not d == api.get_data_root()]
-
-            if skip_root and level == 0:
+            if not is_entry or (skip_root and level == 0):
                 continue
 
-            root = util.unipath(root)
-            data_root = root + '/' + api.get_data_root()
-            uuid_file = root + '/' + api.get_data_root() + '/' + 'uuid_' + uuid
+            data_root = root + '/' + data_root_name
+            uuid_file = data_root + '/' + 'uuid_' + uuid
             if os.path.isfile(uuid_file):
                 yield root, data_root, uuid_file
 
@@ -422,8 +1551,8 @@ def search_uuid(root, uuid, direction=DOWN, depth=0, skip_root=False):
                 continue
 
             data_root = root + '/' + api.get_data_root()
-            uuid_path = root + '/' + api.get_data_root() + '/' + 'uuid_' + uuid
-            if os.path.isfile(uuid_path):
+            uuid_file = root + '/' + api.get_data_root() + '/' + 'uuid_' + uuid
+            if os.path.isfile(uuid_file):
                 yield root, data_root, uuid_file
 
             next_root = os.path.dirname(root)
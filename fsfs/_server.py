@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+'''
+Warm cache server for the command line interface.
+
+`fsfs serve` starts a process listening on a Unix domain socket. The process
+keeps the entry factory and search caches warm between commands. When the
+server is running, `python -m fsfs search|one|read ...` forwards its
+arguments to the server instead of running the command itself, and falls
+back to running the command directly when no server is listening or it does
+not respond within REQUEST_TIMEOUT seconds. Only sockets owned by the current
+user are connected to. The server drops clients that don't send a request
+within REQUEST_TIMEOUT seconds, so one client can't block it.
+
+Each request and response is a single line of JSON:
+
+    {"argv": ["one", "--root", ".", "sh_010"], "cwd": "/projects/show"}
+    {"code": 0, "stdout": "/projects/show/seq_010/sh_010\n", "stderr": ""}
+
+This module must stay cheap to import, it is imported by every invocation
+of the command line interface.
+'''
+from __future__ import absolute_import, division, print_function
+
+__all__ = [
+    'FORWARD_COMMANDS',
+    'REQUEST_TIMEOUT',
+    'ServerError',
+    'get_socket_path',
+    'request',
+    'forward',
+    'Server',
+    'serve',
+]
+
+import os
+import sys
+import json
+import stat
+import errno
+import socket
+
+FORWARD_COMMANDS = ('search', 'one', 'read')
+REQUEST_TIMEOUT = 5.0
+
+
+class ServerError(Exception): pass
+
+
+def get_socket_path():
+    '''Get the path of the server's socket. Set the FSFS_SOCKET environment
+    variable to override the default per-user path. Returns None on
+    platforms without Unix domain sockets.'''
+
+    if not hasattr(socket, 'AF_UNIX'):
+        return
+
+    path = os.environ.get('FSFS_SOCKET')
+    if path:
+        return path
+
+    if not hasattr(os, 'getuid'):
+        return
+
+    root = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(root, 'fsfs-{}.sock'.format(os.getuid()))
+
+
+def _connect(path, timeout=None):
+    '''Connect to the server, returns None when no server is listening or
+    the socket is owned by another user'''
+
+    if not path or not hasattr(socket, 'AF_UNIX'):
+        return
+
+    try:
+        owner = os.stat(path).st_uid
+    except OSError:
+        return
+    if hasattr(os, 'getuid') and owner != os.getuid():
+        return
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+    except socket.error:
+        client.close()
+        return
+    return client
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _receive(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b'\n'):
+            break
+    return json.loads(b''.join(chunks).decode('utf-8'))
+
+
+def request(message, path=None, timeout=REQUEST_TIMEOUT):
+    '''Send a message to the server.
+
+    Arguments:
+        message (dict): Request to send
+        path (str): Socket path, defaults to :func:`get_socket_path`
+        timeout (float): Socket timeout in seconds
+
+    Returns:
+        dict: response or None when no server is listening or it does not
+        respond in time
+    '''
+
+    client = _connect(path or get_socket_path(), timeout)
+    if client is None:
+        return
+
+    try:
+        _send(client, message)
+        return _receive(client)
+    except socket.timeout:
+        # Forwarded commands are read only, so callers can safely run the
+        # command themselves when the server hangs
+        return
+    finally:
+        client.close()
+
+
+def forward(argv, path=None):
+    '''Run a command line invocation on the server.
+
+    Arguments:
+        argv (list): Command line arguments without the program name
+
+    Returns:
+        int: exit code or None when the command was not forwarded
+    '''
+
+    if not argv or argv[0] not in FORWARD_COMMANDS:
+        return
+
+    response = request({'argv': argv, 'cwd': os.getcwd()}, path)
+    if response is None:
+        return
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['code']
+
+
+class Server(object):
+    '''Serves command line requests over a Unix domain socket. Requests are
+    handled one at a time in the serving process, so the entry factory and
+    search caches stay warm between requests.
+
+    Arguments:
+        path (str): Socket path, defaults to :func:`get_socket_path`
+    '''
+
+    def __init__(self, path=None):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ServerError('Unix domain sockets are not available.')
+
+        self.path = path or get_socket_path()
+        self.running = False
+        self._socket = None
+
+    def bind(self):
+        '''Bind the server's socket, removing a stale socket file left by a
+        server that did not shut down cleanly. Other files are never
+        removed.'''
+
+        client = _connect(self.path)
+        if client is not None:
+            client.close()
+            raise ServerError('Server already running at: ' + self.path)
+
+        try:
+            mode = os.lstat(self.path).st_mode
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise ServerError('Not a socket: ' + self.path)
+            os.remove(self.path)
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        self._socket.listen(16)
+
+    def close(self):
+        self.running = False
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def serve_forever(self):
+        '''Handle requests until a shutdown request is received'''
+
+        if self._socket is None:
+            self.bind()
+
+        self.running = True
+        try:
+            while self.running:
+                connection, _ = self._socket.accept()
+                connection.settimeout(REQUEST_TIMEOUT)
+                try:
+                    self.handle(connection)
+                except socket.timeout:
+                    pass
+                finally:
+                    connection.close()
+        finally:
+            self.close()
+
+    def handle(self, connection):
+        try:
+            message = _receive(connection)
+        except ValueError:
+            return
+
+        if message.get('shutdown'):
+            self.running = False
+            _send(connection, {'code': 0, 'stdout': '', 'stderr': ''})
+            return
+
+        _send(connection, self.run(message['argv'], message.get('cwd')))
+
+    def run(self, argv, cwd=None):
+        '''Run a command line invocation capturing it's output.
+
+        Returns:
+            dict: code, stdout and stderr
+        '''
+
+        from fsfs._compat import StringIO
+        from fsfs.cli import cli
+
+        if argv and argv[0] not in FORWARD_COMMANDS:
+            return {
+                'code': 2,
+                'stdout': '',
+                'stderr': 'Command can not be served: ' + argv[0] + '\n',
+            }
+
+        old_cwd = os.getcwd()
+        old_stdout, old_stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        code = 0
+        try:
+            if cwd:
+                os.chdir(cwd)
+            cli.main(args=list(argv), prog_name='fsfs', standalone_mode=True)
+        except SystemExit as e:
+            code = e.code or 0
+        except Exception as e:
+            sys.stderr.write(u'{}: {}\n'.format(type(e).__name__, e))
+            code = 1
+        finally:
+            stdout, stderr = sys.stdout.getvalue(), sys.stderr.getvalue()
+            sys.stdout, sys.stderr = old_stdout, old_stderr
+            os.chdir(old_cwd)
+
+        return {'code': code, 'stdout': stdout, 'stderr': stderr}
+
+
+def serve(path=None):
+    '''Start a :class:`Server` and handle requests until shutdown.'''
+
+    from fsfs import _search
+
+    # Other processes may modify the tree while we keep caches warm
+    _search.ancestors.validate = True
+
+    server = Server(path)
+    server.bind()
+    server.serve_forever()
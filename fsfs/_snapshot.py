@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+'''
+Snapshot API, used to export and import the metadata of a whole tree.
+
+A snapshot is a JSON-lines file, optionally gzipped when the path ends with
+.gz. The first line is a header, every following line is one Entry record:
+
+    {"path": "seq_010/sh_010", "uuid": "...", "tags": ["shot"],
+     "mtime": 1539907200.0, "data": "frame_start: 1001\n"}
+
+With the default FileDataStorage the data is stored exactly as encoded on
+disk, so neither snapshot nor restore decode or encode Entry data. Blobs and
+files are not included.
+
+Snapshots and live directories can be compared using :func:`diff`, which
+yields :class:`Change` objects that :func:`send_changes` broadcasts through
+the Entry channels.
+'''
+from __future__ import absolute_import, division, print_function
+
+__all__ = [
+    'SNAPSHOT_VERSION',
+    'SnapshotError',
+    'walk_entries',
+    'read_record',
+    'write_record',
+    'read_snapshot',
+    'snapshot',
+    'restore',
+    'CREATED',
+    'DELETED',
+    'MOVED',
+    'TAGGED',
+    'UNTAGGED',
+    'DATA_CHANGED',
+    'Change',
+    'iter_records',
+    'diff',
+    'send_changes',
+]
+
+import io
+import os
+import gzip
+import json
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from fsfs import api, util, types, channels, _search
+from fsfs._compat import scandir
+
+SNAPSHOT_VERSION = 1
+DEFAULT_THREADS = 8
+CREATED = 'created'
+DELETED = 'deleted'
+MOVED = 'moved'
+TAGGED = 'tagged'
+UNTAGGED = 'untagged'
+DATA_CHANGED = 'data_changed'
+
+
+class SnapshotError(Exception): pass
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8')
+    return io.open(path, mode, encoding='utf-8')
+
+
+def walk_entries(root, data_root=None):
+    '''Walk the whole tree below root yielding the path of every Entry.
+    Symbolic links to directories are not followed, so link cycles can't
+    make the walk loop.
+
+    Arguments:
+        root (str): Directory to walk
+        data_root (str): Name of data directories
+
+    Returns:
+        generator: yielding absolute Entry paths
+    '''
+
+    data_root = data_root or api.get_data_root()
+    rules = api.get_ignore_rules()
+    root = util.unipath(root)
+    _search.negatives.prepare(root, data_root, rules, follow_links=False)
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        is_entry, dirs = _search.scan_dir(
+            path, data_root, rules, follow_links=False
+        )
+
+        if is_entry:
+            yield path
+        stack.extend(child for _, child in reversed(dirs))
+
+
+def read_record(
+    root, path, data_root=None, data_storage=None, read_data=True,
+    tag_storage=None
+):
+    '''Read an Entry's metadata into a snapshot record. Uses one directory
+    listing and one read per Entry with the default storage layouts.
+
+    Arguments:
+        root (str): Root of the snapshot, record paths are relative to root
+        path (str): Entry path
+        data_storage (DataStorage): Defaults to the global policy's
+        read_data (bool): When False the record's data is None and only the
+            data's mtime is read
+        tag_storage (TagStorage): Defaults to the global policy's
+
+    Returns:
+        dict: snapshot record
+    '''
+
+    data_root = data_root or api.get_data_root()
+    data_storage = data_storage or api.get_data_storage()
+    tag_storage = tag_storage or api.get_tag_storage()
+    data_path = path + '/' + data_root
+
+    record = {
+        'path': path[len(root) + 1:],
+        'uuid': None,
+        'tags': [],
+        'mtime': None,
+        'data': '',
+    }
+    names = []
+    for e in scandir(data_path):
+        names.append(e.name)
+        if e.name.startswith('uuid_'):
+            record['uuid'] = e.name[5:]
+    record['tags'] = tag_storage.tags_from_listing(data_path, names)
+
+    record['mtime'] = data_storage.mtime(data_path)
+    if record['mtime'] is not None:
+        if read_data:
+            record['data'] = data_storage.read_raw(data_path)
+        else:
+            record['data'] = None
+    return record
+
+
+def write_record(
+    root, record, data_root=None, data_storage=None, tag_storage=None
+):
+    '''Write a snapshot record to root. The Entry's uuid and tags are
+    replaced by the uuid and tags in the record.'''
+
+    data_root = data_root or api.get_data_root()
+    data_storage = data_storage or api.get_data_storage()
+    tag_storage = tag_storage or api.get_tag_storage()
+    path = root
+    if record['path']:
+        path = root + '/' + record['path']
+    data_path = path + '/' + data_root
+
+    try:
+        os.makedirs(data_path)
+    except OSError:
+        if not os.path.isdir(data_path):
+            raise
+
+    uuid = 'uuid_' + record['uuid'] if record['uuid'] else None
+    for e in scandir(data_path):
+        if e.name.startswith('uuid_') and e.name != uuid:
+            os.remove(e.path)
+    if uuid:
+        util.touch(data_path + '/' + uuid)
+    tag_storage.set_tags(data_path, record['tags'])
+
+    data_storage.write_raw(data_path, record['data'])
+    if record['mtime'] is not None:
+        data_storage.set_mtime(data_path, record['mtime'])
+
+    return path
+
+
+def read_snapshot(path):
+    '''Read a snapshot file.
+
+    Arguments:
+        path (str): Path to snapshot file
+
+    Returns:
+        tuple: (header dict, generator yielding records)
+    '''
+
+    f = _open(path, 'r')
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        f.close()
+        raise SnapshotError('Not a snapshot file: ' + path)
+
+    if header.get('fsfs') != 'snapshot':
+        f.close()
+        raise SnapshotError('Not a snapshot file: ' + path)
+
+    def iter_records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, iter_records()
+
+
+def snapshot(root, path, threads=DEFAULT_THREADS):
+    '''Stream the metadata of all entries below root to a snapshot file.
+
+    Arguments:
+        root (str): Directory to snapshot
+        path (str): Snapshot file to write, gzipped when ending in .gz
+        threads (int): Number of threads used to read entries
+
+    Returns:
+        int: Number of entries written
+    '''
+
+    root = util.unipath(root)
+    data_root = api.get_data_root()
+    data_storage = api.get_data_storage()
+    header = {
+        'fsfs': 'snapshot',
+        'version': SNAPSHOT_VERSION,
+        'root': root,
+        'created': time.time(),
+    }
+
+    read = lambda entry_path: read_record(
+        root, entry_path, data_root, data_storage
+    )
+
+    count = 0
+    pool = ThreadPool(threads)
+    try:
+        with _open(path, 'w') as f:
+            f.write(json.dumps(header) + u'\n')
+            records = pool.imap(read, walk_entries(root, data_root), 32)
+            for record in records:
+                f.write(json.dumps(record, sort_keys=True) + u'\n')
+                count += 1
+    finally:
+        pool.close()
+        pool.join()
+
+    return count
+
+
+def restore(path, root, threads=DEFAULT_THREADS):
+    '''Recreate the data directories stored in a snapshot file below root.
+
+    Arguments:
+        path (str): Snapshot file
+        root (str): Directory to restore entries to
+        threads (int): Number of threads used to write entries
+
+    Returns:
+        int: Number of entries restored
+    '''
+
+    root = util.unipath(root)
+    data_root = api.get_data_root()
+    data_storage = api.get_data_storage()
+    header, records = read_snapshot(path)
+
+    write = lambda record: write_record(
+        root, record, data_root, data_storage
+    )
+
+    count = 0
+    pool = ThreadPool(threads)
+    try:
+        for _ in pool.imap_unordered(write, records, 32):
+            count += 1
+    finally:
+        pool.close()
+        pool.join()
+        _search.ancestors.invalidate(root)
+
+    return count
+
+
+class Change(namedtuple('Change', 'kind uuid path old_path tags data')):
+    '''A change between two trees yielded by :func:`diff`.
+
+    Attributes:
+        kind (str): One of CREATED, DELETED, MOVED, TAGGED, UNTAGGED or
+            DATA_CHANGED
+        uuid (str): uuid of the Entry
+        path (str): Path relative to the new root, None when DELETED
+        old_path (str): Path relative to the old root, None when CREATED
+        tags (list): Tags added or removed, only for TAGGED and UNTAGGED
+        data (str): Encoded data, only for DATA_CHANGED
+    '''
+
+
+def iter_records(source, read_data=True):
+    '''Get the root and records of a snapshot file or a live directory.
+
+    Arguments:
+        source (str): Snapshot file or directory
+        read_data (bool): Read the data of live entries
+
+    Returns:
+        tuple: (root, generator yielding records)
+    '''
+
+    if os.path.isdir(source):
+        root = util.unipath(source)
+        data_root = api.get_data_root()
+        data_storage = api.get_data_storage()
+        records = (
+            read_record(root, path, data_root, data_storage, read_data)
+            for path in walk_entries(root, data_root)
+        )
+        return root, records
+
+    header, records = read_snapshot(source)
+    return header['root'], records
+
+
+def _record_key(record):
+    return record['uuid'] or 'path:' + record['path']
+
+
+def _record_data(root, record):
+    if record['data'] is None:
+        path = root + '/' + record['path'] if record['path'] else root
+        data_path = path + '/' + api.get_data_root()
+        record['data'] = api.get_data_storage().read_raw(data_path)
+    return record['data']
+
+
+def diff(a, b):
+    '''Compare two snapshots or live roots using uuids to identify entries.
+    Data is only compared when the data file mtimes differ, and is never
+    decoded.
+
+    Arguments:
+        a (str): Old snapshot file or directory
+        b (str): New snapshot file or directory
+
+    Returns:
+        generator: yielding :class:`Change` objects
+    '''
+
+    a_root, a_records = iter_records(a, read_data=False)
+    old = dict((_record_key(record), record) for record in a_records)
+
+    b_root, b_records = iter_records(b, read_data=False)
+    for new_record in b_records:
+        key = _record_key(new_record)
+        uuid = new_record['uuid']
+        path = new_record['path']
+        old_record = old.pop(key, None)
+
+        if old_record is None:
+            yield Change(CREATED, uuid, path, None, None, None)
+            continue
+
+        old_path = old_record['path']
+        if old_path != path:
+            yield Change(MOVED, uuid, path, old_path, None, None)
+
+        old_tags = set(old_record['tags'])
+        new_tags = set(new_record['tags'])
+        if new_tags - old_tags:
+            added = sorted(new_tags - old_tags)
+            yield Change(TAGGED, uuid, path, old_path, added, None)
+        if old_tags - new_tags:
+            removed = sorted(old_tags - new_tags)
+            yield Change(UNTAGGED, uuid, path, old_path, removed, None)
+
+        if old_record['mtime'] == new_record['mtime']:
+            continue
+
+        new_data = _record_data(b_root, new_record)
+        if _record_data(a_root, old_record) != new_data:
+            yield Change(DATA_CHANGED, uuid, path, old_path, None, new_data)
+
+    for old_record in old.values():
+        yield Change(
+            DELETED, old_record['uuid'], None, old_record['path'], None, None
+        )
+
+
+def send_changes(changes, root, old_root=None):
+    '''Send changes yielded by :func:`diff` through the Entry channels so
+    that receivers like caches can update incrementally.
+
+    Arguments:
+        changes (iterable): :class:`Change` objects
+        root (str): Directory the new paths are relative to
+        old_root (str): Directory the old paths are relative to, defaults
+            to root
+
+    Returns:
+        int: Number of changes sent
+    '''
+
+    root = util.unipath(root)
+    old_root = util.unipath(old_root or root)
+
+    def join(root, path):
+        return root + '/' + path if path else root
+
+    count = 0
+    for change in changes:
+        count += 1
+
+        if change.kind == DELETED:
+            entry = api.get_entry(join(old_root, change.old_path))
+            channels.send(entry.deleted, entry)
+            continue
+
+        entry = api.get_entry(join(root, change.path))
+        if change.kind == CREATED:
+            channels.send(entry.created, entry)
+        elif change.kind == MOVED:
+            channels.send(
+                entry.moved,
+                entry,
+                join(old_root, change.old_path),
+                join(root, change.path),
+            )
+        elif change.kind == TAGGED:
+            channels.send(entry.tagged, entry, tuple(change.tags))
+        elif change.kind == UNTAGGED:
+            channels.send(entry.untagged, entry, tuple(change.tags))
+        elif change.kind == DATA_CHANGED:
+            channels.send_lazy(
+                entry.data_changed,
+                lambda entry=entry, data=change.data: (
+                    entry,
+                    types.freeze(api.decode_data(data) if data else {}),
+                ),
+            )
+
+    return count
@@ -4,6 +4,10 @@ from __future__ import print_function, absolute_import
 __all__ = [
     'DOWN',
     'UP',
+    'DFS',
+    'BFS',
+    'IDDFS',
+    'PRIORITY',
     'DEFAULT_SELECTOR_SEP',
     'get_policy',
     'set_policy',
@@ -20,16 +24,32 @@ __all__ = [
     'set_data_file',
     'get_entry_factory',
     'set_entry_factory',
+    'get_tag_storage',
+    'set_tag_storage',
+    'migrate_tags',
+    'get_data_storage',
+    'set_data_storage',
+    'migrate_data',
+    'get_ignore_rules',
+    'set_ignore_rules',
+    'ignore_dirs',
+    'get_index_fields',
+    'set_index_fields',
+    'index_field',
+    'build_index',
     'get_entry',
     'get_id_generator',
     'set_id_generator',
     'generate_id',
     'InvalidTag',
     'validate_tag',
+    'validate_tags',
     'make_tag_path',
     'get_tags',
     'tag',
     'untag',
+    'tag_many',
+    'untag_many',
     'read',
     'write',
     'read_blob',
@@ -39,15 +59,27 @@ __all__ = [
     'delete',
     'search',
     'get_tree',
+    'iter_tree',
     'quick_select',
+    'snapshot',
+    'restore',
+    'diff',
+    'send_changes',
 ]
 
 import os
-import string
-from glob import glob
-from scandir import scandir
+import re
 from fsfs import util
-from fsfs.constants import DOWN, UP, DEFAULT_SELECTOR_SEP
+from fsfs._compat import basestring
+from fsfs.constants import (
+    DOWN,
+    UP,
+    DFS,
+    BFS,
+    IDDFS,
+    PRIORITY,
+    DEFAULT_SELECTOR_SEP,
+)
 
 
 def get_policy():
@@ -82,6 +114,10 @@ def set_default_policy():
     policy.DefaultPolicy.set_data_root(policy.DefaultRoot)
     policy.DefaultPolicy.set_data_file(policy.DefaultFile)
     policy.DefaultPolicy.set_entry_factory(policy.DefaultFactory)
+    policy.DefaultPolicy.set_tag_storage(policy.DefaultTagStorage)
+    policy.DefaultPolicy.set_index_fields([])
+    policy.DefaultPolicy.set_data_storage(policy.DefaultDataStorage)
+    policy.DefaultPolicy.set_ignore_rules(policy.DefaultIgnoreRules)
 
 
 def set_data_encoder(data_encoder):
@@ -171,6 +207,165 @@ def get_entry_factory():
     return get_policy().get_entry_factory()
 
 
+def set_tag_storage(tag_storage):
+    '''Set the global policy's tag_storage. The tag_storage determines how
+    tags are stored in an Entry's data_root.
+
+    The default policy's tag_storage is :class:`fsfs.storage.FilesTagStorage`
+    which stores a tag_<name> file per tag. Use
+    :class:`fsfs.storage.SingleFileTagStorage` to store all tags in a single
+    file. Use :func:`migrate_tags` to convert existing trees.
+    '''
+
+    get_policy().set_tag_storage(tag_storage)
+
+
+def get_tag_storage():
+    '''Get the global policy's tag_storage'''
+
+    return get_policy().get_tag_storage()
+
+
+def migrate_tags(root, tag_storage, threads=8):
+    '''Move the tags of all entries below root from the global policy's
+    tag_storage to tag_storage. Call :func:`set_tag_storage` afterwards to
+    use the new layout.
+
+    See also:
+        :func:`fsfs.storage.migrate_tag_storage`
+    '''
+
+    from fsfs import storage
+    return storage.migrate_tag_storage(
+        util.unipath(root), tag_storage, threads=threads
+    )
+
+
+def set_data_storage(data_storage):
+    '''Set the global policy's data_storage. The data_storage determines how
+    Entry data is stored in an Entry's data_root.
+
+    The default policy's data_storage is :class:`fsfs.storage.FileDataStorage`
+    which stores all data in the data_file. Use
+    :class:`fsfs.storage.ShardedDataStorage` to store each top-level key in
+    it's own file, so reading or writing a few keys of a large document does
+    not decode or rewrite the whole document. Use :func:`migrate_data` to
+    convert existing trees.
+    '''
+
+    get_policy().set_data_storage(data_storage)
+
+
+def get_data_storage():
+    '''Get the global policy's data_storage'''
+
+    return get_policy().get_data_storage()
+
+
+def migrate_data(root, data_storage, threads=8):
+    '''Move the data of all entries below root from the global policy's
+    data_storage to data_storage. Call :func:`set_data_storage` afterwards
+    to use the new layout.
+
+    See also:
+        :func:`fsfs.storage.migrate_data_storage`
+    '''
+
+    from fsfs import storage
+    return storage.migrate_data_storage(
+        util.unipath(root), data_storage, threads=threads
+    )
+
+
+def set_ignore_rules(ignore_rules):
+    '''Set the global policy's ignore_rules. The ignore_rules determine
+    which directories search walks, get_tree and quick_select skip.
+
+    The default policy's ignore_rules is an :class:`fsfs.ignore.IgnoreRules`
+    that only honors .fsfsignore and .fsfsnoentries files.
+    '''
+
+    get_policy().set_ignore_rules(ignore_rules)
+
+
+def get_ignore_rules():
+    '''Get the global policy's ignore_rules'''
+
+    return get_policy().get_ignore_rules()
+
+
+def ignore_dirs(names=(), patterns=()):
+    '''Skip more directories in search walks by adding names and fnmatch
+    patterns to the global policy's ignore_rules.
+
+    Examples:
+        .. code-block:: python
+
+            fsfs.ignore_dirs(names=['.git', 'render'], patterns=['*_cache'])
+    '''
+
+    from fsfs.ignore import IgnoreRules
+
+    rules = get_ignore_rules()
+    set_ignore_rules(IgnoreRules(
+        rules.names.union(names),
+        rules.patterns + tuple(p for p in patterns if p not in rules.patterns),
+        rules.ignore_file,
+        rules.no_entries_file,
+    ))
+
+
+def set_index_fields(index_fields):
+    '''Set the global policy's index_fields. These are the Entry data fields
+    stored in indexes created by :func:`build_index`.
+
+    The default policy's index_fields is an empty list.
+    '''
+
+    get_policy().set_index_fields(index_fields)
+
+
+def get_index_fields():
+    '''Get the global policy's index_fields'''
+
+    return get_policy().get_index_fields()
+
+
+def index_field(*fields):
+    '''Declare Entry data fields to index. Indexes let
+    :meth:`fsfs._search.Search.where` find entries by data values without
+    decoding every Entry's data.
+
+    Examples:
+        .. code-block:: python
+
+            fsfs.index_field('status', 'frame_start')
+            fsfs.build_index('/projects/show')
+    '''
+
+    index_fields = get_index_fields()
+    set_index_fields(
+        index_fields + [f for f in fields if f not in index_fields]
+    )
+
+
+def build_index(root, fields=None, threads=8):
+    '''Create or rebuild the index of Entry data fields below root, stored
+    in {root}/.fsfsindex.
+
+    Arguments:
+        root (str): Directory to index
+        fields (list): Fields to index, defaults to :func:`get_index_fields`
+        threads (int): Number of threads used to read entries
+
+    Returns:
+        :class:`fsfs._index.Index`
+    '''
+
+    from fsfs import _index
+    return _index.build_index(root, fields, threads)
+
+
 def encode_data(data):
     '''Uses the global policy's data_encoder to encode_data.
 
@@ -217,11 +412,13 @@ def generate_id():
 class InvalidTag(Exception): pass
 
 
+_valid_tag = re.compile(r'[a-zA-Z0-9._-]*\Z')
+
+
 def validate_tag(tag):
     '''Keys can only contain letters, numbers and these characters: .-_'''
 
-    valid_chars = '.-_' + string.ascii_letters + string.digits
-    if not all([c in valid_chars for c in tag]):
+    if not _valid_tag.match(tag):
         raise InvalidTag(
             'Not a valid tag: {}\n'.format(tag) +
             'Keys can only contain letters, numbers and .-_'
@@ -229,6 +426,15 @@ def validate_tag(tag):
     return True
 
 
+def validate_tags(tags):
+    '''Validate a sequence of tags, raises InvalidTag for the first invalid
+    tag.'''
+
+    for tag in tags:
+        validate_tag(tag)
+    return True
+
+
 def make_tag_path(root, tag):
     '''Tag name to tag filepath
 
@@ -269,7 +475,8 @@ def read(root, *keys):
             return all key, value pairs.
 
     Returns:
-        dict: key, value pairs stored at root
+        dict: key, value pairs stored at root, an immutable
+        :class:`fsfs.FrozenDict` when no keys are passed
     '''
 
     entry = get_entry(root)
@@ -375,16 +582,11 @@ def get_tags(root):
         root (str): Directory to get tags from
 
     Returns:
-        list: List of tags
+        list: Sorted list of tags
     '''
 
-    tags = []
     path = util.unipath(root, get_data_root())
-    if os.path.isdir(path):
-        for entry in scandir(path):
-            if entry.name.startswith('tag_'):
-                tags.append(entry.name.replace('tag_', ''))
-    return tags
+    return get_tag_storage().get_tags(path)
 
 
 def tag(root, *tags):
@@ -415,7 +617,92 @@ def untag(root, *tags):
     entry.untag(*tags)
 
 
-def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
+def _pop_threads(func, kwargs):
+    '''Pop the threads keyword argument of func, raises TypeError like
+    python does for any other keyword argument.'''
+
+    threads = kwargs.pop('threads', 8)
+    if kwargs:
+        raise TypeError(
+            '{}() got an unexpected keyword argument {!r}'
+            .format(func, sorted(kwargs)[0])
+        )
+    return threads
+
+
+def _update_tags(entries, tags, method, channel, threads):
+    from multiprocessing.pool import ThreadPool
+    from fsfs import channels
+
+    entries = [
+        get_entry(util.unipath(entry)) if isinstance(entry, basestring)
+        else entry
+        for entry in entries
+    ]
+    update = lambda entry: getattr(entry.data, method)(tags)
+
+    with channels.deferred():
+        if threads is None or threads <= 1 or len(entries) <= 1:
+            for entry in entries:
+                update(entry)
+        else:
+            pool = ThreadPool(min(threads, len(entries)))
+            try:
+                for _ in pool.imap_unordered(update, entries, 32):
+                    pass
+            finally:
+                pool.close()
+                pool.join()
+
+        for entry in entries:
+            channels.send(getattr(entry, channel), entry, tags)
+
+    return entries
+
+
+def tag_many(entries, *tags, **kwargs):
+    '''Tag many directories or Entries at once. Tags are validated once,
+    the filesystem work is done in a thread pool and one tagged message per
+    Entry is sent after all entries are tagged.
+
+    Arguments:
+        entries (iterable): Directories or Entries, like a Search
+        *tags (List[str]): Tags to add
+        threads (int): Number of threads, defaults to 8. Use 1 to tag
+            in the calling thread
+
+    Returns:
+        list: Tagged Entries
+
+    Examples:
+        .. code-block:: python
+
+            fsfs.tag_many(fsfs.search(seq_path).tags('shot'), 'approved')
+    '''
+    if not tags:
+        raise Exception('Must provide at least one tag.')
+
+    validate_tags(tags)
+    threads = _pop_threads('tag_many', kwargs)
+    return _update_tags(entries, tags, '_add_tags', 'tagged', threads)
+
+
+def untag_many(entries, *tags, **kwargs):
+    '''Remove tags from many directories or Entries at once.
+
+    See also:
+        :func:`tag_many`
+    '''
+    if not tags:
+        raise Exception('Must provide at least one tag.')
+
+    validate_tags(tags)
+    threads = _pop_threads('untag_many', kwargs)
+    return _update_tags(entries, tags, '_remove_tags', 'untagged', threads)
+
+
+def search(root, direction=DOWN, depth=None, levels=None, skip_root=False,
+           strategy=DFS):
     '''Returns a Search object that yields :class:`models.Entry` objects. The
     Search generator supports advanced query functionality similar to the
     Query objects found in many SQL libraries.
@@ -426,6 +713,16 @@ def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
         depth (int): Maximum directory depth to search between entries
         levels (int): Number of child entries deep to traverse
         skip_root (bool): Skip search in root directory
+        strategy (str): Order directories are walked in when searching
+            down, one of:
+
+            - fsfs.DFS: depth first, the default
+            - fsfs.BFS: breadth first, shallow matches are found first
+            - fsfs.IDDFS: iterative deepening, breadth first order using
+              the memory of a depth first walk, shallow directories are
+              listed again for each level
+            - fsfs.PRIORITY: directories named like the selectors passed
+              to :meth:`Search.name` first, then breadth first
 
     Examples:
         .. code-block:: python
@@ -453,69 +750,197 @@ def search(root, direction=DOWN, depth=None, levels=None, skip_root=False):
 
             # Combine methods to create advanced queries
             search('.').name('entry_name').tags('asset').one()
+
+            # Find the shallowest match first
+            search('.', strategy=fsfs.BFS).name('sh_010').one()
     '''
 
     from fsfs._search import Search
-    return Search(root, direction, depth, levels, skip_root)
+    return Search(root, direction, depth, levels, skip_root, strategy=strategy)
 
 
-def get_tree(root, data_root, tree):
-    '''Get Entries under the root directory as a tree structure.'''
+def iter_tree(root, depth=None, levels=None, threads=1, prune=None,
+              skip_root=False):
+    '''Stream the Entries under the root directory as (parent_path, Entry)
+    edges, one directory level at a time. parent_path is the path of the
+    nearest Entry above the Entry or None for the topmost Entries. Parents
+    are yielded before their children, so UIs can render huge hierarchies
+    progressively.
 
-    from fsfs._search import safe_scandir
+    Arguments:
+        root (str): Directory to walk
+        depth (int): Maximum number of directories below an Entry to look
+            for more Entries, None for no limit. Symbolic links to
+            directories are only followed when depth is given
+        levels (int): Maximum number of nested Entries, None for no limit
+        threads (int): Number of threads used to list directories, the
+            default 1 lists them in the calling thread
+        prune (callable): Called with each directory path, return True to
+            skip the directory and everything below it
+        skip_root (bool): Do not yield root itself
+
+    Returns:
+        generator: yielding (parent_path, Entry) tuples
+
+    See also:
+        :func:`fsfs._search.tree_edges`
+    '''
+
+    from fsfs._search import tree_edges
+
+    edges = tree_edges(
+        root, get_data_root(), depth, levels, threads, prune, skip_root
+    )
+    for parent, path in edges:
+        yield parent, get_entry(path)
+
+
+def get_tree(root, data_root=None, tree=None, depth=None, levels=None,
+             threads=1, prune=None):
+    '''Get Entries under the root directory as a tree structure. Each Entry
+    is a dict keyed by it's path relative to the Entry above it, or by it's
+    name when it is the root. Entries in different directories never
+    collide.
+
+    Arguments:
+        root (str): Directory to walk
+        data_root (str): Name of data directories, defaults to the global
+            policy's data_root
+        tree (dict): Dict to add the tree to
+        depth, levels, threads, prune: See :func:`iter_tree`
+
+    Returns:
+        dict: nested dicts
+
+    Examples:
+        .. code-block:: python
 
-    if os.path.isdir(root + '/' + data_root):
-        tree = tree.setdefault(get_entry(root).name, {})
+            fsfs.get_tree('/projects/show')
+            # {'show': {'seq_010': {'sh_010': {}}, 'assets/char': {}}}
+    '''
 
-    for item in safe_scandir(root):
-        if item.name == data_root:
-            continue
-        if item.is_dir():
-            get_tree(item.path, data_root, tree)
+    from fsfs._search import tree_edges
+
+    root = util.unipath(root)
+    tree = {} if tree is None else tree
+    nodes = {None: tree}
+    edges = tree_edges(
+        root, data_root or get_data_root(), depth, levels, threads, prune
+    )
+    for parent, path in edges:
+        if path == root:
+            key = os.path.basename(path)
+        else:
+            key = path[len(parent or root) + 1:]
+        nodes[path] = nodes[parent].setdefault(key, {})
+    return tree
 
 
 def quick_select(root, selector, sep=DEFAULT_SELECTOR_SEP,
                  first_depth=2, depth=4, skip_root=False):
     '''Use this method to quickly find one Entry using a selector string.
     Unlike search, this method returns one Entry, not a generator yielding
-    all matches.
+    all matches. Each part of the selector is matched against the shallowest
+    Entries below the previous match.
 
     Arguments:
         root: Directory to search within
-        selector: List of partial names to select from tree
+        selector: Selector string or :class:`fsfs._search.Selector`
         sep: Separator used to split selector into parts
         first_depth: Max directoy depth of first selector
         depth: Max directory depth to search for the rest of the selectors
     '''
 
-    if skip_root:
-        root = util.unipath(root, '*')
-
-    parts = selector.split(sep)
-    depth = first_depth
-    matches = []
-
-    while parts:
-        if matches:
-            root = matches[-1]
-
-        part = parts.pop(0)
-
-        # glob recursively until we find a match
-        # root/*, root/*/* ...
-        for i in range(depth):
-            pattern = util.unipath(
-                root,
-                '*/' * i,
-                '*' + part + '*',
-                get_data_root()
-            )
-            entries = glob(pattern)
-            if entries:
-                match = min(entries, key=len)[:-6]
-                matches.append(match)
-                break
-        else:
-            return
+    from fsfs._search import Selector, select_shallowest
+
+    match = select_shallowest(
+        util.unipath(root),
+        Selector(selector, sep),
+        get_data_root(),
+        first_depth,
+        depth,
+        skip_root,
+    )
+    if match:
+        return get_entry(match)
+
+
+def snapshot(root, path, threads=8):
+    '''Export the metadata of all entries below root to a single
+    JSON-lines snapshot file. Relative paths, uuids, tags and encoded data
+    are streamed to the file, use a path ending in .gz to compress it.
+
+    Arguments:
+        root (str): Directory to snapshot
+        path (str): Snapshot file to write
+        threads (int): Number of threads used to read entries
+
+    Returns:
+        int: Number of entries written
+
+    See also:
+        :mod:`fsfs._snapshot`
+    '''
+
+    from fsfs import _snapshot
+    return _snapshot.snapshot(root, path, threads)
+
+
+def restore(snapshot, root, threads=8):
+    '''Recreate the data directories stored in a snapshot file below root.
+    Existing entries are overwritten with the uuid, tags and data from the
+    snapshot.
+
+    Arguments:
+        snapshot (str): Snapshot file created by :func:`snapshot`
+        root (str): Directory to restore entries to
+        threads (int): Number of threads used to write entries
+
+    Returns:
+        int: Number of entries restored
+    '''
+
+    from fsfs import _snapshot
+    return _snapshot.restore(snapshot, root, threads)
+
+
+def diff(a, b):
+    '''Compare two snapshots or live directories. Entries are identified
+    by uuid, so renamed entries are reported as moved. Entries whose data
+    file mtime is unchanged are skipped without reading their data.
+
+    Arguments:
+        a (str): Old snapshot file or directory
+        b (str): New snapshot file or directory
+
+    Returns:
+        generator: yielding :class:`fsfs._snapshot.Change` objects
+
+    Examples:
+        .. code-block:: python
+
+            # Broadcast the changes made since last night's snapshot
+            changes = diff('/backups/show.jsonl.gz', '/projects/show')
+            send_changes(changes, '/projects/show')
+    '''
+
+    from fsfs import _snapshot
+    return _snapshot.diff(a, b)
+
+
+def send_changes(changes, root, old_root=None):
+    '''Send changes yielded by :func:`diff` through the Entry channels,
+    allowing receivers to update incrementally instead of rescanning.
+
+    Arguments:
+        changes (iterable): Changes yielded by :func:`diff`
+        root (str): Directory the changed paths are relative to
+        old_root (str): Directory deleted and moved paths were relative to,
+            defaults to root
+
+    Returns:
+        int: Number of changes sent
+    '''
 
-    return get_entry(util.unipath(matches[-1]))
+    from fsfs import _snapshot
+    return _snapshot.send_changes(changes, root, old_root)
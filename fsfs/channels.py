@@ -14,9 +14,17 @@ __all__ = [
     'EntryDataDeleted',
     'EntryUUIDChanged',
     'transfer_receivers',
-    'IDENTIFIERS'
+    'IDENTIFIERS',
+    'has_receivers',
+    'send',
+    'send_lazy',
+    'EventQueue',
+    'deferred',
+    'get_event_queue',
 ]
 
+import threading
+from contextlib import contextmanager
 from bands import Band
 
 
@@ -55,3 +63,163 @@ def transfer_receivers(src, dest):
         dest_channel = band.channel(identifier, dest)
         for receiver in src_channel.receivers:
             dest_channel.connect(receiver)
+
+
+def has_receivers(channel):
+    '''Check if any receivers would get a message sent through channel.'''
+
+    for _ in channel.get_receivers():
+        return True
+    return False
+
+
+def send(channel, *args):
+    '''Send a message through channel. Returns immediately when no
+    receivers are connected. While an :class:`EventQueue` is active the
+    message is queued instead.'''
+
+    return send_lazy(channel, lambda: args)
+
+
+def send_lazy(channel, make_args, key=None):
+    '''Like :func:`send` but args are only built by calling make_args when
+    the message is actually dispatched. Use this when building the message
+    is expensive, like copying an Entry's data.
+
+    Arguments:
+        channel (Channel): Channel to send through
+        make_args (callable): Returns a tuple of args to send
+        key (hashable): Queued messages with the same key are coalesced,
+            only the last one is dispatched
+    '''
+
+    queue = getattr(_local, 'queue', None)
+    if queue is not None:
+        queue.put(channel, make_args, key)
+        return []
+
+    if not has_receivers(channel):
+        return []
+    return channel.send(*make_args())
+
+
+class EventQueue(object):
+    '''Collects channel messages and dispatches them in order when flushed.
+    Messages sharing a key are coalesced, keeping the position of the first
+    message and the args of the last. Flush at a checkpoint by calling
+    :meth:`flush` or periodically from a thread using :meth:`start`.
+
+    Examples:
+        >>> chan = band.channel('example')
+        >>> receiver = lambda message: print(message)
+        >>> chan.connect(receiver)
+        >>> with deferred() as queue:
+        ...     _ = send(chan, 'hello')
+        ...     print(len(queue))
+        1
+        hello
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._keys = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, channel, make_args, key=None):
+        with self._lock:
+            if key is not None:
+                key = (channel.identifier, key)
+                if key in self._keys:
+                    self._events[self._keys[key]] = (channel, make_args)
+                    return
+                self._keys[key] = len(self._events)
+            self._events.append((channel, make_args))
+
+    def flush(self):
+        '''Dispatch all queued messages'''
+
+        with self._lock:
+            events, self._events = self._events, []
+            self._keys = {}
+
+        for channel, make_args in events:
+            if has_receivers(channel):
+                channel.send(*make_args())
+
+    def start(self, interval=0.1):
+        '''Flush this queue every interval seconds from a daemon thread'''
+
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.flush()
+            self.flush()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the flush thread, flushing any remaining messages'''
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+
+# The active queue is per thread, messages sent by other threads are not
+# held back by a deferred context
+_local = threading.local()
+
+
+def get_event_queue():
+    '''Get the active :class:`EventQueue` of this thread or None'''
+
+    return getattr(_local, 'queue', None)
+
+
+@contextmanager
+def deferred(queue=None, flush=True):
+    '''Queue all messages sent through :func:`send` and :func:`send_lazy`
+    by this thread while in this context. The queue is flushed on exit
+    unless flush is False, in which case the caller is responsible for
+    flushing it, for example with :meth:`EventQueue.start`.
+
+    Arguments:
+        queue (EventQueue): Queue to use, defaults to a new EventQueue
+        flush (bool): Flush the queue on exit
+
+    Examples:
+        .. code-block:: python
+
+            # One data changed message per entry instead of one per write
+            with fsfs.deferred():
+                for frame in range(1001, 1101):
+                    entry.write(frame_done=frame)
+    '''
+
+    active = getattr(_local, 'queue', None)
+    if active is not None and queue is None:
+        # Nested contexts share the outer queue
+        yield active
+        return
+
+    queue = queue or EventQueue()
+    _local.queue = queue
+    try:
+        yield queue
+    finally:
+        _local.queue = active
+        if flush:
+            queue.flush()
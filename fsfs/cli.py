@@ -78,7 +78,7 @@ def cli():
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Root directory of search')
+@option('--root', '-r', default=os.getcwd, help='Root directory of search')
 @option('--up/--down', 'direction', default=False, help='Direction to search')
 @argument('name', required=False)
 @option('--tags', '-t', cls=ListOption, help='List of tags to match')
@@ -104,7 +104,7 @@ def search(root, direction, name, tags):
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Root directory of search')
+@option('--root', '-r', default=os.getcwd, help='Root directory of search')
 @option('--up/--down', 'direction', default=False, help='Direction to search')
 @argument('name', required=False)
 @option('--tags', '-t', cls=ListOption, help='List of tags to match')
@@ -129,7 +129,7 @@ def one(root, direction, name, tags):
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Directory to tag')
+@option('--root', '-r', default=os.getcwd, help='Directory to tag')
 @argument('tags', nargs=-1, required=True)
 def tag(root, tags):
     '''Tag a directory'''
@@ -138,7 +138,7 @@ def tag(root, tags):
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Directoy to untag')
+@option('--root', '-r', default=os.getcwd, help='Directoy to untag')
 @argument('tags', nargs=-1, required=True)
 def untag(root, tags):
     '''Untag a directory'''
@@ -146,19 +146,57 @@ def untag(root, tags):
     fsfs.untag(root, *tags)
 
 
+@cli.command('migrate-tags')
+@option('--root', '-r', default=os.getcwd, help='Directory to migrate')
+@option('--from', 'src', default='files', help='Current tag storage layout',
+        type=click.Choice(sorted(fsfs.TAG_STORAGES)))
+@option('--to', 'dest', required=True, help='New tag storage layout',
+        type=click.Choice(sorted(fsfs.TAG_STORAGES)))
+def migrate_tags(root, src, dest):
+    '''Move tags to another storage layout'''
+
+    from fsfs import storage
+
+    count = storage.migrate_tag_storage(
+        fsfs.unipath(root),
+        fsfs.TAG_STORAGES[dest](),
+        fsfs.TAG_STORAGES[src](),
+    )
+    print(f('Migrated tags of {count} entries from {src} to {dest}'))
+
+
+@cli.command('migrate-data')
+@option('--root', '-r', default=os.getcwd, help='Directory to migrate')
+@option('--from', 'src', default='file', help='Current data storage layout',
+        type=click.Choice(sorted(fsfs.DATA_STORAGES)))
+@option('--to', 'dest', required=True, help='New data storage layout',
+        type=click.Choice(sorted(fsfs.DATA_STORAGES)))
+def migrate_data(root, src, dest):
+    '''Move data to another storage layout'''
+
+    from fsfs import storage
+
+    count = storage.migrate_data_storage(
+        fsfs.unipath(root),
+        fsfs.DATA_STORAGES[dest](),
+        fsfs.DATA_STORAGES[src](),
+    )
+    print(f('Migrated data of {count} entries from {src} to {dest}'))
+
+
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Directory to read from')
+@option('--root', '-r', default=os.getcwd, help='Directory to read from')
 @argument('keys', nargs=-1)
 def read(root, keys):
     '''Read metadata'''
 
     data = fsfs.read(root, *keys)
 
-    print(fsfs.encode_data(data))
+    print(fsfs.encode_data(fsfs.thaw(data)))
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Directory to write to')
+@option('--root', '-r', default=os.getcwd, help='Directory to write to')
 @option('--key', '-k', 'data',
         multiple=True, type=(str, OBJECT),
         help='Key Value pairs to write ')
@@ -183,7 +221,7 @@ def write(root, data, delkeys):
 
 
 @cli.command()
-@option('--root', '-r', default=os.getcwd(), help='Entry to delete')
+@option('--root', '-r', default=os.getcwd, help='Entry to delete')
 @option('--remove-root', is_flag=True, default=False, help='Remove directory?')
 def delete(root, remove_root):
     '''Delete an entry'''
@@ -194,3 +232,30 @@ def delete(root, remove_root):
 
     if click.confirm('Are you sure you want to delete {}?'.format(entry.name)):
         fsfs.delete(root, remove_root=remove_root)
+
+
+@cli.command()
+@option('--socket', '-s', 'path', default=None, help='Socket path')
+@option('--stop', is_flag=True, default=False, help='Stop running server')
+def serve(path, stop):
+    '''Serve search, one and read commands from a warm cache'''
+
+    from fsfs import _server
+
+    path = path or _server.get_socket_path()
+    if path is None:
+        raise UsageError('Unix domain sockets are not available.')
+
+    if stop:
+        if _server.request({'shutdown': True}, path) is None:
+            print(f('No server running at {path}'))
+            sys.exit(1)
+        return
+
+    print(f('Serving fsfs on {path}'))
+    try:
+        _server.serve(path)
+    except _server.ServerError as e:
+        raise UsageError(str(e))
+    except KeyboardInterrupt:
+        pass
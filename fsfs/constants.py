@@ -8,3 +8,7 @@ DEFAULT_SEARCH_DN_LEVELS = 0
 DEFAULT_SEARCH_UP_LEVELS = 0
 DOWN = 0
 UP = 1
+DFS = 'dfs'
+BFS = 'bfs'
+IDDFS = 'iddfs'
+PRIORITY = 'priority'
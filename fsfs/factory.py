@@ -2,8 +2,10 @@
 from __future__ import absolute_import, division, print_function
 __all__ = ['RegistrationError', 'SimpleEntryFactory', 'EntryFactory']
 import os
+import time
+import threading
 from collections import defaultdict
-from fsfs import api, models, channels
+from fsfs import api, util, models, channels
 
 
 class RegistrationError(Exception):
@@ -11,17 +13,27 @@ class RegistrationError(Exception):
 
 
 class SimpleEntryFactory(object):
-    '''SimpleEntryFactory returns the base implementation of Entry.'''
+    '''SimpleEntryFactory returns the base implementation of Entry.
+
+    The factory is thread-safe, concurrent calls with the same path always
+    return the same Entry instance.
+    '''
 
     def __init__(self):
         self._cache = {}
+        self._lock = threading.Lock()
 
     def __call__(self, path):
         '''Called by fsfs.get_entry via the global policy to create an entry'''
 
-        if path not in self._cache:
-            self._cache[path] = models.Entry(path)
-        return self._cache[path]
+        entry = self._cache.get(path)
+        if entry is None:
+            with self._lock:
+                entry = self._cache.get(path)
+                if entry is None:
+                    path = util.intern_path(path)
+                    entry = self._cache[path] = models.Entry(path)
+        return entry
 
     def setup(self):
         '''Connects this factory to all necessary channels. Called when this
@@ -44,22 +56,27 @@ class SimpleEntryFactory(object):
         channels.EntryMissing.disconnect(self.on_entry_missing)
         channels.EntryRelinked.disconnect(self.on_entry_relinked_or_moved)
         channels.EntryDeleted.disconnect(self.on_entry_deleted)
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
 
     def on_entry_relinked_or_moved(self, entry, old_path, new_path):
         '''Updates cache when entry is relinked or moved...'''
 
-        self._cache.pop(old_path, None)
-        self._cache[new_path] = entry
+        with self._lock:
+            self._cache.pop(old_path, None)
+            self._cache[new_path] = entry
 
     def on_entry_missing(self, entry, exc):
         '''Removes entry from cache if it's missing...'''
 
-        self._cache.pop(entry.path)
+        with self._lock:
+            self._cache.pop(entry.path, None)
 
     def on_entry_deleted(self, entry):
         '''Removes entry from cache when it's deleted...'''
-        self._cache.pop(entry.path)
+
+        with self._lock:
+            self._cache.pop(entry.path, None)
 
 
 class EntryFactory(object):
@@ -82,11 +99,24 @@ class EntryFactory(object):
 
         >>> import shutil; shutil.rmtree('tmp')
 
+    The factory is thread-safe, its caches are only modified while holding
+    the factory's lock.
+
+    Proxies remember the Entry they resolved to, attribute access only
+    checks the Entry's tags again once revalidate_interval seconds have
+    passed. Tags changed in this process invalidate proxies immediately
+    through the entry.data.tagged and entry.data.untagged channels, use
+    revalidate_interval to bound how long changes made by other processes
+    go unnoticed. Set it to 0 to check on every attribute access.
+
+    Arguments:
+        revalidate_interval (float): Seconds a proxy uses it's Entry before
+            checking it again
     '''
 
     _registry = defaultdict(dict)
 
-    def __init__(self):
+    def __init__(self, revalidate_interval=1.0):
 
         # Entry metaclass that automatically registers
         # EntryFactory.Entry subclasses
@@ -108,9 +138,11 @@ class EntryFactory(object):
         self.Entry = self.EntryType('Entry', (models.Entry,), {})
 
         # Setup cache and proxy cache
+        self.revalidate_interval = revalidate_interval
         self._cache = {}
         self._mtimes = {}
         self._cache_proxies = {}
+        self._lock = threading.RLock()
 
         class EntryProxy(object):
             '''This proxy is what actually gets returned by the factory. The
@@ -129,6 +161,8 @@ class EntryFactory(object):
             def __init__(self, path, factory=self):
                 self._path = path
                 self.factory = factory
+                self._obj = None
+                self._checked = 0
 
             def __repr__(self):
                 return self.obj().__repr__()
@@ -143,16 +177,38 @@ class EntryFactory(object):
                 return getattr(self.obj(), attr)
 
             def obj(self):
-                self.factory._update_cache(self._path, self)
-                return self.factory._cache[self._path]
+                obj = self._obj
+                if obj is not None and (
+                    time.time() - self._checked <
+                    self.factory.revalidate_interval
+                ):
+                    return obj
+
+                with self.factory._lock:
+                    self.factory._update_cache(self._path, self)
+                    obj = self._obj = self.factory._cache[self._path]
+                    self._checked = time.time()
+                    return obj
+
+            def invalidate(self):
+                '''Check the Entry's tags on the next attribute access'''
+
+                self._obj = None
 
         self.EntryProxy = EntryProxy
 
     def __call__(self, path):
-        '''Called by fsfs.get_entry via the global policy to create an entry'''
+        '''Called by fsfs.get_entry via the global policy to create an entry.
+        Cached proxies are returned as is, they check their Entry when it's
+        attributes are accessed.'''
 
-        self._update_cache(path)
-        return self._cache_proxies[path]
+        proxy = self._cache_proxies.get(path)
+        if proxy is not None:
+            return proxy
+
+        with self._lock:
+            self._update_cache(path)
+            return self._cache_proxies[path]
 
     def get_type(self, tag):
         '''Get a type for the specified tag'''
@@ -200,51 +256,69 @@ class EntryFactory(object):
         channels.EntryMissing.disconnect(self.on_entry_missing)
         channels.EntryRelinked.disconnect(self.on_entry_relinked_or_moved)
         channels.EntryDeleted.disconnect(self.on_entry_deleted)
-        self._cache.clear()
-        self._cache_proxies.clear()
-        self._mtimes.clear()
+        with self._lock:
+            for proxy in self._cache_proxies.values():
+                proxy.invalidate()
+            self._cache.clear()
+            self._cache_proxies.clear()
+            self._mtimes.clear()
 
     def on_entry_tagged(self, entry, tags):
         '''When entry tag added set mtime to None. Forces proxy to update.'''
 
-        self._mtimes[entry.path] = None
+        with self._lock:
+            self._mtimes[entry.path] = None
+            self._invalidate_proxy(entry.path)
 
     def on_entry_untagged(self, entry, tags):
         '''When entry tag removed set mtime to None. Forces proxy to update.'''
 
-        self._mtimes[entry.path] = None
+        with self._lock:
+            self._mtimes[entry.path] = None
+            self._invalidate_proxy(entry.path)
+
+    def _invalidate_proxy(self, path):
+        proxy = self._cache_proxies.get(path)
+        if proxy is not None:
+            proxy.invalidate()
 
     def on_entry_relinked_or_moved(self, entry, old_path, new_path):
         '''Update cache when entry relinked or moved'''
 
-        _entry, proxy, _mtime = self._pop_cache_path(old_path)
-        proxy._path = new_path
-        tags = api.get_tags(new_path)
-        entry_type = self.type_for_tags(tags)
-        new_entry = entry_type(new_path)
+        with self._lock:
+            _entry, proxy, _mtime = self._pop_cache_path(old_path)
+            if proxy is None:
+                proxy = self.EntryProxy(new_path)
+            proxy._path = new_path
+            proxy.invalidate()
+            tags = api.get_tags(new_path)
+            entry_type = self.type_for_tags(tags)
+            new_entry = entry_type(new_path)
 
-        # Transfer receivers to new Entry
-        channels.transfer_receivers(entry, new_entry)
+            # Transfer receivers to new Entry
+            channels.transfer_receivers(entry, new_entry)
 
-        # Update cache
-        self._cache[new_path] = new_entry
-        self._cache_proxies[new_path] = proxy._path
-        self._mtimes[new_path] = os.path.getmtime(new_path)
+            # Update cache
+            self._cache[new_path] = new_entry
+            self._cache_proxies[new_path] = proxy
+            self._mtimes[new_path] = os.path.getmtime(new_path)
 
     def on_entry_missing(self, entry, exc):
         '''Remove entry.path from cache when entry goes missing'''
 
-        self._pop_cache_path(entry.path)
+        with self._lock:
+            self._pop_cache_path(entry.path)
 
     def on_entry_deleted(self, entry):
         '''Remove entry.path from cache when entry deleted'''
 
-        self._pop_cache_path(entry.path)
+        with self._lock:
+            self._pop_cache_path(entry.path)
 
     def _pop_cache_path(self, path):
         '''Removes the specified path from all caches'''
 
-
+        self._invalidate_proxy(path)
         return (
             self._cache.pop(path, None),
             self._cache_proxies.pop(path, None),
@@ -258,10 +332,13 @@ class EntryFactory(object):
         return os.path.getmtime(path) != self._mtimes.get(path, None)
 
     def _update_cache(self, path, proxy=None):
+        '''Create or update the cached Entry and proxy of path. Must be
+        called while holding the factory's lock.'''
 
         if path in self._cache and not self._mtime_changed(path):
             return
 
+        path = util.intern_path(path)
         tags = api.get_tags(path)
         entry_type = self.type_for_tags(tags)
 
@@ -273,7 +350,7 @@ class EntryFactory(object):
             old_entry = self._cache[path]
             new_entry = entry_type(path)
             channels.transfer_receivers(old_entry, new_entry)
-            self._cache[path] = entry_type(path)
+            self._cache[path] = new_entry
 
         if path not in self._cache_proxies:
             if proxy is None:
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+'''
+Rules used by search walks to skip directories.
+
+Walks skip a directory when it's name is in :attr:`IgnoreRules.names` or
+matches one of :attr:`IgnoreRules.patterns`. A directory can also list
+patterns for the directories inside it in a .fsfsignore file, one pattern
+per line, and a directory containing a .fsfsnoentries file is never
+descended into, though it may itself be an Entry.
+
+Use :func:`fsfs.set_ignore_rules` to change the rules used by the global
+policy.
+'''
+from __future__ import absolute_import
+
+__all__ = [
+    'IGNORE_FILE',
+    'NO_ENTRIES_FILE',
+    'IgnoreRules',
+]
+
+import os
+import re
+import fnmatch
+import threading
+
+IGNORE_FILE = '.fsfsignore'
+NO_ENTRIES_FILE = '.fsfsnoentries'
+
+
+def _compile_patterns(patterns):
+    if not patterns:
+        return
+    regex = '|'.join('(?:%s)' % fnmatch.translate(p) for p in patterns)
+    return re.compile(regex).match
+
+
+class IgnoreRules(object):
+    '''Determines which directories search walks skip.
+
+    Arguments:
+        names (list): Directory names to skip
+        patterns (list): fnmatch patterns matched against directory names
+        ignore_file (str): Name of the files listing patterns for the
+            directories beside them, None to disable
+        no_entries_file (str): Name of the files marking directories with
+            no Entries below them, None to disable
+
+    Examples:
+        >>> rules = IgnoreRules(names=['.git'], patterns=['*_cache'])
+        >>> rules.ignores('.git'), rules.ignores('sim_cache')
+        (True, True)
+        >>> rules.ignores('sh_010')
+        False
+    '''
+
+    def __init__(
+        self,
+        names=(),
+        patterns=(),
+        ignore_file=IGNORE_FILE,
+        no_entries_file=NO_ENTRIES_FILE,
+    ):
+        self.names = frozenset(names)
+        self.patterns = tuple(patterns)
+        self.ignore_file = ignore_file
+        self.no_entries_file = no_entries_file
+        self._match = _compile_patterns(self.patterns)
+        self._ignore_files = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '{}(names={!r}, patterns={!r})'.format(
+            self.__class__.__name__, sorted(self.names), list(self.patterns)
+        )
+
+    def ignores(self, name):
+        '''Check if directories named name are skipped'''
+
+        return name in self.names or bool(self._match and self._match(name))
+
+    def read_ignore_file(self, path):
+        '''Get a function matching the names ignored by an ignore file.
+        Ignore files are cached until they are modified.
+
+        Arguments:
+            path (str): Path to an ignore file
+
+        Returns:
+            callable: returns True for ignored names, or None when the file
+            lists no patterns
+        '''
+
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+
+        cached = self._ignore_files.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        patterns = []
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        patterns.append(line.rstrip('/'))
+        except IOError:
+            return
+
+        match = _compile_patterns(patterns)
+        with self._lock:
+            self._ignore_files[path] = (mtime, match)
+        return match
@@ -6,13 +6,15 @@ __all__ = [
     'LockFileTimeOutError',
     'LockFilePump',
     'LockFile',
-    'lockfile'
+    'lockfile',
+    'RWLock',
 ]
 
 import atexit
 import os
 import time
 import errno
+import heapq
 import threading
 from warnings import warn
 from datetime import datetime
@@ -27,6 +29,13 @@ class LockFileTimeOutError(Exception): pass
 class LockFilePump(threading.Thread):
     '''A daemon thread that updates all acquired LockFiles held by this
     process. This keeps the locks from expiring while the process has them.
+
+    Locks are kept in a heap ordered by the time their next refresh is due,
+    so each cycle only touches the locks that are nearing expiry. The cost
+    of a cycle does not grow with the number of locks that are not due.
+    Released locks are dropped from the heap when they come due. Locks that
+    fail to refresh are retried sooner than usual, backing off while the
+    failures continue, so a transient error doesn't let them expire.
     '''
 
     def __init__(self):
@@ -35,6 +44,14 @@ class LockFilePump(threading.Thread):
         self._shutdown = threading.Event()
         self._stopped = threading.Event()
         self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._heap = []
+        self._counter = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.cycles = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
         atexit.register(self.stop)
 
     @property
@@ -55,34 +72,121 @@ class LockFilePump(threading.Thread):
 
         self._shutdown.set()
         self._stopped.wait()
-        if self.isAlive():
+        if self.is_alive():
             self.join()
 
+    def schedule(self, lock, delay=None):
+        '''Schedule the next refresh of lock delay seconds from now,
+        defaults to one pump interval.'''
+
+        if delay is None:
+            delay = LockFile._pump_interval_
+        due = default_timer() + delay
+        with self._lock:
+            self._counter += 1
+            lock._pump_token = self._counter
+            heapq.heappush(self._heap, (due, self._counter, lock))
+
+    def stats(self):
+        '''Get metrics of the pump.
+
+        Returns:
+            dict: scheduled - number of heap entries,
+                refreshed - total number of lock refreshes,
+                failed - total number of failed refreshes,
+                cycles - number of cycles that refreshed a lock,
+                last_lag - seconds the last refresh was late by,
+                max_lag - maximum seconds a refresh was late by
+        '''
+
+        return {
+            'scheduled': len(self._heap),
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'cycles': self.cycles,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag,
+        }
+
+    def _pop_due(self, now):
+        '''Pop the locks due for a refresh. Returns the due locks and the
+        time the next lock is due.'''
+
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                due_time, token, lock = heapq.heappop(heap)
+                if lock.acquired and lock._pump_token == token:
+                    due.append((due_time, lock))
+            next_due = heap[0][0] if heap else None
+        return due, next_due
+
+    def refresh(self, now=None):
+        '''Refresh all locks that are due and reschedule them.
+
+        Returns:
+            float: seconds until the next lock is due or None
+        '''
+
+        now = default_timer() if now is None else now
+        due, next_due = self._pop_due(now)
+        if not due:
+            return None if next_due is None else next_due - now
+
+        for due_time, lock in due:
+            try:
+                lock._touch()
+            except OSError as e:
+                if e.errno == errno.ENOENT and not lock.acquired:
+                    continue  # Released while we were refreshing
+                self.failed += 1
+                lock._pump_failures += 1
+                if lock._pump_failures == 1:
+                    msg = (
+                        'PumpThread failed to update mtime of lock: \n'
+                        '{}: {}'
+                    ).format(e.errno, e.strerror)
+                    warn(msg)
+                self.schedule(lock, _retry_delay(lock._pump_failures))
+                continue
+
+            lock._pump_failures = 0
+            self.refreshed += 1
+            self.last_lag = now - due_time
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self.schedule(lock)
+
+        self.cycles += 1
+        with self._lock:
+            next_due = self._heap[0][0] if self._heap else None
+        return None if next_due is None else next_due - default_timer()
+
     def run(self):
 
         try:
             self._started.set()
 
             while True:
+                wait = self.refresh()
+                if wait is None:
+                    wait = LockFile._pump_interval_
 
-                for lock in list(LockFile._acquired_locks):
-                    if lock.locked:
-                        try:
-                            lock._touch()
-                        except OSError as e:
-                            msg = (
-                                'PumpThread failed to update mtime of lock: \n'
-                                '{errno}: {massge}'
-                            ).format(e.errno, e.message)
-                            warn(msg)
-
-                if self._shutdown.wait(LockFile._pump_interval_):
+                if self._shutdown.wait(max(wait, 0)):
                     break
 
         finally:
             self._stopped.set()
 
 
+def _retry_delay(failures):
+    '''Seconds until a lock that failed to refresh failures times in a row
+    is retried, doubling from an eighth of the pump interval.'''
+
+    interval = LockFile._pump_interval_
+    return min(interval, interval / 8.0 * 2 ** (failures - 1))
+
+
 class LockFile(object):
     '''Uses a file as a lock. When a LockFile is acquired a file is created at
     its associated path. While this file exists no other process can acquire
@@ -95,6 +199,10 @@ class LockFile(object):
     current process holds. Once this process exits, any hanging locks will
     finally have a static mtime, and they can expire.
 
+    Locks can be acquired from any thread, they share one pump thread.
+    Acquisition is tracked per LockFile, not per thread, so threads must not
+    share a LockFile without their own lock around it.
+
     Examples:
 
         Acquire a lock.
@@ -140,17 +248,19 @@ class LockFile(object):
             >>> lock2.release()
     '''
 
-    _pump_ = LockFilePump()
+    _pump_ = None  # Created when the first lock is acquired
+    _pump_lock = threading.Lock()
     _pump_interval_ = 1
     _expiration = 2  # Expiration must be greater than pump interval
-    _acquired_locks = []
+    _acquired_locks = set()
 
     def __init__(self, path):
 
         self.path = os.path.abspath(path)
         self.acquired = False
         self._depth = 0
-        self._start_pump()
+        self._pump_token = None
+        self._pump_failures = 0
 
     def __enter__(self):
         if self._depth == 0:
@@ -189,21 +299,27 @@ class LockFile(object):
         return self._time_since_modified() > self._expiration
 
     def _start_pump(self):
-        '''Start the pump thread'''
-        if self._pump_.started:
+        '''Start the pump thread, threads acquiring their first locks at
+        the same time create and start one pump.'''
+
+        pump = LockFile._pump_
+        if pump is not None and pump.started:
             return
 
-        self._pump_.start()
+        with LockFile._pump_lock:
+            if LockFile._pump_ is None:
+                LockFile._pump_ = LockFilePump()
 
-        # Wait for pump thread to start
-        while not self._pump_.started:
-            time.sleep(0.01)
+            pump = LockFile._pump_
+            if not pump.started:
+                pump.start()
+                # Wait for pump thread to start
+                pump._started.wait()
 
     def _touch(self):
         '''Touch the lock file, updates the files mtime'''
 
-        with open(self.path, 'a'):
-            os.utime(self.path, None)
+        os.utime(self.path, None)
 
     def _time_since_modified(self):
         '''Return the total seconds since the specified file was modified'''
@@ -235,10 +351,14 @@ class LockFile(object):
             self.acquired = False
             return
 
-        self._touch()
+        with open(self.path, 'a'):
+            pass
 
-        self._acquired_locks.append(self)
+        self._acquired_locks.add(self)
         self.acquired = True
+        self._pump_failures = 0
+        self._start_pump()
+        self._pump_.schedule(self)
 
     def acquire(self, timeout=0):
         '''Acquire the lock. Raises an exception when timeout is reached.
@@ -281,8 +401,8 @@ class LockFile(object):
             if e.errno != errno.ENOENT:
                 raise e
         finally:
-            if self in self._acquired_locks:
-                self._acquired_locks.remove(self)
+            self._acquired_locks.discard(self)
+            self._pump_token = None
             self.acquired = False
 
     def release(self):
@@ -342,5 +462,72 @@ def lockfile(path, timeout=0):
         lock.release()
 
 
+class RWLock(object):
+    '''A reader/writer lock for threads in this process. Any number of
+    threads may hold the lock shared, one thread may hold it exclusively.
+    Waiting writers block new readers so writers are not starved.
+
+    Shared sections must not be nested while another thread may be waiting
+    for the exclusive lock.
+
+    Examples:
+
+        >>> lock = RWLock()
+        >>> with lock.shared():
+        ...     pass
+        >>> with lock.exclusive():
+        ...     pass
+    '''
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_shared(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_shared(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_exclusive(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+
+    def release_exclusive(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def shared(self):
+        self.acquire_shared()
+        try:
+            yield self
+        finally:
+            self.release_shared()
+
+    @contextmanager
+    def exclusive(self):
+        self.acquire_exclusive()
+        try:
+            yield self
+        finally:
+            self.release_exclusive()
+
+
 # Make sure that all locks are released on program exit
 atexit.register(LockFile._release_locks)
@@ -8,8 +8,10 @@ import os
 import shutil
 import errno
 import uuid
-from scandir import scandir
-from fsfs import api, util, lockfile, types, _search
+import threading
+from contextlib import contextmanager
+from fsfs._compat import scandir
+from fsfs import api, util, lockfile, types, _search, channels
 from fsfs.constants import UP
 from fsfs.channels import band
 
@@ -47,7 +49,7 @@ def relink_uuid(entry):
         exc = EntryNotFoundError(
             'Entry data directory no longer exists: ' + data.path
         )
-        entry.missing.send(entry, exc)
+        channels.send(entry.missing, entry, exc)
         raise exc
 
     match = None
@@ -62,7 +64,7 @@ def relink_uuid(entry):
             exc = EntryNotFoundError(
                 'File system branch containing Entry no longer exists...'
             )
-            entry.missing.send(entry, exc)
+            channels.send(entry.missing, entry, exc)
             raise exc
 
     match = _search.one_uuid(root, data.uuid, depth=level + 1)
@@ -79,18 +81,25 @@ def relink_uuid(entry):
         old_root = entry.path
         new_root, new_data_root, new_uuid_file = match
         entry._set_path(new_root, data.uuid, new_uuid_file)
-        entry.relinked.send(entry, old_root, new_root)
+        channels.send(entry.relinked, entry, old_root, new_root)
     else:
         exc = EntryNotFoundError(
             'Could not locate Entry matching uuid: ' + data.uuid +
             '    Entry: ' + repr(entry)
         )
-        entry.missing.send(entry, exc)
+        channels.send(entry.missing, entry, exc)
         raise exc
 
 
 class EntryData(object):
-    '''Interface to a directory's metadata and tags.'''
+    '''Interface to a directory's metadata and tags.
+
+    EntryData is safe to share between threads. Reads share a reader/writer
+    lock and return a consistent version of the data. Writes, tagging and
+    initialization are serialized by a per-entry lock within this process
+    and by a LockFile across processes. Data returned by reads is never
+    mutated by later writes.
+    '''
 
     def __init__(self, parent, path):
         self.parent = parent
@@ -102,30 +111,47 @@ class EntryData(object):
         self.file = None
         self.uuid = None
         self.uuid_file = None
-        self._lock = None
+        self._lockfile = None
+        self._write_lock = threading.RLock()
         self._set_path(path)
 
         self._data = None
+        self._data_layout = None
         self._data_mtime = None
+        self._data_lock = lockfile.RWLock()
 
     def _set_path(self, path, uuid=None, uuid_file=None):
-        self.path = path
-        self.blobs_path = util.unipath(self.path, 'blobs')
-        self.files_path = util.unipath(self.path, 'files')
-        self.file = util.unipath(self.path, api.get_data_file())
-
-        if not uuid or not uuid_file:
-            self.uuid = None
-            self.uuid_file = None
-            self._find_uuid()
-        else:
-            self.uuid = uuid
-            self.uuid_file = uuid_file
+        with self._write_lock:
+            self.path = path
+            self.blobs_path = util.joinpath(path, 'blobs')
+            self.files_path = util.joinpath(path, 'files')
+            self.file = util.joinpath(path, api.get_data_file())
+
+            if not uuid or not uuid_file:
+                self.uuid = None
+                self.uuid_file = None
+                self._find_uuid()
+            else:
+                self.uuid = uuid
+                self.uuid_file = uuid_file
 
-        if self._lock and self._lock.acquired:
-            self._lock.release()
+            if self._lockfile and self._lockfile.acquired:
+                self._lockfile.release()
+            self._lockfile = None
 
-        self._lock = lockfile.LockFile(util.unipath(self.path, '.lock'))
+    @property
+    def _lock(self):
+        '''LockFile of this Entry's data, created when first used'''
+
+        lock = self._lockfile
+        if lock is None:
+            with self._write_lock:
+                if self._lockfile is None:
+                    self._lockfile = lockfile.LockFile(
+                        util.joinpath(self.path, '.lock')
+                    )
+                lock = self._lockfile
+        return lock
 
     # Act like a dict
 
@@ -136,22 +162,23 @@ class EntryData(object):
         return self._read().__str__()
 
     def __getitem__(self, key):
-        return self._read()[key]
+        return self._read_keys((key,))[key]
 
     def __delitem__(self, key):
-        data = self._read()
-        del data[key]
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        if key not in self._read_keys((key,)):
+            raise KeyError(key)
+        self._remove((key,))
+        self._send_data_changed()
 
     def __setitem__(self, key, value):
         self._write(**{key: value})
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._send_data_changed()
 
     def __iter__(self):
         return self._read().__iter__()
 
     def __contains__(self, key):
-        return key in self._read()
+        return key in self._read_keys((key,))
 
     def __len__(self):
         return self._read().__len__()
@@ -165,23 +192,23 @@ class EntryData(object):
     def values(self):
         return self._read().values()
 
-    def get(self, *args):
-        return self._read().get(*args)
+    def get(self, key, default=None):
+        return self._read_keys((key,)).get(key, default)
 
     def update(self, **kwargs):
         self._write(**kwargs)
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._send_data_changed()
 
     def __eq__(self, other):
-        self._read().__eq__(other)
+        return self._read().__eq__(other)
 
     def __ne__(self, other):
-        self._read().__ne__(other)
+        return self._read().__ne__(other)
 
     # Core Methods
 
     def _make_uuid_path(self, uuid):
-        return util.unipath(self.path, 'uuid_' + uuid)
+        return util.joinpath(self.path, 'uuid_' + uuid)
 
     def _has_uuid(self):
         return bool(self.uuid)
@@ -218,7 +245,7 @@ class EntryData(object):
         # uuid_changed event.
         is_new_uuid = bool(self.uuid)
 
-        with self._lock:
+        with self._write_lock, self._lock:
 
             if self.uuid_file and os.path.isfile(self.uuid_file):
                 os.remove(self.uuid_file)
@@ -228,111 +255,235 @@ class EntryData(object):
             util.touch(self.uuid_file)
 
         if is_new_uuid:
-            self.parent.uuid_changed.send(self.parent)
+            channels.send(self.parent.uuid_changed, self.parent)
 
     def _init_uuid(self):
         if self.uuid:
             return
-        if self._find_uuid():
-            return
-        self._set_uuid()
+        with self._write_lock:
+            if self.uuid or self._find_uuid():
+                return
+            self._set_uuid()
 
     def _init(self):
         if self._requires_relink():
             relink_uuid(self.parent)
 
+        storage = api.get_data_storage()
         is_new = False
-        if not os.path.isfile(self.file):
-            util.touch(self.file)
-            is_new = True
+        if not storage.exists(self.path):
+            with self._write_lock:
+                if not storage.exists(self.path):
+                    storage.init(self.path)
+                    is_new = True
 
         self._init_uuid()
 
         if is_new:
-            self.parent.created.send(self.parent)
-
-    def _read(self):
-        '''Ensure data directory is initialized, then read or update cache'''
+            channels.send(self.parent.created, self.parent)
 
+    def _ensure_exists(self):
         if self.parent.exists or self._requires_relink():
             self._init()
         else:
             raise OSError('Entry data does not exist: %s' % self.parent)
 
-        mtime = os.path.getmtime(self.file)
-        needs_update = (
-            self._data is None or
-            self._data_mtime < mtime
+    def _is_cached(self, storage, mtime):
+        # Any mtime change is stale, restore sets older mtimes
+        return (
+            self._data_mtime is not None and
+            mtime is not None and
+            self._data_layout == storage.layout and
+            self._data_mtime == mtime
         )
 
-        if needs_update:
+    def _set_cache(self, storage, data):
+        with self._data_lock.exclusive():
+            self._data = data
+            self._data_layout = storage.layout
+            self._data_mtime = None
+            if data is not None:
+                self._data_mtime = storage.mtime(self.path)
 
-            with open(self.file, 'r') as f:
-                raw_data = f.read()
+    def _read(self):
+        '''Ensure data directory is initialized, then read or update cache.
+        Reads share the data lock, so any number of threads can read while a
+        writer merges and encodes it's data.'''
 
-            if not raw_data:
-                self._data = {}
-            else:
-                self._data = api.decode_data(raw_data)
+        self._ensure_exists()
+        storage = api.get_data_storage()
+
+        with self._data_lock.shared():
+            mtime = storage.mtime(self.path)
+            if self._is_cached(storage, mtime):
+                return self._data
+
+            data = types.freeze(storage.read(self.path))
+
+        with self._data_lock.exclusive():
+            if not self._is_cached(storage, mtime):
+                self._data = data
+                self._data_layout = storage.layout
+                self._data_mtime = mtime
+            return self._data
+
+    def _read_keys(self, keys):
+        '''Read a mapping containing at least the stored keys in keys. When
+        the data storage supports partial reads and the cache is stale, only
+        these keys are read and decoded.'''
 
-            self._data_mtime = mtime
+        storage = api.get_data_storage()
+        if not storage.partial:
+            return self._read()
 
-        return self._data
+        self._ensure_exists()
+
+        with self._data_lock.shared():
+            if self._is_cached(storage, storage.mtime(self.path)):
+                return self._data
+
+        return types.freeze(storage.read(self.path, keys))
 
     def _write(self, replace=False, **data):
-        '''Ensure data directory is initialized, then write updated data'''
+        '''Ensure data directory is initialized, then write updated data.
+
+        The LockFile serializes writers across processes. Data is replaced
+        atomically, so readers in other processes never see a partial file,
+        and the data lock is only held exclusively while the cache is
+        swapped. Partial data storages only read and write the keys in data,
+        appending data storages store data without reading at all.
+        '''
 
         self._init()
+        storage = api.get_data_storage()
+
+        with self._write_lock, self._lock:
+            if storage.appends and not replace:
+                self._write_keys(storage, data, merge=True)
+                return
+
+            if storage.partial and not replace:
+                cached = self._read_keys(list(data))
+                old_data = dict((k, cached[k]) for k in data if k in cached)
+                self._write_keys(storage, util.merge_dict(old_data, data))
+                return
 
-        with self._lock:
             if not replace:
-                new_data = self._read()
-                util.update_dict(new_data, data)
+                new_data = types.freeze(util.merge_dict(self._read(), data))
             else:
-                new_data = data
-            with open(self.file, 'w') as f:
-                f.write(api.encode_data(new_data))
+                new_data = types.freeze(data)
+            storage.write(self.path, new_data, replace=True)
+            self._set_cache(storage, new_data)
 
-            self._data = new_data
-            self._data_mtime = os.path.getmtime(self.file)
+    def _remove(self, keys):
+        '''Remove keys from data, like :meth:`_write`.'''
 
-    def _make_tag_path(self, tag):
-        return util.unipath(self.path, 'tag_' + tag)
+        self._init()
+        storage = api.get_data_storage()
+
+        with self._write_lock, self._lock:
+            if storage.partial or storage.appends:
+                self._write_keys(storage, {}, keys)
+                return
+
+            new_data = dict(self._read())
+            for key in keys:
+                new_data.pop(key, None)
+            new_data = types.FrozenDict(new_data)
+            storage.write(self.path, new_data, replace=True)
+            self._set_cache(storage, new_data)
+
+    def _write_keys(self, storage, data, removed=(), merge=False):
+        '''Write and remove single keys using a partial or appending data
+        storage. When merge is True, data is merged into the stored data.
+        A current cache is updated without reading the whole document.'''
+
+        data = types.freeze(data)
+        with self._data_lock.shared():
+            cached = None
+            if self._is_cached(storage, storage.mtime(self.path)):
+                cached = self._data
+
+        if data and merge:
+            storage.update(self.path, data)
+        elif data:
+            storage.write(self.path, data)
+        if removed:
+            storage.remove(self.path, removed)
+
+        if cached is not None:
+            if merge:
+                cached = util.merge_dict(cached, data)
+            else:
+                cached = dict(cached)
+                cached.update(data)
+            for key in removed:
+                cached.pop(key, None)
+            cached = types.freeze(cached)
+        self._set_cache(storage, cached)
+
+    def _send_data_changed(self):
+        '''Send data_changed with the current data snapshot, queued messages
+        for this Entry are coalesced. Partial data storages may not have
+        the snapshot cached, it is then only read when there are receivers.'''
+
+        channels.send_lazy(
+            self.parent.data_changed,
+            lambda: (
+                self.parent,
+                self._data if self._data is not None else self._read(),
+            ),
+            key=id(self.parent),
+        )
+
+    @contextmanager
+    def _tag_lock(self, storage):
+        with self._write_lock:
+            if storage.requires_lock:
+                with self._lock:
+                    yield
+            else:
+                yield
 
     @property
     def itags(self):
-        for entry in scandir(self.path):
-            if entry.name.startswith('tag_'):
-                yield entry.name.replace('tag_', '')
+        for tag in self.tags:
+            yield tag
 
     @property
     def tags(self):
-        return list(self.itags)
+        return api.get_tag_storage().get_tags(self.path)
 
     def tag(self, *tags):
-        self._init()
-        for tag in tags:
-            api.validate_tag(tag)
-            tag_path = self._make_tag_path(tag)
-            if not os.path.isfile(tag_path):
-                util.touch(tag_path)
-
-        self.parent.tagged.send(self.parent, tags)
+        api.validate_tags(tags)
+        self._add_tags(tags)
+        channels.send(self.parent.tagged, self.parent, tags)
 
     def untag(self, *tags):
-        for tag in tags:
-            api.validate_tag(tag)
-            tag_path = self._make_tag_path(tag)
-            if os.path.isfile(tag_path):
-                os.remove(tag_path)
+        api.validate_tags(tags)
+        self._remove_tags(tags)
+        channels.send(self.parent.untagged, self.parent, tags)
 
-        self.parent.untagged.send(self.parent, tags)
+    def _add_tags(self, tags):
+        '''Add validated tags without sending tagged'''
 
-    def read(self, *keys):
-        data = self._read()
+        self._init()
+        storage = api.get_tag_storage()
+        with self._tag_lock(storage):
+            storage.add_tags(self.path, tags)
+
+    def _remove_tags(self, tags):
+        '''Remove validated tags without sending untagged'''
+
+        storage = api.get_tag_storage()
+        with self._tag_lock(storage):
+            storage.remove_tags(self.path, tags)
 
+    def read(self, *keys):
         if not keys:
-            return data
+            return self._read()
+
+        data = self._read_keys(keys)
 
         if len(keys) == 1:
             return data[keys[0]]
@@ -341,18 +492,15 @@ class EntryData(object):
 
     def write(self, replace=False, **data):
         self._write(replace, **data)
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._send_data_changed()
 
     def remove(self, *keys):
-        data = self._read()
-        for key in keys:
-            data.pop(key, None)
-        self._write(replace=True, **data)
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._remove(keys)
+        self._send_data_changed()
 
     def read_blob(self, key):
-        data = self._read()
-        blobs = data.setdefault('blobs', {})
+        data = self._read_keys(('blobs',))
+        blobs = data.get('blobs', {})
         blob_path = util.unipath(self.blobs_path, blobs[key])
         return types.File(blob_path, mode='rb')
 
@@ -365,11 +513,11 @@ class EntryData(object):
             f.write(data)
 
         self._write(**dict(blobs={key: blob_name}))
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._send_data_changed()
 
     def read_file(self, key):
-        data = self._read()
-        files = data.setdefault('files', {})
+        data = self._read_keys(('files',))
+        files = data.get('files', {})
         file_path = util.unipath(self.files_path, files[key])
         return types.File(file_path, mode='rb')
 
@@ -382,7 +530,7 @@ class EntryData(object):
         util.copy_file(file, file_path)
 
         self._write(**dict(files={key: file_name}))
-        self.parent.data_changed.send(self.parent, dict(self._data))
+        self._send_data_changed()
 
     def delete(self):
         try:
@@ -391,7 +539,7 @@ class EntryData(object):
             if e.errno != errno.EEXIST:
                 raise
 
-        self.parent.data_deleted.send(self.parent)
+        channels.send(self.parent.data_deleted, self.parent)
 
 
 class Entry(object):
@@ -413,7 +561,7 @@ class Entry(object):
         self.name = os.path.basename(path)
         self.data = EntryData(
             self,
-            util.unipath(path, api.get_data_root())
+            util.joinpath(util.unipath(path), api.get_data_root())
         )
 
     def __repr__(self):
@@ -430,7 +578,7 @@ class Entry(object):
 
         self.path = path
         self.name = os.path.basename(path)
-        data_path = util.unipath(path, api.get_data_root())
+        data_path = util.joinpath(util.unipath(path), api.get_data_root())
         self.data._set_path(data_path, uuid, uuid_file)
 
     @property
@@ -481,7 +629,9 @@ class Entry(object):
                    key and not a dict
 
         Returns:
-            dict or value
+            dict or value: All data is returned as an immutable
+            :class:`fsfs.FrozenDict` snapshot, use it's thaw method to get a
+            mutable copy
         '''
         return self.data.read(*keys)
 
@@ -568,11 +718,19 @@ class Entry(object):
 
     def parent(self, **kwargs):
         '''Walks up the directory tree returning the first Entry object found.
+        Without kwargs the lookup is answered by the ancestor cache shared
+        by all entries, see :class:`fsfs._search.AncestorCache`.
 
         Returns:
             Entry: parent of this Entry
         '''
 
+        if not kwargs:
+            path = _search.parent_path(util.unipath(self.path))
+            if path:
+                return api.get_entry(path)
+            return
+
         kwargs.setdefault('root', self.path)
         kwargs.setdefault('direction', UP)
         kwargs.setdefault('skip_root', True)
@@ -633,10 +791,10 @@ class Entry(object):
         # Update uuids and send EntryCreated signals
         new_entry = api.get_entry(dest)
         new_entry.data._set_uuid()
-        new_entry.created.send(new_entry)
+        channels.send(new_entry.created, new_entry)
         for child in new_entry.children():
             child.data._set_uuid()
-            child.created.send(child)
+            channels.send(child.created, child)
         return new_entry
 
     def move(self, dest):
@@ -666,11 +824,11 @@ class Entry(object):
         old_path = self.path
         new_path = dest
         self._set_path(dest)  # Update this Entry's path
-        self.moved.send(self, old_path, new_path)
+        channels.send(self.moved, self, old_path, new_path)
         for child in self.children():
             new_child_path = child.path
             old_child_path = new_child_path.replace(new_path, old_path)
-            child.moved.send(child, old_child_path, new_child_path)
+            channels.send(child.moved, child, old_child_path, new_child_path)
 
     def delete(self, remove_root=False):
         '''Delete an entry
@@ -683,7 +841,7 @@ class Entry(object):
         self.data.delete()
         self.data = EntryData(
             self,
-            util.unipath(self.path, api.get_data_root())
+            util.joinpath(util.unipath(self.path), api.get_data_root())
         )
 
         if remove_root:
@@ -698,4 +856,4 @@ class Entry(object):
                 if e.errno != errno.EEXIST:
                     raise
 
-        self.deleted.send(self)
+        channels.send(self.deleted, self)
@@ -14,10 +14,13 @@ __all__ = [
     'DefaultRoot',
     'DefaultFile',
     'DefaultFactory',
+    'DefaultTagStorage',
+    'DefaultDataStorage',
+    'DefaultIgnoreRules',
 ]
 
 from functools import partial
-from fsfs import factory
+from fsfs import factory, storage, ignore
 from fsfs._compat import callable
 
 
@@ -32,6 +35,10 @@ class FsFsPolicy(object):
         data_root: '.data'
         data_file: 'data'
         entry_factory: `SimpleEntryFactory`
+        tag_storage: `FilesTagStorage`
+        data_storage: `FileDataStorage`
+        ignore_rules: `IgnoreRules`
+        index_fields: []
 
     Use the following api methods to modify the global policy:
         api.set_data_encoder(data_encoder)
@@ -39,6 +46,10 @@ class FsFsPolicy(object):
         api.set_data_root(data_root)
         api.set_data_file(data_file)
         api.set_entry_factory(entry_factory)
+        api.set_tag_storage(tag_storage)
+        api.set_data_storage(data_storage)
+        api.set_ignore_rules(ignore_rules)
+        api.set_index_fields(index_fields)
 
     You can also subclass FsFsPolicy if you like and use api.set_policy() to
     use an instance of your custom FsFsPolicy.
@@ -51,7 +62,11 @@ class FsFsPolicy(object):
         data_root=None,
         data_file=None,
         entry_factory=None,
-        id_generator=None
+        id_generator=None,
+        tag_storage=None,
+        index_fields=None,
+        data_storage=None,
+        ignore_rules=None
     ):
         self._data_encoder = data_encoder
         self._data_decoder = data_decoder
@@ -60,6 +75,10 @@ class FsFsPolicy(object):
         self._entry_factory = entry_factory
         self._setup_entry_factory(entry_factory)
         self._id_generator = id_generator
+        self._tag_storage = tag_storage or storage.FilesTagStorage()
+        self._index_fields = list(index_fields or [])
+        self._data_storage = data_storage or storage.FileDataStorage()
+        self._ignore_rules = ignore_rules or ignore.IgnoreRules()
 
     def set_data_encoder(self, data_encoder):
         self._data_encoder = data_encoder
@@ -111,6 +130,30 @@ class FsFsPolicy(object):
     def set_id_generator(self, func):
         self._id_generator = func
 
+    def get_tag_storage(self):
+        return self._tag_storage
+
+    def set_tag_storage(self, tag_storage):
+        self._tag_storage = tag_storage
+
+    def get_index_fields(self):
+        return self._index_fields
+
+    def set_index_fields(self, index_fields):
+        self._index_fields = list(index_fields)
+
+    def get_data_storage(self):
+        return self._data_storage
+
+    def set_data_storage(self, data_storage):
+        self._data_storage = data_storage
+
+    def get_ignore_rules(self):
+        return self._ignore_rules
+
+    def set_ignore_rules(self, ignore_rules):
+        self._ignore_rules = ignore_rules
+
 
 # Json Encoder / Decoder
 import json
@@ -123,21 +166,34 @@ JsonEncoder = partial(
 )
 
 # Yaml Encoder / Decoder
-# Used as Default when pyyaml is available
-try:
-    from fsfs.vendor import yaml
-    YamlDecoder = yaml.safe_load
-    YamlEncoder = partial(
-        yaml.safe_dump,
-        default_flow_style=False
-    )
-    DefaultDecoder = YamlDecoder
-    DefaultEncoder = YamlEncoder
-except ImportError:
-    YamlEncoder = None
-    YamlDecoder = None
-    DefaultDecoder = JsonDecoder
-    DefaultEncoder = JsonEncoder
+# The vendored yaml package is imported on first use, it accounts for most of
+# the time spent importing fsfs.
+_yaml = None
+
+
+def _get_yaml():
+    global _yaml
+    if _yaml is None:
+        from fsfs.vendor import yaml
+        from fsfs.types import FrozenDict
+        yaml.SafeDumper.add_representer(
+            FrozenDict,
+            yaml.SafeDumper.represent_dict,
+        )
+        _yaml = yaml
+    return _yaml
+
+
+def YamlDecoder(data):
+    return _get_yaml().safe_load(data)
+
+
+def YamlEncoder(data):
+    return _get_yaml().safe_dump(data, default_flow_style=False)
+
+
+DefaultDecoder = YamlDecoder
+DefaultEncoder = YamlEncoder
 
 # Default ID Generator
 import uuid
@@ -150,6 +206,15 @@ DefaultFile = 'data'
 # Default Factory
 DefaultFactory = factory.SimpleEntryFactory()
 
+# Default Tag Storage
+DefaultTagStorage = storage.FilesTagStorage()
+
+# Default Data Storage
+DefaultDataStorage = storage.FileDataStorage()
+
+# Default Ignore Rules
+DefaultIgnoreRules = ignore.IgnoreRules()
+
 # Default Policy
 DefaultPolicy = FsFsPolicy(
     data_encoder=DefaultEncoder,
@@ -157,6 +222,9 @@ DefaultPolicy = FsFsPolicy(
     data_root=DefaultRoot,
     data_file=DefaultFile,
     entry_factory=DefaultFactory,
-    id_generator=DefaultIdGenerator
+    id_generator=DefaultIdGenerator,
+    tag_storage=DefaultTagStorage,
+    data_storage=DefaultDataStorage,
+    ignore_rules=DefaultIgnoreRules
 )
 _global_policy = DefaultPolicy
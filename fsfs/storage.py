@@ -0,0 +1,784 @@
+# -*- coding: utf-8 -*-
+'''
+Storage layouts for Entry tags and data.
+
+:class:`FilesTagStorage` stores each tag as an empty tag_<name> file in the
+Entry's data directory. This is the layout fsfs has always used.
+:class:`SingleFileTagStorage` stores the whole tag set in a single tags
+file, one tag per line, replaced atomically on every change. Tagging then
+costs one write no matter how many tags are added, and reads are served
+from an in-memory index validated by the tags file's stat.
+
+:class:`FileDataStorage` stores an Entry's data as one encoded document in
+the data file. :class:`ShardedDataStorage` stores each top-level key in its
+own file, so reading or writing a few keys of a large document only reads,
+decodes and rewrites those keys. :class:`JournaledDataStorage` appends each
+write to a journal that readers replay on top of the data file, so frequent
+small writes never re-encode the whole document.
+
+Use :func:`fsfs.set_tag_storage` and :func:`fsfs.set_data_storage` to select
+the layouts used by the global policy, and :func:`fsfs.migrate_tags` and
+:func:`fsfs.migrate_data` to convert existing trees.
+'''
+from __future__ import absolute_import
+
+__all__ = [
+    'TagStorage',
+    'FilesTagStorage',
+    'SingleFileTagStorage',
+    'TAG_STORAGES',
+    'migrate_tag_storage',
+    'DataStorage',
+    'FileDataStorage',
+    'ShardedDataStorage',
+    'JournaledDataStorage',
+    'DATA_STORAGES',
+    'migrate_data_storage',
+]
+
+import io
+import os
+import errno
+import time
+import shutil
+import threading
+from multiprocessing.pool import ThreadPool
+from fsfs import util
+from fsfs._compat import scandir, quote, unquote
+
+
+class TagStorage(object):
+    '''Base class for tag storage layouts. Every method takes the path of
+    an Entry's data directory. Tags are always returned as a sorted list.
+
+    Attributes:
+        name (str): Name used by the command line interface
+        requires_lock (bool): True when changing tags reads and rewrites
+            shared state, Entries then hold their LockFile while tagging
+    '''
+
+    name = None
+    requires_lock = False
+
+    @property
+    def layout(self):
+        '''Identifies where on disk tags are stored'''
+
+        return (self.name,)
+
+    def get_tags(self, data_path):
+        '''Get the tags stored in data_path'''
+
+        raise NotImplementedError
+
+    def tags_from_listing(self, data_path, names):
+        '''Get the tags stored in data_path, names is a listing of
+        data_path. Used by tree walks that already listed the directory.'''
+
+        raise NotImplementedError
+
+    def add_tags(self, data_path, tags):
+        '''Add tags to data_path'''
+
+        raise NotImplementedError
+
+    def remove_tags(self, data_path, tags):
+        '''Remove tags from data_path'''
+
+        raise NotImplementedError
+
+    def set_tags(self, data_path, tags):
+        '''Replace the tags stored in data_path'''
+
+        raise NotImplementedError
+
+    def clear(self, data_path):
+        '''Remove all tags stored in data_path'''
+
+        self.set_tags(data_path, [])
+
+
+class FilesTagStorage(TagStorage):
+    '''Stores each tag as an empty file named tag_<name>.'''
+
+    name = 'files'
+    prefix = 'tag_'
+
+    @property
+    def layout(self):
+        return (self.name, self.prefix)
+
+    def _tag_path(self, data_path, tag):
+        return data_path + '/' + self.prefix + tag
+
+    def get_tags(self, data_path):
+        try:
+            names = [e.name for e in scandir(data_path)]
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return []
+        return self.tags_from_listing(data_path, names)
+
+    def tags_from_listing(self, data_path, names):
+        size = len(self.prefix)
+        return sorted(
+            name[size:] for name in names if name.startswith(self.prefix)
+        )
+
+    def add_tags(self, data_path, tags):
+        for tag in tags:
+            tag_path = self._tag_path(data_path, tag)
+            if not os.path.isfile(tag_path):
+                util.touch(tag_path)
+
+    def remove_tags(self, data_path, tags):
+        for tag in tags:
+            tag_path = self._tag_path(data_path, tag)
+            if os.path.isfile(tag_path):
+                os.remove(tag_path)
+
+    def set_tags(self, data_path, tags):
+        old_tags = set(self.get_tags(data_path))
+        new_tags = set(tags)
+        self.remove_tags(data_path, old_tags - new_tags)
+        self.add_tags(data_path, new_tags - old_tags)
+
+
+class SingleFileTagStorage(TagStorage):
+    '''Stores all tags in one file, one tag per line.
+
+    Arguments:
+        file (str): Name of the tags file, defaults to "tags"
+    '''
+
+    name = 'single'
+    requires_lock = True
+
+    def __init__(self, file='tags'):
+        self.file = file
+        self._index = {}
+        self._lock = threading.Lock()
+
+    @property
+    def layout(self):
+        return (self.name, self.file)
+
+    def _stat_key(self, path):
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        # The tags file is replaced on write, so the inode changes even
+        # when the mtime does not
+        return st.st_ino, st.st_mtime, st.st_size
+
+    def get_tags(self, data_path):
+        path = data_path + '/' + self.file
+        key = self._stat_key(path)
+        if key is None:
+            with self._lock:
+                self._index.pop(data_path, None)
+            return []
+
+        cached = self._index.get(data_path)
+        if cached and cached[0] == key:
+            return list(cached[1])
+
+        try:
+            with open(path, 'r') as f:
+                tags = sorted(set(line.strip() for line in f if line.strip()))
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return []
+
+        with self._lock:
+            self._index[data_path] = (key, tuple(tags))
+        return tags
+
+    def tags_from_listing(self, data_path, names):
+        if self.file not in names:
+            return []
+        return self.get_tags(data_path)
+
+    def add_tags(self, data_path, tags):
+        old_tags = self.get_tags(data_path)
+        new_tags = set(old_tags) | set(tags)
+        if len(new_tags) != len(old_tags):
+            self.set_tags(data_path, new_tags)
+
+    def remove_tags(self, data_path, tags):
+        old_tags = self.get_tags(data_path)
+        new_tags = set(old_tags) - set(tags)
+        if len(new_tags) != len(old_tags):
+            self.set_tags(data_path, new_tags)
+
+    def set_tags(self, data_path, tags):
+        path = data_path + '/' + self.file
+        tags = sorted(set(tags))
+        if not tags:
+            with self._lock:
+                self._index.pop(data_path, None)
+            util.suppress(os.remove, path)
+            return
+
+        util.atomic_write(path, '\n'.join(tags) + '\n')
+        with self._lock:
+            self._index[data_path] = (self._stat_key(path), tuple(tags))
+
+
+TAG_STORAGES = {
+    FilesTagStorage.name: FilesTagStorage,
+    SingleFileTagStorage.name: SingleFileTagStorage,
+}
+
+
+def migrate_tag_storage(root, dest, src=None, threads=8):
+    '''Move the tags of all entries below root from one storage layout to
+    another. Tags are written to dest before they are removed from src.
+
+    Arguments:
+        root (str): Directory to migrate
+        dest (TagStorage): Storage to move tags to
+        src (TagStorage): Storage to move tags from, defaults to the global
+            policy's tag_storage
+        threads (int): Number of threads used to migrate entries
+
+    Returns:
+        int: Number of entries migrated
+
+    Examples:
+        .. code-block:: python
+
+            single = fsfs.SingleFileTagStorage()
+            fsfs.migrate_tags('/projects', single)
+            fsfs.set_tag_storage(single)
+    '''
+
+    from fsfs import api, _snapshot
+
+    src = src or api.get_tag_storage()
+    if src.layout == dest.layout:
+        return 0
+
+    data_root = api.get_data_root()
+
+    def migrate(path):
+        data_path = path + '/' + data_root
+        tags = src.get_tags(data_path)
+        if tags:
+            dest.set_tags(data_path, tags)
+            src.clear(data_path)
+
+    count = 0
+    pool = ThreadPool(threads)
+    try:
+        entries = _snapshot.walk_entries(root, data_root)
+        for _ in pool.imap_unordered(migrate, entries, 32):
+            count += 1
+    finally:
+        pool.close()
+        pool.join()
+
+    return count
+
+
+def _encode(data):
+    from fsfs import api, types
+    # User encoders may not know how to represent FrozenDict snapshots
+    return api.encode_data(types.thaw(data))
+
+
+def _decode(raw_data):
+    from fsfs import api
+    if not raw_data:
+        return {}
+    return api.decode_data(raw_data)
+
+
+def _read_text(path):
+    '''Read a text file, returns an empty string when it does not exist'''
+
+    try:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return ''
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def _generation(path):
+    '''Identify a version of a file that is replaced atomically'''
+
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return
+    return st.st_ino, st.st_mtime, st.st_size
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        util.suppress(os.remove, path)
+
+
+class DataStorage(object):
+    '''Base class for data storage layouts. Every method takes the path of
+    an Entry's data directory. Data is read and written decoded, as a dict
+    of top-level keys, using the global policy's data encoder and decoder.
+
+    Attributes:
+        name (str): Name used by the command line interface
+        partial (bool): True when single keys can be read and written
+            without reading or rewriting the whole document
+        appends (bool): True when :meth:`update` stores the changes
+            without reading the stored data
+    '''
+
+    name = None
+    partial = False
+    appends = False
+
+    @property
+    def layout(self):
+        '''Identifies where on disk data is stored'''
+
+        return (self.name,)
+
+    def exists(self, data_path):
+        '''Check if data_path holds data, even when it is empty'''
+
+        raise NotImplementedError
+
+    def init(self, data_path):
+        '''Create empty data in data_path'''
+
+        raise NotImplementedError
+
+    def mtime(self, data_path):
+        '''Get the modification time of the data in data_path, changes on
+        every write. Returns None when there is no data.'''
+
+        raise NotImplementedError
+
+    def set_mtime(self, data_path, mtime):
+        '''Set the modification time of the data in data_path'''
+
+        raise NotImplementedError
+
+    def read(self, data_path, keys=None):
+        '''Read the data in data_path. When keys are passed only those keys
+        are read, keys that are not stored are left out.'''
+
+        raise NotImplementedError
+
+    def write(self, data_path, data, replace=False):
+        '''Write the top-level keys in data. When replace is True, stored
+        keys missing from data are removed.'''
+
+        raise NotImplementedError
+
+    def update(self, data_path, data):
+        '''Merge data into the data in data_path like
+        :func:`fsfs.util.merge_dict`'''
+
+        old_data = self.read(data_path, list(data))
+        self.write(data_path, util.merge_dict(old_data, data))
+
+    def remove(self, data_path, keys):
+        '''Remove top-level keys from the data in data_path'''
+
+        data = self.read(data_path)
+        for key in keys:
+            data.pop(key, None)
+        self.write(data_path, data, replace=True)
+
+    def read_raw(self, data_path):
+        '''Get the whole document encoded by the global policy's encoder'''
+
+        data = self.read(data_path)
+        if not data:
+            return ''
+        return _encode(data)
+
+    def write_raw(self, data_path, raw_data):
+        '''Replace the whole document with raw_data, a document encoded by
+        the global policy's encoder'''
+
+        self.write(data_path, _decode(raw_data), replace=True)
+
+    def paths(self, data_path):
+        '''Get the files and directories data is stored in'''
+
+        raise NotImplementedError
+
+    def clear(self, data_path):
+        '''Remove all data stored in data_path'''
+
+        for path in self.paths(data_path):
+            _remove_path(path)
+
+
+class FileDataStorage(DataStorage):
+    '''Stores data as one document in the data file, replaced atomically
+    on every write.
+
+    Arguments:
+        file (str): Name of the data file, defaults to the global policy's
+            data_file
+    '''
+
+    name = 'file'
+
+    def __init__(self, file=None):
+        self.file = file
+
+    @property
+    def layout(self):
+        from fsfs import api
+        return (self.name, self.file or api.get_data_file())
+
+    def _file(self, data_path):
+        from fsfs import api
+        return data_path + '/' + (self.file or api.get_data_file())
+
+    def exists(self, data_path):
+        return os.path.isfile(self._file(data_path))
+
+    def init(self, data_path):
+        util.touch(self._file(data_path))
+
+    def mtime(self, data_path):
+        return _mtime(self._file(data_path))
+
+    def set_mtime(self, data_path, mtime):
+        os.utime(self._file(data_path), (mtime, mtime))
+
+    def read(self, data_path, keys=None):
+        data = _decode(self.read_raw(data_path))
+        if keys is None:
+            return data
+        return dict((k, data[k]) for k in keys if k in data)
+
+    def write(self, data_path, data, replace=False):
+        if not replace:
+            new_data = self.read(data_path)
+            new_data.update(data)
+            data = new_data
+        self.write_raw(data_path, _encode(data))
+
+    def read_raw(self, data_path):
+        return _read_text(self._file(data_path))
+
+    def write_raw(self, data_path, raw_data):
+        util.atomic_write(self._file(data_path), raw_data)
+
+    def paths(self, data_path):
+        return [self._file(data_path)]
+
+
+class ShardedDataStorage(DataStorage):
+    '''Stores each top-level key in its own file in a shards directory. Each
+    shard is a document holding a single key, replaced atomically when the
+    key is written. Writes replace shards, so the shards directory's mtime
+    changes on every write.
+
+    Arguments:
+        directory (str): Name of the shards directory, defaults to "shards"
+    '''
+
+    name = 'sharded'
+    partial = True
+
+    def __init__(self, directory='shards'):
+        self.directory = directory
+
+    @property
+    def layout(self):
+        return (self.name, self.directory)
+
+    def _directory(self, data_path):
+        return data_path + '/' + self.directory
+
+    def _shard(self, data_path, key):
+        # Quote dots too so shards never collide with atomic_write's
+        # temporary .tmp files
+        name = quote(key, safe='').replace('.', '%2E')
+        return data_path + '/' + self.directory + '/' + name
+
+    def _keys(self, data_path):
+        try:
+            entries = list(scandir(self._directory(data_path)))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return []
+        return [
+            unquote(e.name) for e in entries if not e.name.endswith('.tmp')
+        ]
+
+    def exists(self, data_path):
+        return os.path.isdir(self._directory(data_path))
+
+    def init(self, data_path):
+        try:
+            os.makedirs(self._directory(data_path))
+        except OSError:
+            if not os.path.isdir(self._directory(data_path)):
+                raise
+
+    def mtime(self, data_path):
+        return _mtime(self._directory(data_path))
+
+    def set_mtime(self, data_path, mtime):
+        os.utime(self._directory(data_path), (mtime, mtime))
+
+    def read(self, data_path, keys=None):
+        if keys is None:
+            keys = self._keys(data_path)
+
+        data = {}
+        for key in keys:
+            shard = _decode(_read_text(self._shard(data_path, key)))
+            if key in shard:
+                data[key] = shard[key]
+        return data
+
+    def write(self, data_path, data, replace=False):
+        self.init(data_path)
+        if replace:
+            self.remove(data_path, set(self._keys(data_path)) - set(data))
+        for key, value in data.items():
+            shard = self._shard(data_path, key)
+            util.atomic_write(shard, _encode({key: value}))
+
+    def remove(self, data_path, keys):
+        for key in keys:
+            util.suppress(os.remove, self._shard(data_path, key))
+
+    def paths(self, data_path):
+        return [self._directory(data_path)]
+
+
+class JournaledDataStorage(FileDataStorage):
+    '''Stores data in the data file plus a journal of the changes made
+    since the data file was last written. Updates and removes append one
+    record to the journal using a single O_APPEND write, readers replay the
+    journal on top of the data file.
+
+    The journal is compacted into the data file when an update makes it
+    larger than max_size, or when the data file is older than
+    compact_interval seconds. Compaction replaces the data file before it
+    removes the journal. Readers read the journal before the data file and
+    retry when the data file was replaced in between, so the records they
+    replay always belong to the data file they read. Every read replays the
+    whole journal, lower max_size when the data is read much more often
+    than it is written.
+
+    Arguments:
+        file (str): Name of the data file, defaults to the global policy's
+            data_file
+        journal (str): Name of the journal file, defaults to "journal"
+        max_size (int): Journal size in bytes that triggers compaction,
+            trades the cost of writes for the cost of reads
+        compact_interval (float): Seconds after which an update compacts
+            the journal, None to only compact by size
+    '''
+
+    name = 'journaled'
+    appends = True
+
+    def __init__(
+        self,
+        file=None,
+        journal='journal',
+        max_size=16 * 1024,
+        compact_interval=60,
+    ):
+        super(JournaledDataStorage, self).__init__(file)
+        self.journal = journal
+        self.max_size = max_size
+        self.compact_interval = compact_interval
+
+    @property
+    def layout(self):
+        return super(JournaledDataStorage, self).layout + (self.journal,)
+
+    def _journal(self, data_path):
+        return data_path + '/' + self.journal
+
+    def _records(self, data_path):
+        '''Read the journal's records. Each record is the length of the
+        encoded record followed by a newline and the encoded record. A
+        partially written last record is skipped.'''
+
+        raw_journal = _read_text(self._journal(data_path))
+        records = []
+        start = 0
+        while True:
+            newline = raw_journal.find('\n', start)
+            if newline == -1:
+                break
+            end = newline + 1 + int(raw_journal[start:newline])
+            if end > len(raw_journal):
+                break
+            records.append(_decode(raw_journal[newline + 1:end]))
+            start = end
+        return records
+
+    def _append(self, data_path, record):
+        raw_record = _encode(record)
+        util.atomic_append(
+            self._journal(data_path),
+            '%d\n%s' % (len(raw_record), raw_record),
+        )
+
+        journal_size = os.path.getsize(self._journal(data_path))
+        if journal_size > self.max_size:
+            self.compact(data_path)
+        elif self.compact_interval is not None:
+            mtime = _mtime(self._file(data_path))
+            if mtime and time.time() - mtime > self.compact_interval:
+                self.compact(data_path)
+
+    def mtime(self, data_path):
+        mtimes = [
+            mtime for mtime in (
+                _mtime(self._file(data_path)),
+                _mtime(self._journal(data_path)),
+            ) if mtime is not None
+        ]
+        if mtimes:
+            return max(mtimes)
+
+    def read(self, data_path, keys=None):
+        # The journal must be read first, see compact. The data file's
+        # generation changes when it is replaced, so a reader that raced a
+        # compaction never replays an older journal on a newer data file
+        file = self._file(data_path)
+        while True:
+            generation = _generation(file)
+            records = self._records(data_path)
+            raw_data = _read_text(file)
+            if _generation(file) == generation:
+                break
+        data = _decode(raw_data)
+
+        for record in records:
+            if 'update' in record:
+                data = util.merge_dict(data, record['update'])
+            elif 'set' in record:
+                data.update(record['set'])
+            elif 'remove' in record:
+                for key in record['remove']:
+                    data.pop(key, None)
+
+        if keys is None:
+            return data
+        return dict((k, data[k]) for k in keys if k in data)
+
+    def write(self, data_path, data, replace=False):
+        if replace:
+            self.write_raw(data_path, _encode(data))
+        else:
+            self._append(data_path, {'set': data})
+
+    def update(self, data_path, data):
+        self._append(data_path, {'update': data})
+
+    def remove(self, data_path, keys):
+        self._append(data_path, {'remove': list(keys)})
+
+    def read_raw(self, data_path):
+        if _mtime(self._journal(data_path)) is None:
+            return super(JournaledDataStorage, self).read_raw(data_path)
+        return DataStorage.read_raw(self, data_path)
+
+    def write_raw(self, data_path, raw_data):
+        super(JournaledDataStorage, self).write_raw(data_path, raw_data)
+        util.suppress(os.remove, self._journal(data_path))
+
+    def compact(self, data_path):
+        '''Fold the journal into the data file. Callers must hold the
+        Entry's LockFile so no records are appended while compacting.'''
+
+        self.write(data_path, self.read(data_path), replace=True)
+
+    def paths(self, data_path):
+        return [self._file(data_path), self._journal(data_path)]
+
+
+DATA_STORAGES = {
+    FileDataStorage.name: FileDataStorage,
+    ShardedDataStorage.name: ShardedDataStorage,
+    JournaledDataStorage.name: JournaledDataStorage,
+}
+
+
+def migrate_data_storage(root, dest, src=None, threads=8):
+    '''Move the data of all entries below root from one storage layout to
+    another. Data is written to dest before it is removed from src, files
+    used by both layouts are kept.
+
+    Arguments:
+        root (str): Directory to migrate
+        dest (DataStorage): Storage to move data to
+        src (DataStorage): Storage to move data from, defaults to the global
+            policy's data_storage
+        threads (int): Number of threads used to migrate entries
+
+    Returns:
+        int: Number of entries migrated
+
+    Examples:
+        .. code-block:: python
+
+            sharded = fsfs.ShardedDataStorage()
+            fsfs.migrate_data('/projects', sharded)
+            fsfs.set_data_storage(sharded)
+    '''
+
+    from fsfs import api, _snapshot
+
+    src = src or api.get_data_storage()
+    if src.layout == dest.layout:
+        return 0
+
+    data_root = api.get_data_root()
+
+    def migrate(path):
+        data_path = path + '/' + data_root
+        if src.exists(data_path):
+            dest.write(data_path, src.read(data_path), replace=True)
+            dest_paths = dest.paths(data_path)
+            for src_path in src.paths(data_path):
+                if src_path not in dest_paths:
+                    _remove_path(src_path)
+
+    count = 0
+    pool = ThreadPool(threads)
+    try:
+        entries = _snapshot.walk_entries(root, data_root)
+        for _ in pool.imap_unordered(migrate, entries, 32):
+            count += 1
+    finally:
+        pool.close()
+        pool.join()
+
+    return count
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
-__all__ = ['File']
+__all__ = ['File', 'FrozenDict', 'freeze', 'thaw']
 
 
 class File(object):
@@ -83,3 +83,93 @@ class File(object):
 
         self._file = open(self.name, self.mode)
         return self
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError("'FrozenDict' object does not support item assignment")
+
+
+class FrozenDict(dict):
+    '''An immutable dict used for snapshots of Entry data. Reads return the
+    same FrozenDict until the data changes, and writes build a new FrozenDict
+    that shares every unchanged nested mapping with the previous version.
+    Snapshots are never copied when read or passed to receivers, so readers
+    and receivers must not modify them. Use :meth:`thaw` to get a mutable
+    copy.
+
+    FrozenDict is a dict subclass, so it compares equal to dicts and is
+    accepted wherever a dict is. Only mappings are frozen, lists are shared
+    as is.
+
+    Examples:
+        >>> data = freeze({'a': 1, 'b': {'c': 2}})
+        >>> data == {'a': 1, 'b': {'c': 2}}
+        True
+        >>> data['a'] = 2
+        Traceback (most recent call last):
+          ...
+        TypeError: 'FrozenDict' object does not support item assignment
+        >>> data.thaw()['b']['c']
+        2
+    '''
+
+    __slots__ = ()
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __ior__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def thaw(self):
+        '''Get a mutable copy, nested FrozenDicts are thawed too.'''
+
+        return thaw(self)
+
+
+def freeze(data):
+    '''Get a FrozenDict of data. FrozenDicts, including nested ones, are
+    returned as is, so freezing the result of :func:`fsfs.util.merge_dict`
+    only copies the mappings merge_dict created.
+
+    Arguments:
+        data (dict): Mapping to freeze
+
+    Returns:
+        FrozenDict
+    '''
+
+    if isinstance(data, FrozenDict):
+        return data
+
+    return FrozenDict(
+        (k, freeze(v) if isinstance(v, dict) else v)
+        for k, v in data.items()
+    )
+
+
+def thaw(data):
+    '''Get a copy of data where every mapping, including FrozenDicts nested
+    in plain dicts, is a plain dict. Values that are not mappings are
+    returned as is.
+
+    Arguments:
+        data (object): Value to thaw
+
+    Returns:
+        dict or data
+    '''
+
+    if not isinstance(data, dict):
+        return data
+
+    return dict((k, thaw(v)) for k, v in data.items())
@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
+from __future__ import absolute_import
 __all__ = [
     'touch',
+    'atomic_write',
+    'atomic_append',
     'unipath',
+    'joinpath',
+    'intern_path',
     'tupilize',
     'update_dict',
+    'merge_dict',
     'copy_file',
     'copy_tree',
     'move_tree',
@@ -12,12 +18,11 @@ __all__ = [
 ]
 import os
 import errno
-import collections
 import shutil
+import threading
 from functools import wraps
-from scandir import walk
-import inspect
-from fsfs._compat import basestring
+from types import GeneratorType
+from fsfs._compat import basestring, walk, Mapping, replace, intern
 
 
 BINARY = os.__dict__.get('O_BINARY', 0)  # Windows has a binary flag
@@ -160,12 +165,108 @@ def touch(file):
         os.utime(file, None)
 
 
+def atomic_write(file, data):
+    '''Write data to file atomically. data is written to a temporary file
+    in the same directory which then replaces file, so readers see either
+    the old or the new contents, never a partially written file.
+
+    Arguments:
+        file (str): Path to file
+        data (str): Text to write
+    '''
+
+    # Unique per thread, a thread only writes one temporary file at a time
+    thread_id = threading.current_thread().ident
+    tmp = '%s.%d-%d.tmp' % (file, os.getpid(), thread_id)
+    data = data.encode('utf-8')
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        replace(tmp, file)
+    except:
+        suppress(os.remove, tmp)
+        raise
+
+
+def atomic_append(file, data):
+    '''Append data to file with a single O_APPEND write. Appends from other
+    threads and processes are never interleaved with data.
+
+    Arguments:
+        file (str): Path to file, created when missing
+        data (str): Text to append
+    '''
+
+    data = data.encode('utf-8')
+    fd = os.open(file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+    try:
+        written = os.write(fd, data)
+    finally:
+        os.close(fd)
+    if written != len(data):
+        raise IOError('Partial append to %s' % file)
+
+
+if os.name == 'nt':
+    _is_absolute = lambda path: path[1:3] == ':/'
+else:
+    _is_absolute = lambda path: path[:1] == '/'
+
+
+def _is_unipath(path):
+    '''Check if path is already absolute, normalized and uses forward
+    slashes. Paths with any . or .. parts or hidden names are checked by
+    os.path.abspath.'''
+
+    return (
+        isinstance(path, basestring) and
+        _is_absolute(path) and
+        (len(path) < 2 or path[-1] != '/') and
+        '\\' not in path and
+        '//' not in path and
+        '/.' not in path
+    )
+
+
 def unipath(*paths):
-    '''Like os.path.join but returns an absolute path with forward slashes.'''
+    '''Like os.path.join but returns an absolute path with forward slashes.
+    A single path that is already normalized is returned as is.'''
 
+    if len(paths) == 1 and _is_unipath(paths[0]):
+        return paths[0]
     return os.path.abspath(os.path.join(*paths)).replace('\\', '/')
 
 
+def joinpath(path, *names):
+    '''Join names to a path normalized by :func:`unipath` by concatenation.
+    Use it to derive child paths in hot loops, names must be plain
+    directory or file names.
+
+    Examples:
+        >>> joinpath('/show/seq_010', 'sh_010', '.data')
+        '/show/seq_010/sh_010/.data'
+        >>> joinpath('/', 'show')
+        '/show'
+    '''
+
+    return '/'.join((path.rstrip('/'),) + names)
+
+
+def intern_path(path):
+    '''Intern path so that equal paths held by caches share one string and
+    compare by identity first. Paths that can't be interned are returned
+    as is.'''
+
+    try:
+        return intern(path)
+    except TypeError:
+        return path
+
+
 def tupilize(obj):
     '''Coerce obj to tuple'''
 
@@ -189,9 +290,9 @@ def update_dict(d, u):
     '''
 
     for k, v in u.items():
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, Mapping):
             dv = d.get(k, {})
-            if isinstance(dv, collections.Mapping):
+            if isinstance(dv, Mapping):
                 d[k] = update_dict(dv, v)
             else:
                 d[k] = v
@@ -200,6 +301,20 @@ def update_dict(d, u):
     return d
 
 
+def merge_dict(d, u):
+    '''Like :func:`update_dict` but returns a new dict leaving d unchanged.
+    Only the dicts along the paths in u are copied, the rest are shared.'''
+
+    d = dict(d)
+    for k, v in u.items():
+        dv = d.get(k)
+        if isinstance(v, Mapping) and isinstance(dv, Mapping):
+            d[k] = merge_dict(dv, v)
+        else:
+            d[k] = v
+    return d
+
+
 def regenerator(generator_fn):
     '''A decorator for generators. When a generator is yielded, it's
     items are yielded one by one. This allows generators to be recursive
@@ -227,7 +342,7 @@ def regenerator(generator_fn):
             except StopIteration:
                 stack.pop()
             else:
-                if inspect.isgenerator(item):
+                if isinstance(item, GeneratorType):
                     stack.append(item)
                 else:
                     yield item
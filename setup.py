@@ -44,7 +44,7 @@ setup(
     include_package_data=True,
     entry_points={
         'console_scripts': [
-            'fsfs = fsfs.__main__:cli'
+            'fsfs = fsfs.__main__:main'
         ]
     },
     classifiers=(
@@ -322,15 +322,18 @@ def test_read_write(tempdir):
     project_data = fsfs.read(project_path)
     assert project_data == {}
 
-    # Write updates the cached data and mtime in EntryData
+    # Write replaces the cached data and mtime in EntryData
     # This should prevent subsequent reads from unnecessarily accessing disk
     fsfs.write(project_path, hello='world!')
+    project_data = fsfs.read(project_path)
     # ids are the same because we haven't read from disk
     assert fsfs.read(project_path) is project_data
     assert project_data == {'hello': 'world!'}
 
-    # Write another key
+    # Write another key, previously read data is left unchanged
     fsfs.write(project_path, integer=10)
+    assert project_data == {'hello': 'world!'}
+    project_data = fsfs.read(project_path)
     # Still receiving cached data on read
     assert fsfs.read(project_path) is project_data
     assert project_data == {'hello': 'world!', 'integer': 10}
@@ -586,3 +589,1511 @@ def test_custom_uuid(tempdir):
 
     assert entry.uuid != old_uuid
     assert entry.uuid == new_uuid
+
+
+@provide_tempdir
+def test_select_from_tree(tempdir):
+    '''Select entries using compiled selector parts'''
+
+    fake = ProjectFaker(root=tempdir)
+    project_path = fake.project_path(project='Mean_Streets')
+    fsfs.tag(project_path, 'project')
+    for sequence in ('seq_chase_010', 'seq_chase_020', 'seq_jump_010'):
+        sequence_path = fake.sequence_path(
+            project='Mean_Streets', sequence=sequence
+        )
+        fsfs.tag(sequence_path, 'sequence')
+        for shot in ('sh_010', 'sh_020', 'sh_100'):
+            path = fake.shot_path(
+                project='Mean_Streets', sequence=sequence, shot=shot
+            )
+            fsfs.tag(path, 'shot')
+
+    def select(selector):
+        search = fsfs.search(tempdir, depth=4).name(selector)
+        return sorted(e.path.split('/')[-2] + '/' + e.name for e in search)
+
+    # substring parts
+    assert select('Mean/chase/sh_0') == [
+        'seq_chase_010/sh_010', 'seq_chase_010/sh_020',
+        'seq_chase_020/sh_010', 'seq_chase_020/sh_020',
+    ]
+
+    # exact, glob and regex parts
+    assert select('Mean/seq_jump_010/=sh_10') == []
+    assert select('Mean/seq_jump_010/=sh_100') == ['seq_jump_010/sh_100']
+    assert select('Mean/seq_*_010/sh_?10') == [
+        'seq_chase_010/sh_010', 'seq_jump_010/sh_010',
+    ]
+    assert select('Mean/re:_0[12]0$/re:^sh_1') == [
+        'seq_chase_010/sh_100', 'seq_chase_020/sh_100',
+        'seq_jump_010/sh_100',
+    ]
+
+    # single part selectors are compiled too
+    shot_names = set(e.name for e in fsfs.search(tempdir).name('=sh_100'))
+    assert shot_names == set(['sh_100'])
+
+    # quick_select returns the shallowest match for each part
+    entry = fsfs.quick_select(tempdir, 'Mean/jump/sh_1', first_depth=1)
+    assert entry.path.endswith('Mean_Streets/production/sequences/'
+                               'seq_jump_010/sh_100')
+    assert fsfs.quick_select(tempdir, 'Mean/missing') is None
+
+
+@provide_tempdir
+def test_parent_cache(tempdir):
+    '''Parent lookups are cached and invalidated by channels'''
+
+    fake = ProjectFaker(root=tempdir)
+    project_path = fake.project_path()
+    fsfs.tag(project_path, 'project')
+
+    sequence_path = util.unipath(project_path, 'seq_010')
+    shots = [
+        fsfs.get_entry(util.unipath(sequence_path, 'sh_%03d0' % i))
+        for i in range(4)
+    ]
+    for shot in shots:
+        shot.tag('shot')
+
+    for shot in shots:
+        assert samefile(shot.parent().path, project_path)
+
+    # Siblings share the cached chain
+    cached = fsfs._search.ancestors._cache
+    key = (fsfs.get_data_root(), sequence_path)
+    assert key in cached
+
+    # Tagging an intermediate directory invalidates the cached chain
+    fsfs.tag(sequence_path, 'sequence')
+    assert key not in cached
+    for shot in shots:
+        assert samefile(shot.parent().path, sequence_path)
+        parents = [p.name for p in shot.parents()]
+        assert parents == ['seq_010', os.path.basename(project_path)]
+
+    # Deleting it invalidates the chain again
+    fsfs.delete(sequence_path)
+    for shot in shots:
+        assert samefile(shot.parent().path, project_path)
+
+    # Invalidating a directory only drops the directories below it
+    other = util.unipath(project_path, 'seq_020', 'sh_0010')
+    os.makedirs(other)
+    fsfs._search.ancestors.nearest(other, fsfs.get_data_root())
+    other_key = (fsfs.get_data_root(), other)
+    assert other_key in cached and key in cached
+    fsfs._search.ancestors.invalidate(sequence_path)
+    assert other_key in cached and key not in cached
+
+    # The cache is cleared when it is full
+    small = fsfs._search.AncestorCache(max_size=3)
+    small.nearest(util.unipath(shots[0].path, 'a'), fsfs.get_data_root())
+    small.nearest(util.unipath(shots[1].path, 'b'), fsfs.get_data_root())
+    assert sorted(path for _, path in small._cache) == [
+        shots[1].path, util.unipath(shots[1].path, 'b')
+    ]
+
+
+@provide_tempdir
+def test_snapshot_restore(tempdir):
+    '''Snapshot and restore a tree's metadata'''
+
+    src = util.unipath(tempdir, 'src')
+    dest = util.unipath(tempdir, 'dest')
+    fake = ProjectFaker(root=src)
+    project_path = fake.project_path(project='Mean_Streets')
+    fsfs.tag(project_path, 'project')
+    fsfs.write(project_path, fps=24, resolution=[1920, 1080])
+    for asset in fake.assets[:4]:
+        asset_path = fake.asset_path(project='Mean_Streets', asset=asset)
+        fsfs.tag(asset_path, 'asset', 'hero')
+    for i in range(4):
+        shot_path = fake.shot_path(project='Mean_Streets', shot=fake.shot(i))
+        fsfs.write(shot_path, frame_start=1001, frame_end=1001 + i)
+
+    entries = list(fsfs.search(src, depth=10))
+    for path in ('snapshot.jsonl', 'snapshot.jsonl.gz'):
+        snapshot_path = util.unipath(tempdir, path)
+        assert fsfs.snapshot(src, snapshot_path) == len(entries)
+        assert fsfs.restore(snapshot_path, dest) == len(entries)
+
+    for entry in entries:
+        path = entry.path.replace(src, dest)
+        restored = fsfs.get_entry(path)
+        assert restored.uuid == entry.uuid
+        assert sorted(restored.tags) == sorted(entry.tags)
+        assert restored.read() == entry.read()
+
+    assert fsfs.read(project_path.replace(src, dest), 'fps') == 24
+
+
+@provide_tempdir
+def test_restore_cached_entries(tempdir):
+    '''Entries read before a restore read the restored data'''
+
+    root = util.unipath(tempdir, 'root')
+    entry = fsfs.get_entry(util.unipath(root, 'shot'))
+    entry.write(status='old')
+
+    snapshot_path = util.unipath(tempdir, 'snapshot.jsonl')
+    fsfs.snapshot(root, snapshot_path)
+
+    time.sleep(0.05)
+    entry.write(status='new')
+    assert entry.read('status') == 'new'
+
+    fsfs.restore(snapshot_path, root)
+    assert entry.read('status') == 'old'
+
+
+@provide_tempdir
+def test_snapshot_symlink_cycle(tempdir):
+    '''Snapshots don't follow directory symlinks into cycles'''
+
+    if not hasattr(os, 'symlink'):
+        return
+
+    root = util.unipath(tempdir, 'tree')
+    fsfs.tag(util.unipath(root, 'a'), 'asset')
+    fsfs.tag(util.unipath(root, 'a', 'b'), 'asset')
+    os.symlink(root, util.unipath(root, 'a', 'b', 'loop'))
+
+    expected = [util.unipath(root, 'a'), util.unipath(root, 'a', 'b')]
+    assert list(fsfs._snapshot.walk_entries(root)) == expected
+
+    snapshot_path = util.unipath(tempdir, 'snapshot.jsonl')
+    assert fsfs.snapshot(root, snapshot_path) == 2
+    assert list(fsfs.diff(snapshot_path, root)) == []
+
+
+@provide_tempdir
+def test_diff(tempdir):
+    '''Diff a snapshot against a live tree and send the changes'''
+
+    root = util.unipath(tempdir, 'root')
+    for name in ('a', 'b', 'c', 'd'):
+        fsfs.write(util.unipath(root, name), name=name)
+        fsfs.tag(util.unipath(root, name), 'asset')
+
+    snapshot_path = util.unipath(tempdir, 'snapshot.jsonl')
+    fsfs.snapshot(root, snapshot_path)
+    assert list(fsfs.diff(snapshot_path, root)) == []
+
+    time.sleep(0.01)
+    fsfs.get_entry(util.unipath(root, 'a')).move(util.unipath(root, 'z'))
+    fsfs.tag(util.unipath(root, 'b'), 'hero')
+    fsfs.untag(util.unipath(root, 'c'), 'asset')
+    fsfs.write(util.unipath(root, 'd'), status='approved')
+    fsfs.delete(util.unipath(root, 'd'))
+    fsfs.write(util.unipath(root, 'd'), name='d')
+    fsfs.tag(util.unipath(root, 'e'), 'asset')
+
+    changes = list(fsfs.diff(snapshot_path, root))
+    summary = sorted(
+        (c.kind, c.old_path, c.path, c.tags) for c in changes
+    )
+    assert summary == [
+        ('created', None, 'd', None),
+        ('created', None, 'e', None),
+        ('deleted', 'd', None, None),
+        ('moved', 'a', 'z', None),
+        ('tagged', 'b', 'b', ['hero']),
+        ('untagged', 'c', 'c', ['asset']),
+    ]
+
+    received = []
+    receiver = lambda entry, *args: received.append((entry.name, args))
+    fsfs.EntryCreated.connect(receiver)
+    fsfs.EntryTagged.connect(receiver)
+    try:
+        assert fsfs.send_changes(changes, root) == len(changes)
+    finally:
+        fsfs.EntryCreated.disconnect(receiver)
+        fsfs.EntryTagged.disconnect(receiver)
+    assert sorted(received) == [('b', (('hero',),)), ('d', ()), ('e', ())]
+
+    # data changes are found by comparing data files with new mtimes
+    fsfs.snapshot(root, snapshot_path)
+    time.sleep(0.01)
+    fsfs.write(util.unipath(root, 'b'), name='B')
+    changes = list(fsfs.diff(snapshot_path, root))
+    assert [(c.kind, c.path) for c in changes] == [('data_changed', 'b')]
+    assert fsfs.decode_data(changes[0].data) == {'name': 'B'}
+
+
+@provide_tempdir
+def test_server(tempdir):
+    '''Forward cli commands to a warm cache server'''
+
+    import socket
+    import threading
+    from fsfs import _server
+
+    socket_path = util.unipath(tempdir, 'fsfs.sock')
+    entry_path = util.unipath(tempdir, 'project', 'shot_010')
+    fsfs.tag(entry_path, 'shot')
+    fsfs.write(entry_path, fps=24)
+
+    # Nothing is forwarded without a server
+    assert _server.forward(['one', 'shot'], socket_path) is None
+
+    # No default socket path on platforms without getuid
+    getuid, env = os.getuid, os.environ.pop('FSFS_SOCKET', None)
+    del os.getuid
+    try:
+        assert _server.get_socket_path() is None
+        assert _server.request({'argv': ['one', 'shot']}) is None
+    finally:
+        os.getuid = getuid
+        if env is not None:
+            os.environ['FSFS_SOCKET'] = env
+
+    server = _server.Server(socket_path)
+    server.bind()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        response = _server.request(
+            {'argv': ['one', 'shot_010'], 'cwd': tempdir},
+            socket_path,
+        )
+        assert response['code'] == 0
+        assert response['stdout'].strip() == entry_path
+
+        response = _server.request(
+            {'argv': ['read', '--root', 'project/shot_010'], 'cwd': tempdir},
+            socket_path,
+        )
+        assert fsfs.decode_data(response['stdout']) == {'fps': 24}
+
+        response = _server.request(
+            {'argv': ['one', 'missing'], 'cwd': tempdir},
+            socket_path,
+        )
+        assert response['code'] == 1
+
+        # Only read only commands are served
+        response = _server.request(
+            {'argv': ['tag', 'asset'], 'cwd': tempdir},
+            socket_path,
+        )
+        assert response['code'] == 2
+
+        # Clients that never send a request are dropped
+        timeout = _server.REQUEST_TIMEOUT
+        _server.REQUEST_TIMEOUT = 0.1
+        silent = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            silent.connect(socket_path)
+            response = _server.request(
+                {'argv': ['one', 'shot_010'], 'cwd': tempdir},
+                socket_path,
+            )
+            assert response['code'] == 0
+        finally:
+            silent.close()
+            _server.REQUEST_TIMEOUT = timeout
+
+        # Sockets owned by other users are never connected to
+        if os.getuid() == 0:
+            os.chown(socket_path, 65534, -1)
+            try:
+                assert _server.forward(['one', 'shot'], socket_path) is None
+            finally:
+                os.chown(socket_path, 0, -1)
+    finally:
+        _server.request({'shutdown': True}, socket_path)
+        thread.join(5)
+
+    assert not os.path.exists(socket_path)
+
+    # A server that doesn't respond in time falls back to direct mode
+    hung = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    hung.bind(socket_path)
+    hung.listen(1)
+    try:
+        message = {'argv': ['one', 'shot_010'], 'cwd': tempdir}
+        assert _server.request(message, socket_path, timeout=0.1) is None
+    finally:
+        hung.close()
+
+    # Binding never removes files that are not sockets
+    os.remove(socket_path)
+    with open(socket_path, 'w') as f:
+        f.write('keep me')
+    assert_raises(_server.ServerError, _server.Server(socket_path).bind)
+    assert os.path.isfile(socket_path)
+
+
+def test_lazy_import():
+    '''import fsfs defers importing subsystems until they are used'''
+
+    import subprocess
+    import sys
+
+    if sys.version_info < (3, 7):
+        return
+
+    script = (
+        'import sys, fsfs\n'
+        'heavy = ["fsfs.vendor.yaml", "fsfs.lockfile", "fsfs.cli", "bands"]\n'
+        'print(sorted(m for m in heavy if m in sys.modules))\n'
+        'fsfs.get_entry(".")\n'
+        'print(sorted(m for m in heavy if m in sys.modules))\n'
+        'print(fsfs.LockFile if hasattr(fsfs, "LockFile") else None)\n'
+        'print(fsfs.lockfile.LockFile._pump_)\n'
+    )
+    output = subprocess.check_output(
+        [sys.executable, '-c', script],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).decode('utf-8').splitlines()
+    assert output == [
+        '[]',
+        "['bands', 'fsfs.lockfile']",
+        'None',
+        'None',
+    ]
+
+    # Every lazily exported name is in it's module's __all__
+    for module, names in fsfs._exports:
+        __import__(module)
+        assert list(names) == sys.modules[module].__all__
+
+
+@provide_tempdir
+def test_deferred_events(tempdir):
+    '''Messages are only built when received and deferred ones coalesce'''
+
+    entry = fsfs.get_entry(util.unipath(tempdir, 'entry'))
+    entry.write(frame=1)
+
+    built = []
+
+    def make_args():
+        built.append(True)
+        return (entry, {})
+
+    fsfs.send_lazy(entry.data_changed, make_args)
+    assert not built
+
+    received = []
+    receiver = lambda entry, data: received.append(data)
+    fsfs.EntryDataChanged.connect(receiver)
+    try:
+        entry.write(frame=2)
+        assert received == [{'frame': 2}]
+
+        with fsfs.deferred() as queue:
+            for frame in range(3, 10):
+                entry.write(frame=frame)
+            assert len(queue) == 1
+            assert len(received) == 1
+        assert received[-1] == {'frame': 9}
+        assert len(received) == 2
+    finally:
+        fsfs.EntryDataChanged.disconnect(receiver)
+
+
+@provide_tempdir
+def test_deferred_events_per_thread(tempdir):
+    '''Deferred contexts only queue messages sent by their own thread'''
+
+    import threading
+
+    a = fsfs.get_entry(util.unipath(tempdir, 'a'))
+    b = fsfs.get_entry(util.unipath(tempdir, 'b'))
+    received = []
+    receiver = lambda entry, data: received.append(entry.name)
+    fsfs.EntryDataChanged.connect(receiver)
+
+    entered = threading.Event()
+    release = threading.Event()
+    queues = []
+
+    def defer_a():
+        with fsfs.deferred() as queue:
+            queues.append(fsfs.get_event_queue())
+            a.write(frame=1)
+            entered.set()
+            release.wait(5)
+        queues.append(fsfs.get_event_queue())
+
+    thread = threading.Thread(target=defer_a)
+    try:
+        thread.start()
+        assert entered.wait(5)
+        assert fsfs.get_event_queue() is None
+
+        # Thread b is not held back by thread a's context
+        b.write(frame=1)
+        assert received == ['b']
+
+        # Overlapping contexts keep their own queues
+        with fsfs.deferred() as queue:
+            b.write(frame=2)
+            release.set()
+            thread.join(5)
+            assert received == ['b', 'a']
+            assert fsfs.get_event_queue() is queue
+            assert len(queue) == 1
+        assert received == ['b', 'a', 'b']
+        assert queues[1] is None and queues[0] is not queue
+    finally:
+        release.set()
+        thread.join(5)
+        fsfs.EntryDataChanged.disconnect(receiver)
+
+
+@provide_tempdir
+def test_lock_pump(tempdir):
+    '''Lock pump refreshes due locks and drops released locks'''
+
+    import warnings
+    from timeit import default_timer
+    from fsfs.lockfile import LockFile
+
+    locks = [
+        LockFile(util.unipath(tempdir, str(i) + '.lock'))
+        for i in range(100)
+    ]
+    for lock in locks:
+        lock.acquire()
+        os.utime(lock.path, (0, 0))
+
+    pump = LockFile._pump_
+    pump.refresh(default_timer() + 10)
+    assert all(not lock.expired for lock in locks)
+
+    for lock in locks[:50]:
+        lock.release()
+    pump.refresh(default_timer() + 10)
+    stats = pump.stats()
+    assert stats['scheduled'] == 50
+    assert stats['max_lag'] >= 0
+
+    # Locks that fail to refresh are retried sooner instead of dropped
+    lock = locks[50]
+    lock._touch = lambda: os.utime(lock.path + '.missing', None)
+    failed = pump.stats()['failed']
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        pump.refresh(default_timer() + 10)
+        pump.refresh(default_timer() + 10)
+    assert pump.stats()['failed'] == failed + 2
+    assert len(caught) == 1
+    assert lock._pump_failures == 2
+    del lock._touch
+    refreshed = pump.stats()['refreshed']
+    pump.refresh(default_timer() + 10)
+    assert pump.stats()['refreshed'] == refreshed + 50
+    assert lock._pump_failures == 0
+
+    for lock in locks[50:]:
+        lock.release()
+    assert not LockFile._acquired_locks
+
+
+@provide_tempdir
+def test_lock_pump_first_acquire(tempdir):
+    '''Threads acquiring the first locks at once start a single pump'''
+
+    import threading
+    from fsfs.lockfile import LockFile, LockFilePump
+
+    # Widen the window between checking for and creating the pump
+    init = LockFilePump.__init__
+
+    def slow_init(self):
+        time.sleep(0.05)
+        init(self)
+
+    if LockFile._pump_ is not None:
+        LockFile._pump_.stop()
+    LockFile._pump_ = None
+    LockFilePump.__init__ = slow_init
+
+    locks = [
+        LockFile(util.unipath(tempdir, str(i) + '.lock'))
+        for i in range(16)
+    ]
+    start = threading.Event()
+    errors = []
+
+    def acquire(lock):
+        try:
+            start.wait()
+            lock.acquire()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=acquire, args=(lock,)) for lock in locks
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    try:
+        assert not errors
+        pump = LockFile._pump_
+        assert pump.is_alive()
+        assert pump.stats()['scheduled'] == len(locks)
+        pumps = [
+            t for t in threading.enumerate() if isinstance(t, LockFilePump)
+        ]
+        assert pumps == [pump]
+    finally:
+        LockFilePump.__init__ = init
+        for lock in locks:
+            if lock.acquired:
+                lock.release()
+
+
+@provide_tempdir
+def test_concurrent_read_write(tempdir):
+    '''Readers never see partially written data'''
+
+    import threading
+
+    entry = fsfs.get_entry(util.unipath(tempdir, 'entry'))
+    document = dict(('key_%d' % i, 'value_%d' % i) for i in range(200))
+    entry.write(frame=0, **document)
+
+    done = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            for frame in range(1, 31):
+                entry.write(frame=frame)
+        finally:
+            done.set()
+
+    def reader():
+        while not done.is_set():
+            try:
+                with open(entry.data.file, 'r') as f:
+                    data = fsfs.decode_data(f.read())
+                assert len(data) == 201
+                assert len(entry.read()) == 201
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert entry.read('frame') == 30
+
+
+@provide_tempdir
+def test_tag_storage(tempdir):
+    '''Tags stored in a single file and migrated between layouts'''
+
+    from fsfs.storage import FilesTagStorage, SingleFileTagStorage
+
+    paths = [util.unipath(tempdir, 'entry_' + str(i)) for i in range(5)]
+    for path in paths:
+        fsfs.tag(path, 'shot', 'asset')
+    assert fsfs.get_tags(paths[0]) == ['asset', 'shot']
+
+    single = SingleFileTagStorage()
+    assert fsfs.migrate_tags(tempdir, single) == 5
+    assert fsfs.get_tags(paths[0]) == []
+
+    fsfs.set_tag_storage(single)
+    try:
+        data_path = util.unipath(paths[0], fsfs.get_data_root())
+        assert os.listdir(data_path).count('tags') == 1
+        assert not [n for n in os.listdir(data_path) if n.startswith('tag_')]
+        assert fsfs.get_tags(paths[0]) == ['asset', 'shot']
+        assert len(list(fsfs.search(tempdir).tags('shot'))) == 5
+
+        fsfs.tag(paths[0], 'hero')
+        fsfs.untag(paths[0], 'asset')
+        assert fsfs.get_entry(paths[0]).tags == ['hero', 'shot']
+
+        assert fsfs.migrate_tags(tempdir, FilesTagStorage()) == 5
+    finally:
+        fsfs.set_tag_storage(fsfs.DefaultTagStorage)
+
+    assert fsfs.get_tags(paths[0]) == ['hero', 'shot']
+    assert 'tags' not in os.listdir(data_path)
+
+
+@provide_tempdir
+def test_tag_many(tempdir):
+    '''Tag and untag many entries with one tagged message per entry'''
+
+    paths = [util.unipath(tempdir, 'sh_%03d' % i) for i in range(20)]
+    for path in paths:
+        fsfs.tag(path, 'shot')
+
+    received = []
+    receiver = lambda entry, tags: received.append((entry, tags))
+    fsfs.EntryTagged.connect(receiver)
+    try:
+        entries = fsfs.tag_many(paths, 'approved', 'hero')
+    finally:
+        fsfs.EntryTagged.disconnect(receiver)
+
+    assert len(entries) == 20
+    assert len(received) == 20
+    assert set(e for e, _ in received) == set(entries)
+    assert all(tags == ('approved', 'hero') for _, tags in received)
+    assert fsfs.get_tags(paths[0]) == ['approved', 'hero', 'shot']
+
+    untagged = fsfs.search(tempdir).tags('hero').untag('hero')
+    assert len(untagged) == 20
+    assert fsfs.get_tags(paths[-1]) == ['approved', 'shot']
+
+    assert_raises(fsfs.InvalidTag, fsfs.tag_many, paths, 'bad tag')
+    assert_raises(fsfs.InvalidTag, fsfs.validate_tag, 'tag\n')
+
+    # Unknown keyword arguments are errors, not ignored
+    assert_raises(TypeError, fsfs.tag_many, paths, 'hero', thread=4)
+    assert_raises(TypeError, fsfs.untag_many, paths, 'hero', thread=4)
+
+    # One thread tags in the calling thread
+    assert len(fsfs.tag_many(paths, 'hero', threads=1)) == 20
+    assert fsfs.untag_many(paths[:1], 'hero')[0].path == paths[0]
+    assert fsfs.get_tags(paths[0]) == ['approved', 'shot']
+    assert fsfs.get_tags(paths[1]) == ['approved', 'hero', 'shot']
+
+
+@provide_tempdir
+def test_where(tempdir):
+    '''Search.where using a field index and falling back to scanning'''
+
+    from fsfs import _index
+
+    for i in range(10):
+        fsfs.write(
+            util.unipath(tempdir, 'seq', 'sh_%03d' % i),
+            status='approved' if i % 2 else 'wip',
+            frame_start=1001 + i,
+            notes='shot %d' % i,
+        )
+
+    def names(search):
+        return sorted(entry.name for entry in search)
+
+    query = dict(status='approved', frame_start__gt=1004)
+    expected = ['sh_005', 'sh_007', 'sh_009']
+    assert names(fsfs.search(tempdir).where(**query)) == expected
+
+    fsfs.index_field('status', 'frame_start')
+    try:
+        index = fsfs.build_index(tempdir)
+        assert os.path.isfile(util.unipath(tempdir, _index.INDEX_FILE))
+        assert _index.find_index(tempdir, ['status']) is index
+        assert _index.find_index(tempdir, ['notes']) is None
+
+        assert names(fsfs.search(tempdir).where(**query)) == expected
+        assert names(fsfs.search(tempdir).where(
+            frame_start__in=[1001, 1002], status__ne='wip'
+        )) == ['sh_001']
+
+        # Writes in this process update the index
+        fsfs.write(util.unipath(tempdir, 'seq', 'sh_005'), status='wip')
+        assert names(fsfs.search(tempdir).where(**query)) == expected[1:]
+
+        # Stale matches are verified using the data file's mtime
+        entry = fsfs.get_entry(util.unipath(tempdir, 'seq', 'sh_007'))
+        time.sleep(0.05)
+        with open(entry.data.file, 'w') as f:
+            f.write(fsfs.encode_data(dict(status='wip', frame_start=1007)))
+        assert names(fsfs.search(tempdir).where(**query)) == ['sh_009']
+
+        # Fields missing from the index are found by scanning
+        assert names(fsfs.search(tempdir).where(notes='shot 3')) == ['sh_003']
+
+        # Chained clones only look up the index once iterated
+        lookups = []
+        find_index = _index.find_index
+
+        def counting_find_index(*args):
+            lookups.append(args)
+            return find_index(*args)
+
+        _index.find_index = counting_find_index
+        try:
+            search = fsfs.search(tempdir).where(status='wip')
+            search = search.filter(lambda entry: True).limit(20)
+            assert not lookups
+            assert len(names(search)) == 7
+            assert len(lookups) == 1
+        finally:
+            _index.find_index = find_index
+    finally:
+        fsfs.set_index_fields([])
+        _index.close_index(tempdir)
+
+
+@provide_tempdir
+def test_where_index_parity(tempdir):
+    '''Indexed and scanned where queries match the same Entries'''
+
+    from fsfs import _index
+
+    values = {'a': None, 'b': 'ok', 'c': 3, 'd': 'wip'}
+    for name, status in values.items():
+        fsfs.write(util.unipath(tempdir, name), status=status)
+    fsfs.write(util.unipath(tempdir, 'e'), frame=1001)
+
+    queries = [
+        dict(status=None),
+        dict(status='ok'),
+        dict(status__ne='ok'),
+        dict(status__ne=None),
+        dict(status__in=[None, 'ok']),
+        dict(status__gt=1),
+        dict(status__gte='ok'),
+    ]
+
+    def names(query):
+        search = fsfs.search(tempdir).where(**query)
+        return sorted(entry.name for entry in search)
+
+    scanned = [names(query) for query in queries]
+    assert scanned[0] == ['a']
+    assert scanned[2] == ['a', 'c', 'd']
+
+    fsfs.index_field('status')
+    try:
+        fsfs.build_index(tempdir)
+        assert [names(query) for query in queries] == scanned
+    finally:
+        fsfs.set_index_fields([])
+        _index.close_index(tempdir)
+
+
+@provide_tempdir
+def test_thread_safety(tempdir):
+    '''Entries and factories shared by many threads'''
+
+    import threading
+    from fsfs.lockfile import LockFile, LockFilePump
+
+    paths = [util.unipath(tempdir, 'entry_%d' % i) for i in range(4)]
+    threads = 16
+    writes = 10
+
+    def stress():
+        # The threads' first writes race to start the lock pump
+        if LockFile._pump_ is not None:
+            LockFile._pump_.stop()
+        LockFile._pump_ = None
+
+        start = threading.Event()
+        results = [None] * threads
+        errors = []
+
+        def work(index):
+            try:
+                start.wait()
+                entries = [fsfs.get_entry(path) for path in paths]
+                for i in range(writes):
+                    for entry in entries:
+                        entry.write(**{'t%d_%d' % (index, i): i})
+                        assert len(entry.read()) > 0
+                entries[0].tag('thread_%d' % index)
+                results[index] = entries
+            except Exception as e:
+                errors.append(e)
+
+        workers = [
+            threading.Thread(target=work, args=(i,)) for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        start.set()
+        for worker in workers:
+            worker.join()
+
+        assert not errors, errors
+        # Every thread got the same Entry for each path
+        for result in results:
+            assert all(a is b for a, b in zip(result, results[0]))
+        # No writes were lost
+        for path in paths:
+            assert len(fsfs.read(path)) == threads * writes
+        assert len(fsfs.get_tags(paths[0])) == threads
+        # Every Entry has a single uuid
+        for path in paths:
+            data_path = util.unipath(path, fsfs.get_data_root())
+            uuids = [n for n in os.listdir(data_path) if n.startswith('uuid_')]
+            assert len(uuids) == 1
+        # And a single lock pump
+        pumps = [
+            t for t in threading.enumerate() if isinstance(t, LockFilePump)
+        ]
+        assert pumps == [LockFile._pump_]
+
+    stress()
+    shutil.rmtree(tempdir)
+    fsfs.set_entry_factory(CustomFactory)
+    try:
+        stress()
+    finally:
+        fsfs.set_entry_factory(fsfs.DefaultFactory)
+
+
+@provide_tempdir
+def test_data_snapshots(tempdir):
+    '''Reads and events share immutable snapshots of Entry data'''
+
+    entry = fsfs.get_entry(util.unipath(tempdir, 'entry'))
+    entry.write(shot={'frame_start': 1001, 'frame_end': 1100}, tasks={})
+
+    data = entry.read()
+    assert isinstance(data, fsfs.FrozenDict)
+    assert data == {
+        'shot': {'frame_start': 1001, 'frame_end': 1100},
+        'tasks': {},
+    }
+    assert_raises(TypeError, data.__setitem__, 'shot', None)
+    assert_raises(TypeError, data['shot'].update, frame_start=1)
+
+    received = []
+    receiver = lambda entry, data: received.append(data)
+    fsfs.EntryDataChanged.connect(receiver)
+    try:
+        entry.write(tasks={'comp': 'wip'})
+    finally:
+        fsfs.EntryDataChanged.disconnect(receiver)
+
+    # The event carries the new snapshot, unchanged mappings are shared
+    new_data = entry.read()
+    assert received == [new_data]
+    assert received[0] is new_data
+    assert new_data['shot'] is data['shot']
+    assert data['tasks'] == {}
+
+    # Thawed copies are mutable and can be written back
+    thawed = new_data.thaw()
+    thawed['tasks']['comp'] = 'done'
+    entry.write(**thawed)
+    assert entry.read('tasks') == {'comp': 'done'}
+    assert new_data['tasks'] == {'comp': 'wip'}
+
+
+@provide_tempdir
+def test_data_snapshots_custom_encoder(tempdir):
+    '''Encoders only ever receive plain dicts, never snapshots'''
+
+    from fsfs.storage import JournaledDataStorage, ShardedDataStorage
+
+    def strict_encoder(data):
+        # Like yaml.safe_dump, refuse dict subclasses
+        def check(value):
+            if isinstance(value, dict):
+                assert type(value) is dict, type(value)
+                for v in value.values():
+                    check(v)
+        check(data)
+        return json.dumps(data)
+
+    fsfs.set_data_encoder(strict_encoder)
+    fsfs.set_data_decoder(json.loads)
+    try:
+        for storage in (
+            fsfs.DefaultDataStorage,
+            ShardedDataStorage(),
+            JournaledDataStorage(),
+        ):
+            fsfs.set_data_storage(storage)
+            entry = fsfs.get_entry(util.unipath(tempdir, storage.name))
+            entry.write(shot={'frame_start': 1001})
+            entry.write(shot={'frame_end': 1100}, status='wip')
+            entry.remove('status')
+            entry.write(**entry.read())
+            assert entry.read() == {
+                'shot': {'frame_start': 1001, 'frame_end': 1100}
+            }
+    finally:
+        fsfs.set_default_policy()
+
+
+@provide_tempdir
+def test_data_storage(tempdir):
+    '''Sharded data storage reads and writes single keys'''
+
+    from fsfs.storage import FileDataStorage, ShardedDataStorage
+
+    paths = [util.unipath(tempdir, 'entry_' + str(i)) for i in range(3)]
+    for path in paths:
+        fsfs.write(path, thumbnail='thumb.png', cache={'frames': [1, 2, 3]})
+
+    sharded = ShardedDataStorage()
+    assert fsfs.migrate_data(tempdir, sharded) == 3
+
+    decoded = []
+    decoder = fsfs.get_data_decoder()
+
+    def counting_decoder(data):
+        decoded.append(data)
+        return decoder(data)
+
+    fsfs.set_data_storage(sharded)
+    fsfs.set_data_decoder(counting_decoder)
+    try:
+        data_path = util.unipath(paths[0], fsfs.get_data_root())
+        assert sorted(os.listdir(data_path + '/shards')) == [
+            'cache', 'thumbnail'
+        ]
+        assert not os.path.exists(data_path + '/data')
+
+        # Only the requested key is decoded
+        entry = fsfs.get_entry(paths[0])
+        assert entry.read('thumbnail') == 'thumb.png'
+        assert len(decoded) == 1
+
+        # Only touched keys are rewritten, even when the cache is current
+        entry.read()
+        thumbnail_shard = data_path + '/shards/thumbnail'
+        inode = os.stat(thumbnail_shard).st_ino
+        entry.write(**{'cache': {'frames': [4]}, 'a.b/c': 1})
+        assert os.stat(thumbnail_shard).st_ino == inode
+        assert entry.read('cache') == {'frames': [4]}
+        assert entry.read() == {
+            'thumbnail': 'thumb.png',
+            'cache': {'frames': [4]},
+            'a.b/c': 1,
+        }
+
+        # Writes and removes keep the cached document current
+        count = len(decoded)
+        entry.remove('thumbnail')
+        del entry.data['a.b/c']
+        assert entry.read() == {'cache': {'frames': [4]}}
+        assert len(decoded) == count
+        assert_raises(KeyError, entry.data.__delitem__, 'missing')
+
+        assert fsfs.migrate_data(tempdir, FileDataStorage()) == 3
+    finally:
+        fsfs.set_data_decoder(decoder)
+        fsfs.set_data_storage(fsfs.DefaultDataStorage)
+
+    assert not os.path.exists(data_path + '/shards')
+    assert fsfs.read(paths[0]) == {'cache': {'frames': [4]}}
+    assert fsfs.read(paths[1], 'thumbnail') == 'thumb.png'
+
+
+@provide_tempdir
+def test_journaled_storage(tempdir):
+    '''Journaled data storage appends writes and compacts the journal'''
+
+    from fsfs.models import EntryData
+    from fsfs.storage import JournaledDataStorage
+
+    path = util.unipath(tempdir, 'entry')
+    fsfs.write(path, progress={'frame_start': 1001, 'frame_done': 1001})
+
+    journaled = JournaledDataStorage(max_size=1024, compact_interval=None)
+    # Both layouts use the data file, migrating must keep it
+    assert fsfs.migrate_data(tempdir, journaled) == 1
+
+    fsfs.set_data_storage(journaled)
+    try:
+        entry = fsfs.get_entry(path)
+        data_path = entry.data.path
+        assert entry.read('progress') == {
+            'frame_start': 1001, 'frame_done': 1001
+        }
+        with open(entry.data.file) as f:
+            base = f.read()
+
+        for frame in range(1002, 1011):
+            entry.write(progress={'frame_done': frame})
+        entry.write(status='wip', note='remove me')
+        entry.remove('note')
+
+        # Writes only append to the journal
+        with open(entry.data.file) as f:
+            assert f.read() == base
+        assert os.path.isfile(data_path + '/journal')
+
+        expected = {
+            'progress': {'frame_start': 1001, 'frame_done': 1010},
+            'status': 'wip',
+        }
+        assert entry.read() == expected
+        # A new reader replays the journal on top of the data file
+        assert EntryData(entry, data_path).read() == expected
+
+        # Compaction folds the journal into the data file
+        for frame in range(1011, 1100):
+            entry.write(progress={'frame_done': frame})
+        with open(data_path + '/journal') as f:
+            assert len(f.read()) <= 1024
+        with open(entry.data.file) as f:
+            assert f.read() != base
+        expected['progress']['frame_done'] = 1099
+        assert EntryData(entry, data_path).read() == expected
+
+        journaled.compact(data_path)
+        assert not os.path.exists(data_path + '/journal')
+        assert EntryData(entry, data_path).read() == expected
+
+        # Readers racing two compactions never replay a stale journal
+        entry.write(status='approved')
+        read_records = journaled._records
+
+        def racing_records(data_path):
+            records = read_records(data_path)
+            journaled._records = read_records
+            journaled.compact(data_path)
+            journaled.remove(data_path, ['status'])
+            journaled.compact(data_path)
+            return records
+
+        journaled._records = racing_records
+        del expected['status']
+        assert journaled.read(data_path) == expected
+    finally:
+        fsfs.set_data_storage(fsfs.DefaultDataStorage)
+
+    assert fsfs.read(path) == expected
+
+
+@provide_tempdir
+def test_get_tree(tempdir):
+    '''Iterative tree walk with limits, pruning and unique keys'''
+
+    show = util.unipath(tempdir, 'show')
+    for path in [
+        '', 'seq_010', 'seq_010/sh_010', 'assets/char', 'other/char'
+    ]:
+        fsfs.tag(util.unipath(show, path), 'entry')
+    os.makedirs(util.unipath(show, 'empty', 'deep'))
+
+    # Entries with the same name in different directories do not collide
+    expected = {
+        'show': {
+            'seq_010': {'sh_010': {}},
+            'assets/char': {},
+            'other/char': {},
+        }
+    }
+    assert fsfs.get_tree(show) == expected
+    assert fsfs.get_tree(show, threads=8) == expected
+
+    assert fsfs.get_tree(show, levels=2)['show']['seq_010'] == {}
+    assert fsfs.get_tree(show, depth=1) == {
+        'show': {'seq_010': {'sh_010': {}}}
+    }
+    pruned = fsfs.get_tree(show, prune=lambda path: path.endswith('other'))
+    assert 'other/char' not in pruned['show']
+
+    # Edges stream parents before their children
+    edges = list(fsfs.iter_tree(show, skip_root=True))
+    assert len(edges) == 4
+    seen = set()
+    for parent, entry in edges:
+        assert parent is None or parent in seen
+        seen.add(entry.path)
+
+    # Deeper than the recursion limit
+    path = util.unipath(tempdir, 'deep')
+    os.mkdir(path)
+    for _ in range(1100):
+        path += '/d'
+        os.mkdir(path)
+    fsfs.tag(path, 'entry')
+    edges = list(fsfs.iter_tree(util.unipath(tempdir, 'deep'), threads=1))
+    assert [entry.path for _, entry in edges] == [path]
+
+    # Directory symlinks are not followed without a depth limit
+    if hasattr(os, 'symlink'):
+        os.symlink(show, util.unipath(show, 'seq_010', 'sh_010', 'loop'))
+        assert fsfs.get_tree(show) == expected
+        tree = fsfs.get_tree(show, depth=3, levels=4)
+        linked = tree['show']['seq_010']['sh_010']
+        assert 'loop' in linked
+
+    # shutil.rmtree recurses too, remove the deep tree bottom up
+    shutil.rmtree(util.unipath(path, fsfs.get_data_root()))
+    while path != tempdir:
+        os.rmdir(path)
+        path = os.path.dirname(path)
+
+
+@provide_tempdir
+def test_ignore_rules(tempdir):
+    '''Search walks skip ignored directories'''
+
+    from fsfs._search import one_uuid
+
+    show = util.unipath(tempdir, 'show')
+    paths = {}
+    for name in [
+        'seq_010/sh_010',
+        '.git/objects/sh_010',
+        'sim_cache/sh_010',
+        'render/sh_010',
+        'frames/sh_010',
+    ]:
+        paths[name] = util.unipath(show, name)
+        fsfs.tag(paths[name], 'shot')
+    fsfs.tag(util.unipath(show, 'frames'), 'frames')
+
+    with open(util.unipath(show, '.fsfsignore'), 'w') as f:
+        f.write('# Render output\nrender/\n')
+    util.touch(util.unipath(show, 'frames', '.fsfsnoentries'))
+
+    def found(search):
+        return sorted(e.path[len(show) + 1:] for e in search)
+
+    fsfs.ignore_dirs(names=['.git'], patterns=['*_cache'])
+    try:
+        expected = ['frames', 'seq_010/sh_010']
+        assert found(fsfs.search(show)) == expected
+        assert found(fsfs.search(show).tags('shot')) == ['seq_010/sh_010']
+        assert found(fsfs.search(show).name('sh_010')) == ['seq_010/sh_010']
+        assert found(
+            e for _, e in fsfs.iter_tree(show, threads=1)
+        ) == expected
+        assert found(fsfs.search(show, levels=1)) == expected
+
+        uuid = fsfs.get_entry(paths['sim_cache/sh_010']).uuid
+        assert one_uuid(show, uuid) is None
+        uuid = fsfs.get_entry(paths['seq_010/sh_010']).uuid
+        assert one_uuid(show, uuid)[0] == paths['seq_010/sh_010']
+    finally:
+        fsfs.set_ignore_rules(fsfs.DefaultIgnoreRules)
+
+    assert len(list(fsfs.search(show).tags('shot'))) == 3
+
+
+@provide_tempdir
+def test_negative_cache(tempdir):
+    '''Walks skip unchanged non-Entry directories using the NegativeCache'''
+
+    from fsfs._search import negatives
+    from fsfs._index import close_index
+
+    show = util.unipath(tempdir, 'show')
+    fsfs.tag(util.unipath(show, 'seq_010', 'sh_010'), 'shot')
+    for name in ['pass_a', 'pass_b']:
+        os.makedirs(util.unipath(show, 'render', name))
+
+    # Age directories so their listings are cached
+    past = time.time() - 60
+    for root, dirs, _ in os.walk(show):
+        os.utime(root, (past, past))
+
+    def found():
+        return sorted(e.path[len(show) + 1:] for e in fsfs.search(show))
+
+    data_root = fsfs.get_data_root()
+    rules = fsfs.get_ignore_rules()
+    render = util.unipath(show, 'render')
+    negatives.enabled = True
+    try:
+        assert found() == ['seq_010/sh_010']
+        cached = negatives.get(render, past, data_root, rules)
+        assert sorted(cached) == ['pass_a', 'pass_b']
+        sh_010 = util.unipath(show, 'seq_010', 'sh_010')
+        assert negatives.get(sh_010, past, data_root, rules) is None
+
+        # Entries created by other processes change the mtime of the
+        # directory they are created in
+        new_entry = util.unipath(render, 'pass_a', 'sh_020')
+        os.makedirs(util.unipath(new_entry, data_root))
+        assert found() == ['render/pass_a/sh_020', 'seq_010/sh_010']
+        assert negatives.get(render, past, data_root, rules) is not None
+
+        # Cached results are stored in and loaded from the index
+        fsfs.build_index(show, fields=['status'])
+        negatives.clear()
+        assert negatives.get(render, past, data_root, rules) is None
+        assert len(found()) == 2
+        cached = negatives.get(render, past, data_root, rules)
+        assert sorted(cached) == ['pass_a', 'pass_b']
+    finally:
+        negatives.enabled = False
+        negatives.clear()
+        close_index(show)
+
+
+@provide_tempdir
+def test_search_terminals(tempdir):
+    '''Search paths, count, exists, first and limit'''
+
+    from fsfs import api
+
+    show = util.unipath(tempdir, 'show')
+    shots = [
+        util.unipath(show, 'seq_010', 'sh_{:03d}'.format(i))
+        for i in range(10)
+    ]
+    for shot in shots:
+        fsfs.tag(shot, 'shot')
+    fsfs.tag(shots[0], 'hero')
+    uuid = fsfs.get_entry(shots[1]).uuid
+
+    created = []
+    get_entry = api.get_entry
+
+    def counting_get_entry(path):
+        created.append(path)
+        return get_entry(path)
+
+    api.get_entry = counting_get_entry
+    try:
+        search = fsfs.search(show).tags('shot')
+        assert sorted(search.paths()) == shots
+        assert search.count() == 10
+        assert search.exists()
+        assert not fsfs.search(show).tags('missing').exists()
+        assert fsfs.search(show).tags('hero').count() == 1
+        assert list(fsfs.search(show).uuid(uuid).paths()) == [shots[1]]
+        assert fsfs.search(show).name('sh_00[12]').count() == 2
+        assert search.limit(3).count() == 3
+        assert created == []
+
+        assert len(search.first(2)) == 2
+        assert len(created) == 2
+        assert len(list(search.limit(4))) == 4
+        assert search.first() == [search.limit(1).one()]
+
+        # Filter predicates require Entry objects
+        del created[:]
+        filtered = search.filter(lambda e: e.name.endswith('5'))
+        assert filtered.count() == 1
+        assert len(created) == 10
+    finally:
+        api.get_entry = get_entry
+
+
+@provide_tempdir
+def test_search_order_by(tempdir):
+    '''Ordered and paginated searches'''
+
+    from fsfs import api
+    from fsfs._index import close_index
+
+    show = util.unipath(tempdir, 'show')
+    names = ['asset_{:02d}'.format(i) for i in range(20)]
+    paths = [util.unipath(show, name) for name in names]
+    priorities = {}
+    for i, path in enumerate(paths):
+        fsfs.tag(path, 'asset')
+        if i % 5:
+            priorities[path] = (i * 7) % 20
+            fsfs.write(path, priority=priorities[path])
+
+    search = fsfs.search(show).tags('asset')
+    assert list(search.order_by('name').paths()) == paths
+    assert list(search.order_by('-path').paths()) == paths[::-1]
+    assert list(search.order_by('name').offset(15).paths()) == paths[15:]
+    assert list(search.order_by('name').page(2, 5).paths()) == paths[5:10]
+    assert search.order_by('name').page(5, 5).count() == 0
+    assert [e.path for e in search.order_by('name').page(1, 3)] == paths[:3]
+
+    # Entries missing the key sort last
+    by_priority = sorted(priorities, key=lambda p: (priorities[p], p))
+    missing = paths[::5]
+    expected = by_priority + missing
+    assert list(search.order_by('priority').paths()) == expected
+    assert list(search.order_by('priority').page(3, 4).paths()) == (
+        expected[8:12]
+    )
+
+    # Also in descending order
+    descending = by_priority[::-1] + missing[::-1]
+    assert list(search.order_by('-priority').paths()) == descending
+    assert list(search.order_by('-priority').page(4, 4).paths()) == (
+        descending[12:16]
+    )
+
+    fsfs.build_index(show, fields=['priority'])
+    created = []
+    get_entry = api.get_entry
+
+    def counting_get_entry(path):
+        created.append(path)
+        return get_entry(path)
+
+    api.get_entry = counting_get_entry
+    try:
+        page = fsfs.search(show).order_by('priority').page(1, 5)
+        assert [e.path for e in page] == expected[:5]
+        assert created == expected[:5]
+    finally:
+        api.get_entry = get_entry
+        close_index(show)
+
+
+@provide_tempdir
+def test_search_strategies(tempdir):
+    '''Breadth first, iterative deepening and priority search walks'''
+
+    from fsfs import _search
+
+    show = util.unipath(tempdir, 'show')
+    for i in range(10):
+        fsfs.tag(util.unipath(show, 'seq_%03d' % i), 'sequence')
+        for j in range(5):
+            fsfs.tag(util.unipath(show, 'seq_%03d' % i, 'sh_%03d' % j), 'shot')
+    deep = util.unipath(show, 'a', 'b', 'sh_100')
+    fsfs.tag(deep, 'shot')
+
+    def depths(search):
+        return [p.count('/') for p in search.paths()]
+
+    expected = sorted(fsfs.search(show).paths())
+    assert len(expected) == 61
+    for strategy in (fsfs.BFS, fsfs.IDDFS, fsfs.PRIORITY):
+        search = fsfs.search(show, strategy=strategy)
+        assert sorted(search.paths()) == expected
+        assert depths(search) == sorted(depths(search))
+        assert search.name('sh_1').one().path == deep
+
+    levels = fsfs.search(show, levels=1, strategy=fsfs.BFS)
+    assert levels.count() == fsfs.search(show, levels=1).count() == 11
+
+    # The priority walk follows directories matching the selector
+    scanned = []
+    scan_dir = _search.scan_dir
+
+    def counting_scan_dir(path, *args, **kwargs):
+        scanned.append(path)
+        return scan_dir(path, *args, **kwargs)
+
+    _search.scan_dir = counting_scan_dir
+    try:
+        selector = 'seq_009/sh_004'
+        bfs = fsfs.search(show, strategy=fsfs.BFS).name(selector).one()
+        bfs_scanned = len(scanned)
+        del scanned[:]
+        search = fsfs.search(show, strategy=fsfs.PRIORITY).name(selector)
+        assert search.one().path == bfs.path
+        assert len(scanned) == 3
+        assert bfs_scanned > 40
+    finally:
+        _search.scan_dir = scan_dir
+
+    assert_raises(RuntimeError, fsfs.search, show, strategy='sideways')
+
+
+@provide_tempdir
+def test_search_dn_walk(tempdir):
+    '''Depth first walks match other strategies for every depth and level'''
+
+    root = util.unipath(tempdir, 'root')
+    for path in [
+        'a', 'a/b/c', 'a/b/c/d', 'a/x/y/z/w', 'e/f', 'e/f/g/h/i/j', 'k',
+    ]:
+        fsfs.tag(util.unipath(root, path), 'entry')
+    fsfs.tag(root, 'entry')
+
+    for depth in (1, 2, 3, 4):
+        for levels in (0, 1, 2, 3):
+            for skip_root in (False, True):
+                kwargs = dict(depth=depth, levels=levels, skip_root=skip_root)
+                dfs = list(fsfs.search(root, **kwargs).paths())
+                bfs = fsfs.search(root, strategy=fsfs.BFS, **kwargs).paths()
+                assert sorted(dfs) == sorted(bfs), kwargs
+                assert len(set(dfs)) == len(dfs)
+
+                # Pre-order, every Entry follows the Entries above it
+                for i, path in enumerate(dfs):
+                    for ancestor in dfs[i + 1:]:
+                        assert not path.startswith(ancestor + '/')
+
+    everything = list(fsfs.search(root, depth=4).paths())
+    assert len(everything) == 8
+    assert everything[0] == root
+
+
+@provide_tempdir
+def test_path_layer(tempdir):
+    '''unipath fast path, joinpath and interned Entry paths'''
+
+    root = util.unipath(tempdir)
+    for path in [
+        root, root + '/', root + '/a/../b', root + '/./a', root + '//a',
+        root + '/.data', 'relative/path', '/',
+    ]:
+        assert util.unipath(path) == os.path.abspath(path).replace('\\', '/')
+    assert util.unipath(root + '/a') is not None
+    assert util.joinpath(root, 'a', '.data') == util.unipath(root, 'a/.data')
+
+    path = util.unipath(root, 'seq_010', 'sh_010')
+    fsfs.tag(path, 'shot')
+    entry = fsfs.get_entry(path)
+    assert entry.data.path == util.unipath(path, fsfs.get_data_root())
+    assert entry.data.file == util.unipath(
+        entry.data.path, fsfs.get_data_file()
+    )
+
+    # The LockFile is created when first used
+    factory = fsfs.SimpleEntryFactory()
+    entry = factory(''.join(list(path)))
+    assert entry.data._lockfile is None
+    entry.write(status='ok')
+    assert entry.data._lock.path == util.unipath(entry.data.path, '.lock')
+
+    # Cached Entries share interned paths
+    assert entry.path is util.intern_path(path)
+
+
+@provide_tempdir
+def test_entry_proxy_cache(tempdir):
+    '''EntryFactory proxies cache their Entry until invalidated'''
+
+    factory = fsfs.EntryFactory(revalidate_interval=60)
+
+    class Project(factory.Entry):
+        pass
+
+    class Asset(factory.Entry):
+        pass
+
+    updates = []
+    update_cache = factory._update_cache
+
+    def counting_update_cache(path, proxy=None):
+        updates.append(path)
+        return update_cache(path, proxy)
+
+    factory._update_cache = counting_update_cache
+    fsfs.set_entry_factory(factory)
+    try:
+        path = util.unipath(tempdir, 'project')
+        fsfs.tag(path, 'project')
+        entry = fsfs.get_entry(path)
+        assert type(entry.obj()) is Project
+
+        del updates[:]
+        for _ in range(100):
+            entry.path, entry.name
+        assert fsfs.get_entry(path) is entry
+        assert updates == []
+
+        # Tags changed in this process invalidate the proxy
+        entry.untag('project')
+        entry.tag('asset')
+        assert type(entry.obj()) is Asset
+
+        # Tags changed by other processes are picked up on revalidation
+        data_path = util.unipath(path, fsfs.get_data_root())
+        fsfs.get_tag_storage().remove_tags(data_path, ['asset'])
+        fsfs.get_tag_storage().add_tags(data_path, ['project'])
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert type(entry.obj()) is Asset
+        factory.revalidate_interval = 0
+        assert type(entry.obj()) is Project
+    finally:
+        fsfs.set_default_policy()